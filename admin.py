@@ -0,0 +1,102 @@
+# admin.py — operator endpoints (token-protected via ADMIN_TOKEN)
+
+import os
+import time
+from functools import wraps
+
+from flask import Blueprint, Response, abort, jsonify, request, send_from_directory
+
+import config
+from config import get_logger
+from prefetch import prefetcher, plan_prefetch, warm_stats
+from price_watch import price_watch
+from query_log import iter_queries
+from query_stats import query_stats
+from metrics import render_prometheus
+from hedging import hedger
+from http_utils import admin_token_valid
+from request_profiler import list_profiles, load_meta
+logger = get_logger(__name__)
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+# /metrics lives at the root where scrapers expect it, behind the same token
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def admin_required(view):
+    """
+    X-Admin-Token header must match ADMIN_TOKEN; 404 when admin is disabled.
+    Never a query parameter: URLs end up in access logs, the query log and Referer headers.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not config.ADMIN_TOKEN:
+            abort(404)
+        if not admin_token_valid():
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route("/prefetch")
+@admin_required
+def prefetch_status():
+    """Scheduler state, current plan and the warm-hit rate over the last `hours` (default 24)."""
+    hours = request.args.get("hours", 24, type=int)
+    since = time.time() - hours * 3600
+    plan = plan_prefetch(iter_queries(since=time.time() - config.PREFETCH_LOOKBACK_DAYS * 86400))
+    return jsonify({
+        "scheduler": prefetcher.status(),
+        "stats": {"hours": hours, **warm_stats(iter_queries(since=since))},
+        "plan": plan,
+    })
+
+
+@admin_bp.route("/price-watch")
+@admin_required
+def price_watch_status():
+    return jsonify(price_watch.status())
+
+
+@admin_bp.route("/query-stats")
+@admin_required
+def query_stats_report():
+    """Query-log analytics over the last `days` (default 7; 0 = everything kept)."""
+    days = request.args.get("days", 7, type=float)
+    top = min(request.args.get("top", 20, type=int), 200)
+    return jsonify(query_stats(days or None, top))
+
+
+@admin_bp.route("/hedging")
+@admin_required
+def hedging_status():
+    """Per-endpoint live quantile, hedges fired and how often the hedge answered first."""
+    return jsonify(hedger.stats())
+
+
+@admin_bp.route("/profiles")
+@admin_required
+def profiles():
+    """Captured request profiles, newest first (see request_profiler.py)."""
+    limit = min(request.args.get("limit", 100, type=int), 500)
+    return jsonify({"sample_rate": config.PROFILE_SAMPLE_RATE, "profiles": list_profiles(limit)})
+
+
+@admin_bp.route("/profiles/<name>")
+@admin_required
+def profile_download(name):
+    """The .prof file (pstats / snakeviz); ?format=text for the top functions and metadata."""
+    meta = load_meta(name)
+    if meta is None:
+        abort(404)
+    if request.args.get("format") == "text":
+        return jsonify(meta)
+    return send_from_directory(os.path.abspath(config.PROFILE_DIR), name + ".prof", as_attachment=True,
+                               mimetype="application/octet-stream")
+
+
+@metrics_bp.route("/metrics")
+@admin_required
+def metrics():
+    """Prometheus text format: per-stage and per-endpoint latency histograms, summed over all workers."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
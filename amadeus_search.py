@@ -6,12 +6,12 @@ Amadeus API Integration - REAL, WORKING SOLUTION
 
 import requests
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from itertools import islice
+from typing import List, Dict, Iterator, Optional
 import hashlib
 import re 
-from utils import parse_iso_duration, format_duration 
+from utils import parse_iso_duration, format_duration, parse_timestamp, format_epoch
 from typing import Dict, Optional
-import traceback
 import json
 import os
 
@@ -25,11 +25,13 @@ logger = get_logger(__name__)
 # ============================================
 
 # ✅ FIX: Added AFFILIATE_MARKER to the import list
-from config import AMADEUS_API_KEY, AMADEUS_API_SECRET, AMADEUS_BASE_URL, AFFILIATE_MARKER
+from config import AMADEUS_API_KEY, AMADEUS_API_SECRET, AMADEUS_BASE_URL, AFFILIATE_MARKER, DEBUG_MODE
+from quota import amadeus_quota
+from metrics import timed
+from hedging import hedger
 
-# Don't hardcode these - they come from .env via config.py
-if not AMADEUS_API_KEY or not AMADEUS_API_SECRET:
-    raise ValueError("Amadeus API credentials not configured. Check your .env file!")
+# Don't hardcode these - they come from .env via config.py.
+# Checked when a token is requested, so mock mode starts without credentials.
 
 # Use the base URL from config (test vs production)
 # AMADEUS_BASE_URL is already set from config.py
@@ -40,6 +42,7 @@ _token_expiry = None
 
 TOKEN_FILE = "/home/mehzan07/amadeus_token.json"
 
+@timed("amadeus_token")
 def get_access_token():
     """Get OAuth access token from Amadeus"""
     global _access_token, _token_expiry
@@ -56,6 +59,9 @@ def get_access_token():
     if _access_token and _token_expiry and datetime.now() < _token_expiry:
         return _access_token
     
+    if not AMADEUS_API_KEY or not AMADEUS_API_SECRET:
+        raise ValueError("Amadeus API credentials not configured. Check your .env file!")
+
     # Request new token
     token_url = f"{AMADEUS_BASE_URL}/v1/security/oauth2/token"
     
@@ -95,7 +101,7 @@ def get_access_token():
 # map_cabin_class, parse_iso_duration, format_duration, and parse_amadeus_flight 
 # are available/imported correctly.
 
-def search_flights_amadeus(
+def fetch_amadeus_offers(
     origin: str,
     destination: str,
     date_from: str,
@@ -106,10 +112,12 @@ def search_flights_amadeus(
     infants: int = 0,
     cabin_class: str = "economy",
     limit: int = 4,
-    direct_only: bool = False
+    direct_only: bool = False,
+    quota_reserve: int = 0
 ) -> List[Dict]:
     """
-    Search flights using Amadeus API, with robust error handling.
+    Calls the Amadeus flight-offers endpoint and returns the raw offers
+    (cheapest first), or [] on any error.
     """
     
     # -------------------------------------------------------------
@@ -147,12 +155,23 @@ def search_flights_amadeus(
     
     logger.info(f"🔍 Searching Amadeus: {origin} → {destination} (Depart: {date_from})")
     
+    # Optional callers (flex calendars) pass a reserve kept back for normal searches
+    if not amadeus_quota.try_acquire(reserve=quota_reserve):
+        return []
+    
     # -------------------------------------------------------------
     # 2. API CALL AND ERROR HANDLING
     # -------------------------------------------------------------
     try:
         # --- API CALL ---
-        response = requests.get(endpoint, params=params, headers=headers, timeout=10)
+        # Past the live p95 (and within quota) a duplicate is raced against the original
+        with timed("amadeus_http"):
+            response = hedger.call(
+                "flight-offers",
+                lambda: requests.get(endpoint, params=params, headers=headers, timeout=10),
+                budget=amadeus_quota,
+                is_ok=lambda r: r.status_code == 200,
+            )
         
         # --- HTTP ERROR CHECK ---
         if response.status_code != 200:
@@ -167,33 +186,79 @@ def search_flights_amadeus(
             logger.warning("⚠️ No flights found from Amadeus for criteria.")
             return []
             
-        # --- 3. SUCCESS/PARSING LOGIC ---
         logger.info(f"✅ Found {len(offers)} raw offers from Amadeus. Starting parsing.")
-        
-        flights = []
-        for offer in offers:
-            # Assuming parse_amadeus_flight is correctly defined and available
-            parsed = parse_amadeus_flight(offer, trip_type, origin, destination, direct_only) 
-            if parsed:
-                flights.append(parsed)
-                
-        # CRITICAL: Return the final list of successfully parsed flights
-        logger.info(f"Successfully parsed {len(flights)} flight offers.")
-        return flights[:limit] 
+        return offers
 
     # --- 4. FAILSAFE EXCEPTION CATCHES ---
     except requests.exceptions.RequestException as e:
         logger.error(f"Amadeus API request failed (Network/Timeout): {e}")
         return []
     except Exception as e:
-        logger.critical(f"🛑 FATAL EXCEPTION in search_flights_amadeus: {e}")
-        traceback.print_exc()
+        logger.critical(f"🛑 FATAL EXCEPTION in fetch_amadeus_offers: {e}", exc_info=True)
         return []
 
+def search_flights_amadeus(
+    origin: str,
+    destination: str,
+    date_from: str,
+    date_to: str = None,
+    trip_type: str = "round-trip",
+    adults: int = 1,
+    children: int = 0,
+    infants: int = 0,
+    cabin_class: str = "economy",
+    limit: int = 4,
+    direct_only: bool = False,
+    quota_reserve: int = 0
+) -> List[Dict]:
+    """
+    Search flights using Amadeus API, with robust error handling.
+    """
+    flights = list(stream_flights_amadeus(
+        origin, destination, date_from, date_to, trip_type, adults, children, infants,
+        cabin_class, limit, direct_only, quota_reserve
+    ))
+    logger.info(f"Successfully parsed {len(flights)} flight offers.")
+    return flights
+
+
+def stream_flights_amadeus(
+    origin: str,
+    destination: str,
+    date_from: str,
+    date_to: str = None,
+    trip_type: str = "round-trip",
+    adults: int = 1,
+    children: int = 0,
+    infants: int = 0,
+    cabin_class: str = "economy",
+    limit: int = 4,
+    direct_only: bool = False,
+    quota_reserve: int = 0
+) -> Iterator[Dict]:
+    """
+    Yields each flight as soon as parse_amadeus_flight produces it.
+    Amadeus returns offers cheapest-first, so parsing stops once `limit` are out.
+    """
+    offers = fetch_amadeus_offers(
+        origin, destination, date_from, date_to, trip_type, adults, children, infants,
+        cabin_class, limit, direct_only, quota_reserve
+    )
+    yield from islice(iter_amadeus_flights(offers, trip_type, origin, destination, direct_only), limit)
+
 # ----------------------------------------------------------------------
 # 5. parse_amadeus_flight HELPER FUNCTION (PROVIDED BY USER, CLEANED UP)
 # ----------------------------------------------------------------------
 
+def iter_amadeus_flights(offers: List[Dict], trip_type: str, origin: str, destination: str, direct_only: bool) -> Iterator[Dict]:
+    """Lazily parses raw offers, skipping the ones that can't be parsed."""
+    for offer in offers:
+        parsed = parse_amadeus_flight(offer, trip_type, origin, destination, direct_only)
+        if parsed:
+            yield parsed
+
+
+@timed("amadeus_parse")
 def parse_amadeus_flight(offer: Dict, trip_type: str, origin: str, destination: str, direct_only: bool) -> Optional[Dict]:
     """
     Parse Amadeus flight offer into our standard format.
@@ -222,42 +287,30 @@ def parse_amadeus_flight(offer: Dict, trip_type: str, origin: str, destination:
         depart_time_raw = first_segment.get("departure", {}).get("at", "")
         arrive_time_raw = last_segment.get("arrival", {}).get("at", "")
         
-        # --- CRITICAL FIX: Robust, Standardized Datetime Formatting ---
-        def standardize_datetime(raw_iso_time: str) -> str:
-            if not raw_iso_time:
-                return ""
-            try:
-                # Replace 'Z' (UTC marker) and ensure consistency for parsing
-                iso_time_clean = raw_iso_time.replace('Z', '+00:00')
-                # Parse the ISO string (handles T and timezones)
-                dt_object = datetime.fromisoformat(iso_time_clean) 
-                # Convert back to a standardized, non-timezone-aware string (the target format)
-                return dt_object.strftime("%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                return ""
-            
-        depart_formatted = standardize_datetime(depart_time_raw)
-        arrive_formatted = standardize_datetime(arrive_time_raw)
+        # Normalize once at ingest: UTC epoch + offset. Strings below are derived
+        # from the integers through the memoized formatter.
+        depart_ts, depart_offset = parse_timestamp(depart_time_raw)
+        arrive_ts, arrive_offset = parse_timestamp(arrive_time_raw)
         
         # Return flight (for round-trip)
-        return_depart_formatted = None
-        return_arrive_formatted = None
+        return_depart_ts, return_depart_offset = None, 0
+        return_ts, return_offset = None, 0
         
         if trip_type == "round-trip" and len(itineraries) > 1:
             return_flight = itineraries[1]
             return_segments = return_flight.get("segments", [])
             
             if return_segments:
-                return_first = return_segments[0]
-                return_last = return_segments[-1]
-                
-                return_depart_formatted = standardize_datetime(
-                    return_first.get("departure", {}).get("at", "")
+                return_depart_ts, return_depart_offset = parse_timestamp(
+                    return_segments[0].get("departure", {}).get("at", "")
                 )
-                return_arrive_formatted = standardize_datetime(
-                    return_last.get("arrival", {}).get("at", "")
+                return_ts, return_offset = parse_timestamp(
+                    return_segments[-1].get("arrival", {}).get("at", "")
                 )
 
+        if depart_ts is None:
+            return None
+
         # Get airline
         carrier_code = first_segment.get("carrierCode", "")
         flight_number = first_segment.get("number", "")
@@ -277,20 +330,10 @@ def parse_amadeus_flight(offer: Dict, trip_type: str, origin: str, destination:
         currency = price_info.get("currency", "EUR")
         
         # --- Build Booking Link (Temporary Aviasales Search Link) ---
-        depart_date_only = depart_time_raw[:10] if depart_time_raw else ""
-        return_date_only = return_depart_formatted[:10] if return_depart_formatted else None
-        
-        def date_to_ddmm(date_str):
-            if not date_str or len(date_str) < 10:
-                return ""
-            return date_str[8:10] + date_str[5:7]
-        
-        depart_ddmm = date_to_ddmm(depart_date_only)
-        search_code = f"{origin}{depart_ddmm}{destination}"
+        search_code = f"{origin}{format_epoch(depart_ts, depart_offset, '%d%m')}{destination}"
         
-        if return_date_only:
-            return_ddmm = date_to_ddmm(return_date_only)
-            search_code += return_ddmm
+        if return_depart_ts is not None:
+            search_code += format_epoch(return_depart_ts, return_depart_offset, "%d%m")
         
         # Ensure AFFILIATE_MARKER is available in scope
         booking_link = f"https://www.aviasales.com/search/{search_code}"
@@ -312,13 +355,22 @@ def parse_amadeus_flight(offer: Dict, trip_type: str, origin: str, destination:
             "id": flight_id,
             "airline": carrier_code,
             "flight_number": f"{carrier_code}{flight_number}",
-            "depart": depart_formatted, # GUARANTEED YYYY-MM-DD HH:MM:SS
-            "return": return_arrive_formatted if trip_type == "round-trip" else arrive_formatted,
-            "return_depart": return_depart_formatted,
+            "depart": format_epoch(depart_ts, depart_offset, "%Y-%m-%d %H:%M:%S"),
+            "return": format_epoch(return_ts, return_offset, "%Y-%m-%d %H:%M:%S") if trip_type == "round-trip" else format_epoch(arrive_ts, arrive_offset, "%Y-%m-%d %H:%M:%S"),
+            "return_depart": format_epoch(return_depart_ts, return_depart_offset, "%Y-%m-%d %H:%M:%S") or None,
+            "depart_ts": depart_ts,
+            "depart_offset": depart_offset,
+            "arrive_ts": arrive_ts,
+            "arrive_offset": arrive_offset,
+            "return_depart_ts": return_depart_ts,
+            "return_depart_offset": return_depart_offset,
+            "return_ts": return_ts,
+            "return_offset": return_offset,
             "origin": origin,
             "destination": destination,
             "stops": stops,
             "duration": duration_formatted,
+            "duration_minutes": duration_minutes,
             "price": price,
             "currency": currency,
             "link": booking_link, # Default link
@@ -327,8 +379,7 @@ def parse_amadeus_flight(offer: Dict, trip_type: str, origin: str, destination:
         }
     
     except Exception as e:
-        logger.error(f"Error parsing Amadeus flight: {e}")
-        # traceback.print_exc() # Can uncomment if needed for deep debugging
+        logger.error(f"Error parsing Amadeus flight: {e}", exc_info=DEBUG_MODE)
         return None
 
 
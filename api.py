@@ -0,0 +1,161 @@
+# api.py — versioned JSON API (/api/v1) for mobile and partner integrations
+
+import hashlib
+import math
+from datetime import date
+
+from flask import Blueprint, request
+
+import config
+from config import get_logger
+from flight_search import search_flights as search_flights_func
+from http_utils import admin_token_valid, json_response
+from price_watch import canonical_query, subscribe, unsubscribe
+from result_store import result_sets, duration_minutes
+from search_cache import make_query_key
+from utils import extract_iata
+logger = get_logger(__name__)
+
+api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# Public offer schema, in output order. Timestamps are UTC epoch seconds plus
+# the local UTC offset in minutes.
+OFFER_FIELDS = (
+    "id", "price", "currency", "airline", "flight_number", "origin", "destination",
+    "depart_ts", "depart_offset", "arrive_ts", "arrive_offset",
+    "return_depart_ts", "return_depart_offset", "return_ts", "return_offset",
+    "duration_minutes", "stops", "best_value", "vendor", "link",
+)
+
+
+def api_error(message, status=400):
+    return json_response({"error": message}, status=status)
+
+
+def offer_record(flight, fields):
+    """Project a normalized offer onto the requested public fields."""
+    record = {}
+    for name in fields:
+        if name == "duration_minutes":
+            record[name] = duration_minutes(flight)
+        elif name == "best_value":
+            record[name] = bool(flight.get("best_value"))
+        else:
+            record[name] = flight.get(name)
+    return record
+
+
+@api_bp.route("/search", methods=["GET"])
+def search():
+    """
+    GET /api/v1/search?origin=STO&destination=TYO&date_from=2025-10-10[&date_to=...]
+        [&trip_type=round-trip&adults=1&cabin_class=economy&direct_only=1]
+        [&sort=best|price|duration|depart|stops&limit=10&page=1&fields=id,price,...]
+    """
+    args = request.args
+    origin = extract_iata(args.get("origin", ""))
+    destination = extract_iata(args.get("destination", ""))
+    date_from = args.get("date_from", "")
+    date_to = args.get("date_to") or None
+    trip_type = args.get("trip_type", "round-trip" if date_to else "one-way")
+    if not origin or not destination or not date_from:
+        return api_error("origin, destination and date_from are required")
+    if trip_type not in ("one-way", "round-trip"):
+        return api_error("trip_type must be 'one-way' or 'round-trip'")
+
+    fields = OFFER_FIELDS
+    if args.get("fields"):
+        fields = tuple(f.strip() for f in args["fields"].split(",") if f.strip())
+        unknown = [f for f in fields if f not in OFFER_FIELDS]
+        if unknown:
+            return api_error(f"Unknown fields: {', '.join(unknown)}")
+
+    adults = args.get("adults", 1, type=int) or 1
+    cabin_class = args.get("cabin_class", "economy")
+    direct_only = args.get("direct_only", "").lower() in ("1", "true", "on", "yes")
+    limit = max(1, min(args.get("limit", config.FEATURED_FLIGHT_LIMIT, type=int) or 1, 100))
+
+    try:
+        flights = search_flights_func(
+            origin, destination, date_from,
+            date_to if trip_type == "round-trip" else None,
+            trip_type=trip_type, adults=adults, cabin_class=cabin_class,
+            limit=max(limit, config.RESULT_SET_SIZE), direct_only=direct_only, source="api"
+        )
+    except Exception as e:
+        logger.error(f"❌ API search failed: {e}")
+        return api_error("Search failed", status=502)
+
+    # Deterministic ID: an identical query yields an identical body, so ETags revalidate
+    query_key = make_query_key("api", origin, destination, date_from, date_to, trip_type,
+                               adults, 0, 0, cabin_class, direct_only)
+    search_id = hashlib.blake2b(repr(query_key).encode(), digest_size=16).hexdigest()
+    flights = [f for f in flights if isinstance(f, dict)]
+    result_sets.put(flights, {
+        "origin": origin, "destination": destination, "trip_type": trip_type, "currency": "SEK"
+    }, search_id=search_id)
+    page = result_sets.get(search_id).query(
+        sort=args.get("sort", "best"),
+        page=args.get("page", 1, type=int),
+        per_page=limit,
+    )
+
+    return json_response({
+        "search_id": search_id,
+        "total": page["total"],
+        "page": page["page"],
+        "per_page": page["per_page"],
+        "fields": list(fields),
+        "offers": [offer_record(f, fields) for f in page["offers"]],
+    }, max_age=60)
+
+
+@api_bp.route("/price-alerts", methods=["POST"])
+def create_price_alert():
+    """
+    POST /api/v1/price-alerts  (JSON or form, X-Admin-Token required)
+        origin, destination, date_from[, date_to, trip_type, adults, cabin_class, direct_only],
+        threshold, contact
+    Each watched query is polled upstream every interval, so creating alerts
+    is restricted to trusted callers and capped per contact.
+    """
+    if not admin_token_valid():
+        return api_error("X-Admin-Token required", status=403)
+    data = request.get_json(silent=True) or request.form
+    origin = extract_iata(data.get("origin", ""))
+    destination = extract_iata(data.get("destination", ""))
+    contact = str(data.get("contact", "")).strip()[:200]
+    if not origin or not destination or not data.get("date_from") or not contact:
+        return api_error("origin, destination, date_from and contact are required")
+    try:
+        date_from = date.fromisoformat(str(data.get("date_from")))
+        date_to = date.fromisoformat(str(data.get("date_to"))) if data.get("date_to") else None
+    except ValueError:
+        return api_error("dates must be YYYY-MM-DD")
+    if date_from < date.today() or (date_to is not None and date_to < date_from):
+        return api_error("date_from must not be in the past, nor date_to before date_from")
+    try:
+        threshold = float(data.get("threshold"))
+    except (TypeError, ValueError):
+        return api_error("threshold must be a number")
+    if not math.isfinite(threshold) or threshold <= 0:
+        return api_error("threshold must be a positive number")
+
+    query = canonical_query(
+        origin, destination, date_from.isoformat(), date_to.isoformat() if date_to else None,
+        trip_type=data.get("trip_type", "round-trip" if date_to else "one-way"),
+        adults=int(data.get("adults") or 1), cabin_class=data.get("cabin_class", "economy"),
+        direct_only=str(data.get("direct_only", "")).lower() in ("1", "true", "on", "yes"),
+    )
+    try:
+        subscription_id = subscribe(query, threshold, contact=contact)
+    except ValueError as e:
+        return api_error(str(e), status=429)
+    logger.info(f"🔔 Price alert {subscription_id}: {origin} → {destination} at {threshold}")
+    return json_response({"subscription_id": subscription_id, "query": query, "threshold": threshold}, status=201)
+
+
+@api_bp.route("/price-alerts/<subscription_id>", methods=["DELETE"])
+def delete_price_alert(subscription_id):
+    unsubscribe(subscription_id)
+    return json_response({"subscription_id": subscription_id, "deleted": True})
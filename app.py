@@ -1,12 +1,13 @@
 # app.py — FlightFinder main Flask app (Database-free version)
 
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import uuid
 import logging
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify, session, redirect
 from dotenv import load_dotenv
-# === Import the flight search and merge function ===
-from flight_search import get_combined_flight_results
 import os
 
 # === Load environment variables ===
@@ -21,84 +22,164 @@ API_TOKEN = os.getenv("TRAVELPAYOUTS_API_TOKEN")
 MARKER = os.getenv("TRAVELPAYOUTS_MARKER")
 DEBUG_MODE = os.getenv("DEBUG_MODE", "False").lower() == "true"
 
-# === Initialize Flask app ===
-app = Flask(__name__, static_folder="static")
-app.secret_key = os.getenv("SECRET_KEY", "flightfinder-secret")
-app.config["TEMPLATES_AUTO_RELOAD"] = True
-app.config["ENV"] = FLASK_ENV
-app.config["DEBUG"] = FLASK_ENV == "development"
-
-# === Configure SQLAlchemy (COMMENTED OUT) ===
-# app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
-# app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# === Initialize database (COMMENTED OUT) ===
-# from database import db
-# db.init_app(app)
-
-# === Import models AFTER db.init_app (COMMENTED OUT) ===
-# from models import Booking
-
-# === Register blueprints ===
-from travel_ui import travel_bp
-app.register_blueprint(travel_bp)
-
-# === Create tables (COMMENTED OUT - This was the crash point) ===
-# with app.app_context():
-#     db.create_all()
-
-# === Error handling ===
-@app.errorhandler(500)
-def internal_error(error):
-    return f"Internal Server Error: {error}", 500
-
 # === Logging ===
-from config import get_logger
+from config import get_logger, DEFER_BACKGROUND_SERVICES
 logger = get_logger(__name__)
 
-logging.basicConfig(
-    level=logging.DEBUG if app.config["DEBUG"] else logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler()]
-)
-
-@app.context_processor
-def inject_current_year():
-    return {"current_year": datetime.now().year}
-
-if IS_LOCAL:
-    logging.info("Running in local mode.")
-    
-@app.route('/flights/results', methods=['GET'])
-def flight_search_route():
-    origin = request.args.get('origin')
-    destination = request.args.get('destination')
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
-    
-    direct_only = request.args.get('direct_only') == 'on'
-    adults = request.args.get('adults', type=int) or 1
-    
-    if not all([origin, destination, date_from]):
-        return redirect('/') 
-
-    logger.info(f"Starting combined search: {origin} to {destination} on {date_from}")
-
-    try:
-        final_flights = get_combined_flight_results(
-            origin_code=origin, 
-            destination_code=destination, 
-            date_from_str=date_from, 
-            date_to_str=date_to,
-            direct_only=direct_only,
-            adults=adults,
-        )
-        
-        return render_template('search_results.html', flights=final_flights)
-
-    except Exception as e:
-        logger.error(f"Search failed: {e}")
-        return render_template('search_results.html', error=f"An error occurred during the flight search: {e}", flights=[])
+
+def _ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def create_app():
+    """
+    Builds the app: blueprints, render pipeline, static assets and reference
+    data. Everything here is safe to run once in a gunicorn master with
+    --preload; threads are started by start_background_services() instead.
+    """
+    timings = {"imports_ms": _ms(_IMPORT_STARTED)}
+    started = time.perf_counter()
+
+    # === Initialize Flask app ===
+    app = Flask(__name__, static_folder="static")
+    app.secret_key = os.getenv("SECRET_KEY", "flightfinder-secret")
+    app.config["ENV"] = FLASK_ENV
+    app.config["DEBUG"] = FLASK_ENV == "development"
+
+    # === Configure SQLAlchemy (COMMENTED OUT) ===
+    # app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
+    # app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # === Initialize database (COMMENTED OUT) ===
+    # from database import db
+    # db.init_app(app)
+
+    # === Import models AFTER db.init_app (COMMENTED OUT) ===
+    # from models import Booking
+
+    # === Per-stage timings: Server-Timing headers and /metrics ===
+    from metrics import init_metrics
+    init_metrics(app)
+
+    # === Opt-in cProfile capture (X-Profile + admin token, or 1-in-N sampling) ===
+    from request_profiler import init_profiler
+    init_profiler(app)
+
+    # === Register blueprints ===
+    phase = time.perf_counter()
+    from travel_ui import travel_bp, airport_records
+    app.register_blueprint(travel_bp)
+    from api import api_bp
+    app.register_blueprint(api_bp)
+    from admin import admin_bp, metrics_bp
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
+    timings["blueprints_ms"] = _ms(phase)
+
+    # === Static assets: fingerprinted, precompressed, immutable in production ===
+    phase = time.perf_counter()
+    from assets import init_assets
+    init_assets(app)
+    timings["assets_ms"] = _ms(phase)
+
+    # === Rendering: auto-reload in development; bytecode + fragment caches in production ===
+    # (after the blueprints, whose template filters the templates compile against)
+    phase = time.perf_counter()
+    from render_cache import init_render_pipeline
+    init_render_pipeline(app)
+    timings["templates_ms"] = _ms(phase)
+
+    # === Reference data: built here so preloaded workers share it copy-on-write ===
+    phase = time.perf_counter()
+    airport_records()
+    from nl_parser import gazetteer
+    gazetteer()
+    timings["reference_data_ms"] = _ms(phase)
+
+    # === Create tables (COMMENTED OUT - This was the crash point) ===
+    # with app.app_context():
+    #     db.create_all()
+
+    # === Error handling ===
+    @app.errorhandler(500)
+    def internal_error(error):
+        return f"Internal Server Error: {error}", 500
+
+    @app.context_processor
+    def inject_current_year():
+        return {"current_year": datetime.now().year}
+
+    if IS_LOCAL:
+        logging.info("Running in local mode.")
+
+    @app.route('/flights/results', methods=['GET'])
+    def flight_search_route():
+        from flight_search import get_combined_flight_results
+
+        origin = request.args.get('origin')
+        destination = request.args.get('destination')
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+
+        direct_only = request.args.get('direct_only') == 'on'
+        adults = request.args.get('adults', type=int) or 1
+
+        if not all([origin, destination, date_from]):
+            return redirect('/')
+
+        logger.info(f"Starting combined search: {origin} to {destination} on {date_from}")
+
+        try:
+            final_flights = get_combined_flight_results(
+                origin_code=origin,
+                destination_code=destination,
+                date_from_str=date_from,
+                date_to_str=date_to,
+                direct_only=direct_only,
+                adults=adults,
+            )
+
+            return render_template('search_results.html', flights=final_flights)
+
+        except Exception as e:
+            logger.error(f"Search failed: {e}")
+            return render_template('search_results.html', error=f"An error occurred during the flight search: {e}", flights=[])
+
+    # === CLI: flask --app app startup-profile ===
+    from startup_profile import startup_profile_command
+    app.cli.add_command(startup_profile_command)
+
+    # === Show Registered Routes (debug only) ===
+    if app.debug:
+        for rule in app.url_map.iter_rules():
+            logger.debug(f"Route: {rule}")
+
+    timings["app_ms"] = _ms(started)
+    timings["total_ms"] = _ms(_IMPORT_STARTED)
+    app.config["BOOT_TIMINGS"] = timings
+    logger.info(f"🚀 App ready in {timings['total_ms']} ms (imports {timings['imports_ms']} ms)")
+    return app
+
+
+def start_background_services(app):
+    """Prefetcher and price-watch threads; once per worker process (gunicorn post_fork under --preload)."""
+    started = time.perf_counter()
+
+    # === Background cache warming (off-peak, popular routes) ===
+    from prefetch import start_prefetcher
+    start_prefetcher()
+
+    # === Price alerts engine ===
+    from price_watch import start_price_watch
+    start_price_watch()
+
+    app.config["BOOT_TIMINGS"] = {**app.config.get("BOOT_TIMINGS", {}), "pid": os.getpid(),
+                                  "services_ms": _ms(started)}
+
+
+app = create_app()
+if not DEFER_BACKGROUND_SERVICES:
+    start_background_services(app)
 
 # === Dev-only Debugging ===
 if __name__ == "__main__" and FLASK_ENV == "development":
@@ -106,8 +187,3 @@ if __name__ == "__main__" and FLASK_ENV == "development":
     debugpy.listen(("0.0.0.0", 5681))
     print("Waiting for debugger connection...")
     app.run(host="0.0.0.0", port=PORT, debug=True, use_reloader=False, use_debugger=False)
-
-# === Show Registered Routes ===
-print("Registered routes:")
-for rule in app.url_map.iter_rules():
-    print(rule)
\ No newline at end of file
@@ -0,0 +1,137 @@
+# assets.py — serve fingerprinted static assets (see build_assets.py)
+#
+# In production url_for('static', filename=...) resolves to /assets/<hashed name>,
+# which is served with a one-year immutable Cache-Control and, when the client
+# accepts it, a precompressed .br / .gz sibling. Repeat visits then load every
+# stylesheet, script and icon from the browser cache without revalidating.
+# The service worker is served from /sw.js (root scope) with its cache version
+# and app-shell precache list filled in from the same manifest.
+
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import Blueprint, Response, abort, current_app, request, send_from_directory, url_for
+
+from build_assets import AIRPORTS_BUNDLE, DIST_DIR, MANIFEST_NAME, STATIC_DIR, build_assets, manifest_is_stale
+from config import get_logger, ASSET_BUILD_ON_BOOT, ASSET_MAX_AGE
+from http_utils import negotiate_encoding
+logger = get_logger(__name__)
+
+assets_bp = Blueprint("assets", __name__)
+
+_manifest = {}
+_service_worker = None
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+SERVICE_WORKER_SOURCE = os.path.join(STATIC_DIR, "sw.js")
+# App shell: pages and static files every visit needs, precached by the service worker
+SHELL_PAGES = ("travel.travel_ui", "travel.offline")
+SHELL_STATIC = ("styles.css", "js/flightFinder.js", "manifest.json", "icon-192.png", "icon-512.png")
+SHELL_BUNDLES = (AIRPORTS_BUNDLE,)
+
+
+def load_manifest(dist_dir: str = DIST_DIR) -> dict:
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url_for(endpoint, **values):
+    """url_for for templates: fingerprinted URL for known static files, plain url_for otherwise."""
+    if endpoint == "static" and _manifest:
+        hashed = _manifest.get(values.get("filename", "").lstrip("/"))
+        if hashed:
+            values["filename"] = hashed
+            return url_for("assets.asset", **values)
+    return url_for(endpoint, **values)
+
+
+def bundle_url(name: str) -> str:
+    """URL of a generated bundle, or '' when none was built (debug, or no build yet)."""
+    hashed = _manifest.get(name)
+    return url_for("assets.asset", filename=hashed) if hashed else ""
+
+
+@assets_bp.route("/assets/<path:filename>")
+def asset(filename):
+    if filename == MANIFEST_NAME:
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    coding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    served = filename
+    for name, suffix in PRECOMPRESSED:
+        if coding == name and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            served = filename + suffix
+            break
+    else:
+        coding = ""
+
+    response = send_from_directory(DIST_DIR, served, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    response.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    response.headers["Vary"] = "Accept-Encoding"
+    if coding:
+        response.headers["Content-Encoding"] = coding
+    return response
+
+
+def render_service_worker() -> bytes:
+    """static/sw.js with its version and precache list filled in for the current asset set."""
+    urls = [url_for(endpoint) for endpoint in SHELL_PAGES]
+    urls += [asset_url_for("static", filename=name) for name in SHELL_STATIC
+             if os.path.isfile(os.path.join(STATIC_DIR, name))]
+    urls += [url for url in map(bundle_url, SHELL_BUNDLES) if url]
+    with open(SERVICE_WORKER_SOURCE, "rb") as f:
+        source = f.read()
+
+    digest = hashlib.blake2b(source, digest_size=6)
+    digest.update("\n".join(urls).encode())
+    if not _manifest:  # unfingerprinted URLs: version on content instead
+        for name in SHELL_STATIC:
+            try:
+                digest.update(str(os.path.getmtime(os.path.join(STATIC_DIR, name))).encode())
+            except OSError:
+                pass
+    return (source.replace(b"__SW_VERSION__", digest.hexdigest().encode())
+                  .replace(b"__PRECACHE_URLS__", json.dumps(urls).encode()))
+
+
+@assets_bp.route("/sw.js")
+def service_worker():
+    """Root-scoped service worker; always revalidated so new versions install promptly."""
+    global _service_worker
+    body = _service_worker
+    if body is None:
+        body = render_service_worker()
+        if not current_app.debug:
+            _service_worker = body
+    response = Response(body, mimetype="application/javascript")
+    response.headers["Cache-Control"] = "no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def init_assets(app) -> None:
+    """
+    Registers /assets and, outside debug, routes url_for('static') through the
+    manifest (rebuilding static/dist first when sources are newer). Debug keeps
+    plain /static URLs so edits show up on reload.
+    """
+    global _manifest
+    app.register_blueprint(assets_bp)
+    app.jinja_env.globals["url_for"] = asset_url_for
+    app.jinja_env.globals["bundle_url"] = bundle_url
+    if app.debug:
+        return
+
+    if ASSET_BUILD_ON_BOOT and manifest_is_stale():
+        try:
+            build_assets()
+        except OSError as e:
+            logger.warning(f"Static asset build failed, serving unfingerprinted files: {e}")
+    _manifest = load_manifest()
+    if _manifest:
+        logger.info(f"🧷 Serving {len(_manifest)} fingerprinted static assets from /assets")
@@ -0,0 +1,112 @@
+# bench_dates.py — how date strings split across normalize_date's paths, and what each costs
+#
+# Usage: python bench_dates.py [--calls 20000] [--seed 7] [--no-dateparser]
+#
+# Replays a traffic-shaped mix of date strings (mostly ISO from flight offers
+# and forms, some typed dates and phrases, a few oddities) through
+# normalize_date, then reports the memo hit rate, the share of calls each
+# path answered, the per-path cost without the memo, and plain
+# dateparser.parse on the same inputs for comparison.
+
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from date_normalize import date_stats, normalize_date, reset_stats, resolve
+
+TODAY = date.today()
+
+PHRASES = ["today", "tomorrow", "next monday", "friday", "this weekend", "in 3 weeks", "in 10 days",
+           "on saturday", "next fri", "day after tomorrow"]
+TYPED = ["5/11", "24.12", "12/10/2025", "10 sep", "Oct 5", "3rd of march", "December 24, 2026", "1 jan 2027"]
+RARE = ["the 3rd of next month", "end of march", "2 weeks from now", "20251210", "next month", "a week from friday"]
+
+
+def corpus(calls: int, seed: int):
+    """~80% ISO (dates and datetimes), ~12% typed forms, ~6% phrases, ~2% rare."""
+    rng = random.Random(seed)
+    for _ in range(calls):
+        roll = rng.random()
+        if roll < 0.8:
+            day = TODAY + timedelta(days=rng.randint(0, 330))
+            yield day.isoformat() if rng.random() < 0.7 else f"{day.isoformat()}T{rng.randint(0, 23):02d}:{rng.choice(('05', '30', '45'))}:00"
+        elif roll < 0.92:
+            yield rng.choice(TYPED)
+        elif roll < 0.98:
+            yield rng.choice(PHRASES)
+        else:
+            yield rng.choice(RARE)
+
+
+def _per_call_us(func, items, rounds: int = 1) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - started) / (len(items) * rounds) * 1e6
+
+
+def run(calls: int, seed: int, with_dateparser: bool = True) -> dict:
+    inputs = list(corpus(calls, seed))
+    distinct = sorted(set(inputs))
+    reset_stats()
+
+    # Cold: the first pass also pays the one-off dateparser import for the rare strings
+    started = time.perf_counter()
+    for text in inputs:
+        normalize_date(text, TODAY)
+    total_s = time.perf_counter() - started
+    stats = date_stats()
+
+    by_path, path_of = {}, {}
+    for text in distinct:
+        path_of[text] = resolve(text, TODAY)[0]
+        by_path.setdefault(path_of[text], []).append(text)
+    calls_by_path = Counter(path_of[text] for text in inputs)
+    path_cost = {path: _per_call_us(lambda t: resolve(t, TODAY), texts, rounds=max(1, 200 // len(texts)))
+                 for path, texts in by_path.items()}
+    memo_cost = _per_call_us(lambda t: normalize_date(t, TODAY), inputs[:5000])
+
+    report = {
+        "calls": calls,
+        "distinct": len(distinct),
+        "total_ms": round(total_s * 1000, 1),
+        "memo_hit_rate": round(stats["memo_hits"] / calls, 3),
+        "memo_hit_us": round(memo_cost, 2),
+        "paths": {path: {"share": round(calls_by_path[path] / calls, 4), "distinct": len(texts),
+                         "us_per_parse": round(path_cost[path], 1), "examples": texts[:3]}
+                  for path, texts in sorted(by_path.items(), key=lambda kv: -calls_by_path[kv[0]])},
+    }
+    if with_dateparser:
+        import dateparser
+        sample = distinct[:300]
+        dateparser.parse(sample[0])  # language data loaded before timing
+        report["dateparser_us"] = round(_per_call_us(dateparser.parse, sample), 1)
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"📅 {report['calls']} calls, {report['distinct']} distinct strings, {report['total_ms']} ms total",
+             f"   memo hit rate {report['memo_hit_rate'] * 100:.1f}% at {report['memo_hit_us']} µs per hit", "",
+             f"   {'path':<14}{'calls':>8}{'distinct':>10}{'µs/parse':>12}   examples"]
+    lines += [f"   {path:<14}{p['share'] * 100:>7.2f}%{p['distinct']:>10}{p['us_per_parse']:>12}   "
+              f"{', '.join(p['examples'])}"
+              for path, p in report["paths"].items()]
+    if "dateparser_us" in report:
+        lines += ["", f"   dateparser.parse on the same strings: {report['dateparser_us']} µs per call"]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="normalize_date path distribution and cost")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-dateparser", action="store_true", help="skip the dateparser comparison")
+    args = parser.parse_args(argv)
+    print(format_report(run(args.calls, args.seed, not args.no_dateparser)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# build_assets.py — fingerprint and precompress static assets into static/dist
+#
+# Usage: python build_assets.py
+#
+# Every asset under static/ is copied to static/dist/ with a content hash in its
+# name (styles.css -> styles.3f9a1c2b7e.css), plus .gz / .br siblings for text
+# types. assets-manifest.json maps original paths to hashed ones; the app
+# rewrites url_for('static', ...) through it and serves dist/ as immutable.
+#
+# Generated bundles are fingerprinted the same way: data/airports.json is the
+# autocomplete index shipped to the browser (see setupAirportAutocomplete).
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped when brotli is not installed
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "assets-manifest.json"
+
+ASSET_EXTENSIONS = {".css", ".js", ".json", ".png", ".jpg", ".jpeg", ".svg", ".ico", ".webp", ".woff2"}
+COMPRESSIBLE = {".css", ".js", ".json", ".svg"}
+# Served from fixed URLs on purpose: the service worker's scope depends on its path
+EXCLUDE = {"sw.js"}
+
+AIRPORTS_SOURCE = os.path.join(BASE_DIR, "airports.json")
+AIRPORTS_BUNDLE = "data/airports.json"
+
+
+def source_assets(static_dir: str = STATIC_DIR):
+    """Relative paths ('js/flightFinder.js') of every fingerprintable asset."""
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != DIST_DIR]
+        for name in sorted(files):
+            rel = os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, "/")
+            if rel not in EXCLUDE and os.path.splitext(name)[1].lower() in ASSET_EXTENSIONS:
+                yield rel
+
+
+def manifest_is_stale(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> bool:
+    manifest = os.path.join(dist_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest):
+        return True
+    built = os.path.getmtime(manifest)
+    sources = [os.path.join(static_dir, rel) for rel in source_assets(static_dir)] + [AIRPORTS_SOURCE]
+    return any(os.path.exists(path) and os.path.getmtime(path) > built for path in sources)
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def airport_bundle(source: str = AIRPORTS_SOURCE) -> bytes:
+    """[iata, city, name, links_count] rows, busiest airports first, as compact JSON."""
+    with open(source, encoding="utf-8") as f:
+        airports = json.load(f)
+    rows = [
+        [a["iata_code"].upper(), a.get("city") or "", a.get("name") or "", int(a.get("links_count") or 0)]
+        for a in airports if a.get("iata_code")
+    ]
+    rows.sort(key=lambda r: (-r[3], r[0]))
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _emit(rel: str, data: bytes, dist_dir: str, keep: set) -> str:
+    """Writes one fingerprinted file (+ compressed siblings) and returns its hashed name."""
+    stem, ext = os.path.splitext(rel)
+    hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+    out = os.path.join(dist_dir, hashed)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    keep.add(hashed)
+
+    if not os.path.exists(out):  # content-addressed: an existing file is already correct
+        _write_atomic(out, data)
+    if ext.lower() in COMPRESSIBLE:
+        keep.add(hashed + ".gz")
+        if not os.path.exists(out + ".gz"):
+            _write_atomic(out + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            keep.add(hashed + ".br")
+            if not os.path.exists(out + ".br"):
+                _write_atomic(out + ".br", brotli.compress(data, quality=11))
+    return hashed
+
+
+def build_assets(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR, verbose: bool = False) -> dict:
+    """Builds dist/ and returns the {original: hashed} manifest."""
+    started = time.perf_counter()
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    keep = {MANIFEST_NAME}
+
+    for rel in source_assets(static_dir):
+        with open(os.path.join(static_dir, rel), "rb") as f:
+            manifest[rel] = _emit(rel, f.read(), dist_dir, keep)
+        if verbose:
+            print(f"  {rel} -> dist/{manifest[rel]}")
+
+    if os.path.exists(AIRPORTS_SOURCE):
+        manifest[AIRPORTS_BUNDLE] = _emit(AIRPORTS_BUNDLE, airport_bundle(), dist_dir, keep)
+        if verbose:
+            print(f"  airports.json -> dist/{manifest[AIRPORTS_BUNDLE]}")
+
+    # Drop fingerprints no longer referenced
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            rel = os.path.relpath(os.path.join(root, name), dist_dir).replace(os.sep, "/")
+            if rel not in keep and not rel.endswith(".tmp"):
+                os.remove(os.path.join(root, name))
+
+    _write_atomic(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    if verbose:
+        print(f"✅ {len(manifest)} assets built in {(time.perf_counter() - started) * 1000:.0f} ms "
+              f"(brotli {'on' if brotli else 'off'})")
+    return manifest
+
+
+def clean(dist_dir: str = DIST_DIR):
+    shutil.rmtree(dist_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    build_assets(verbose=True)
@@ -0,0 +1,151 @@
+# click_tracking.py — outbound affiliate clicks, recorded off the request path
+#
+# Redirect views call track_click(), which only appends a small tuple to a
+# ring buffer (collections.deque: append/popleft are atomic, no lock taken).
+# A background writer drains it in batches, resolves route, vendor gate and
+# time-since-search from the stored result set, and hands the records to the
+# query log as kind="click". Clicks still buffered at exit are drained into the
+# query log before its own final flush.
+
+import atexit
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from config import get_logger, CLICK_BUFFER_SIZE, CLICK_FLUSH_INTERVAL
+from query_log import query_log
+from result_store import result_sets
+logger = get_logger(__name__)
+
+# Tracking parameters added to result links by the results page; never forwarded to partners
+TRACKING_PARAMS = ("ff_sid", "ff_rank", "ff_offer")
+
+# Aviasales path codes: ORIGIN + ddmm + DESTINATION [+ ddmm] + passengers
+_SEARCH_CODE = re.compile(r"^([A-Za-z]{3})\d{4}([A-Za-z]{3})")
+
+
+def split_tracking(query_string: str):
+    """(partner query string without ff_* params, {param: value} of the tracking ones)."""
+    if "ff_" not in query_string:
+        return query_string, {}
+    pairs = parse_qsl(query_string, keep_blank_values=True)
+    tracking = {k: v for k, v in pairs if k in TRACKING_PARAMS}
+    return urlencode([(k, v) for k, v in pairs if k not in TRACKING_PARAMS]), tracking
+
+
+class ClickTracker:
+    """
+    Bounded ring of raw click tuples plus one writer thread per process.
+    When the writer falls behind, the oldest clicks are overwritten (and counted).
+    """
+
+    def __init__(self, size: int = CLICK_BUFFER_SIZE, flush_interval: float = CLICK_FLUSH_INTERVAL, sink=None):
+        self._ring = deque(maxlen=size)
+        self.flush_interval = flush_interval
+        self._sink = sink or query_log.log
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.tracked = 0
+        self.written = 0
+        self.overwritten = 0
+
+    # --- request side ---
+
+    def track(self, endpoint: str, search_id: Optional[str] = None, rank=None, offer_id: Optional[str] = None,
+              search_code: Optional[str] = None, gate: Optional[str] = None) -> None:
+        if self._pid != os.getpid() or self._thread is None:
+            self._ensure_started()
+        if len(self._ring) == self._ring.maxlen:
+            self.overwritten += 1
+        self._ring.append((time.time(), endpoint, search_id, rank, offer_id, search_code, gate))
+        self.tracked += 1
+
+    def _ensure_started(self):
+        # Same lazy, fork-aware start as the query log flusher
+        with self._start_lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="click-writer", daemon=True)
+                self._thread.start()
+
+    # --- writer side ---
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.drain()
+
+    def drain(self) -> int:
+        """Moves everything buffered so far into the log; returns the number of clicks written."""
+        batch = []
+        try:
+            while True:
+                batch.append(self._ring.popleft())
+        except IndexError:
+            pass
+        for raw in batch:
+            try:
+                self._sink(self.record(*raw))
+            except Exception as e:
+                logger.warning(f"Click record dropped: {e}")
+        self.written += len(batch)
+        return len(batch)
+
+    @staticmethod
+    def record(ts, endpoint, search_id, rank, offer_id, search_code, gate) -> Dict:
+        """Compact click record, enriched from the result set the click came from."""
+        record = {"ts": int(ts), "kind": "click", "endpoint": endpoint}
+        result_set = result_sets.get(search_id) if search_id else None
+        offer = None
+        if result_set is not None:
+            record["origin"] = result_set.meta.get("origin")
+            record["destination"] = result_set.meta.get("destination")
+            if offer_id:
+                offer = next((o for o in result_set.offers if o.get("id") == offer_id), None)
+        elif search_code:
+            match = _SEARCH_CODE.match(search_code)
+            if match:
+                record["origin"], record["destination"] = match.group(1).upper(), match.group(2).upper()
+        if offer_id:
+            record["offer"] = offer_id
+        if rank is not None and str(rank).isdigit():
+            record["rank"] = int(rank)
+        gate = gate or (offer or {}).get("vendor")
+        if gate:
+            record["gate"] = gate
+        if search_id:
+            record["search_id"] = search_id
+            if result_set is not None:
+                record["since_search_ms"] = round((ts - result_set.created) * 1000)
+        return record
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stops the writer and drains the ring (registered atexit)."""
+        self._stop.set()
+        if self._pid == os.getpid() and self._thread is not None:
+            self._thread.join(timeout)
+        self.drain()
+
+    def stats(self) -> Dict:
+        return {"buffered": len(self._ring), "tracked": self.tracked, "written": self.written,
+                "overwritten": self.overwritten}
+
+
+click_tracker = ClickTracker()
+# atexit runs last-registered first: this drain lands before query_log.close() writes the queue out
+atexit.register(click_tracker.close)
+
+
+def track_click(endpoint: str, tracking: Dict, offer_id: Optional[str] = None,
+                search_code: Optional[str] = None, gate: Optional[str] = None) -> None:
+    """Records one outbound click; constant time, never raises into the redirect."""
+    try:
+        click_tracker.track(endpoint, tracking.get("ff_sid"), tracking.get("ff_rank"),
+                            offer_id or tracking.get("ff_offer"), search_code, gate)
+    except Exception as e:
+        logger.debug(f"Click not tracked: {e}")
@@ -4,10 +4,13 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Settings read without a value or default; reported once logging is configured
+_missing_settings = []
+
 def get_env_var(name, default=None):
     value = os.getenv(name, default)
     if value is None:
-        print(f"⚠️ WARNING: {name} is not set in the environment. Using default: {default}")
+        _missing_settings.append(name)
     return value
 
 def get_env_boolean(var_name, default=False):
@@ -56,15 +59,118 @@ FORCE_AMADEUS = get_env_boolean("FORCE_AMADEUS", default=False)
 # === Other Settings ===
 FEATURED_FLIGHT_LIMIT = int(get_env_var("FEATURED_FLIGHT_LIMIT", 4))
 
+# === Search Cache & Quota ===
+RESULT_CACHE_TTL = int(get_env_var("RESULT_CACHE_TTL", 900))  # seconds
+RESULT_CACHE_MAX_ENTRIES = int(get_env_var("RESULT_CACHE_MAX_ENTRIES", 500))
+AMADEUS_MONTHLY_QUOTA = int(get_env_var("AMADEUS_MONTHLY_QUOTA", 2000))  # 0 = unlimited
+QUOTA_STATE_DIR = get_env_var("QUOTA_STATE_DIR", "cache/quota")  # monthly call counters shared by all workers
+RESULT_STORE_MAX_SEARCHES = int(get_env_var("RESULT_STORE_MAX_SEARCHES", 200))  # full offer sets kept for refinement
+RESULT_STORE_TTL = int(get_env_var("RESULT_STORE_TTL", 1800))  # seconds
+RESULT_SET_SIZE = int(get_env_var("RESULT_SET_SIZE", 50))  # offers fetched per search (shown: the form's limit)
+OFFER_STORE_BACKEND = get_env_var("OFFER_STORE_BACKEND", "memory")  # memory | sqlite:<path> (shared by workers)
+OFFER_STORE_MAX_SESSIONS = int(get_env_var("OFFER_STORE_MAX_SESSIONS", 2000))  # sessions whose offers are kept
+OFFER_STORE_MAX_OFFERS = int(get_env_var("OFFER_STORE_MAX_OFFERS", 200))  # offers kept per session
+OFFER_STORE_TTL = int(get_env_var("OFFER_STORE_TTL", RESULT_STORE_TTL))  # seconds
+
+# === Hedged Amadeus Requests ===
+HEDGE_ENABLED = get_env_boolean("HEDGE_ENABLED", True)  # duplicate flight-offers calls stuck past the live p95
+HEDGE_QUANTILE = float(get_env_var("HEDGE_QUANTILE", 0.95))  # latency quantile that triggers the hedge
+HEDGE_MIN_SAMPLES = int(get_env_var("HEDGE_MIN_SAMPLES", 20))  # calls observed before hedging starts
+HEDGE_WINDOW = int(get_env_var("HEDGE_WINDOW", 500))  # observations per estimator window (tracks drift)
+HEDGE_MIN_DELAY = float(get_env_var("HEDGE_MIN_DELAY", 0.25))  # seconds; never hedge sooner than this
+HEDGE_MAX_RATIO = float(get_env_var("HEDGE_MAX_RATIO", 0.1))  # at most this share of calls get a duplicate
+HEDGE_MAX_WORKERS = int(get_env_var("HEDGE_MAX_WORKERS", 8))  # threads running hedges (primaries get their own)
+HEDGE_QUOTA_RESERVE = int(get_env_var("HEDGE_QUOTA_RESERVE", 400))  # hedges stop with this many calls left
+
+# === Flexible Dates ===
+FLEX_MAX_DAYS = int(get_env_var("FLEX_MAX_DAYS", 3))        # largest allowed ±N
+FLEX_MAX_WORKERS = int(get_env_var("FLEX_MAX_WORKERS", 4))  # concurrent cell searches
+FLEX_MAX_CALLS = int(get_env_var("FLEX_MAX_CALLS", 25))     # upstream calls per calendar
+FLEX_QUOTA_RESERVE = int(get_env_var("FLEX_QUOTA_RESERVE", 200))  # calls kept for normal searches
+
+# === Multi-City ===
+MULTI_CITY_MIN_CONNECTION = int(get_env_var("MULTI_CITY_MIN_CONNECTION", 120))  # minutes between legs
+MULTI_CITY_LEG_LIMIT = int(get_env_var("MULTI_CITY_LEG_LIMIT", 20))  # offers fetched per leg
+MULTI_CITY_MAX_EXPANSIONS = int(get_env_var("MULTI_CITY_MAX_EXPANSIONS", 2000))  # heap pops per search
+
+# === Query Log & Prefetch ===
+QUERY_LOG_PATH = get_env_var("QUERY_LOG_PATH", "logs/queries.jsonl")
+QUERY_LOG_QUEUE_SIZE = int(get_env_var("QUERY_LOG_QUEUE_SIZE", 10000))  # records buffered before dropping
+QUERY_LOG_FLUSH_INTERVAL = float(get_env_var("QUERY_LOG_FLUSH_INTERVAL", 1.0))  # seconds between batch writes
+QUERY_LOG_FSYNC_INTERVAL = float(get_env_var("QUERY_LOG_FSYNC_INTERVAL", 5.0))  # seconds between fsyncs
+QUERY_LOG_MAX_BYTES = int(get_env_var("QUERY_LOG_MAX_BYTES", 64 * 1024 * 1024))  # rotate past this size
+QUERY_LOG_ROTATE_SECONDS = int(get_env_var("QUERY_LOG_ROTATE_SECONDS", 86400))  # ...or this age
+CLICK_BUFFER_SIZE = int(get_env_var("CLICK_BUFFER_SIZE", 4096))  # outbound clicks buffered (oldest overwritten)
+CLICK_FLUSH_INTERVAL = float(get_env_var("CLICK_FLUSH_INTERVAL", 2.0))  # seconds between click batches
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # unset = admin endpoints disabled
+PREFETCH_ENABLED = get_env_boolean("PREFETCH_ENABLED", default=True)
+PREFETCH_TOP_ROUTES = int(get_env_var("PREFETCH_TOP_ROUTES", 30))
+PREFETCH_WINDOWS_PER_ROUTE = int(get_env_var("PREFETCH_WINDOWS_PER_ROUTE", 3))  # (days ahead, stay) pairs per route
+PREFETCH_LOOKBACK_DAYS = int(get_env_var("PREFETCH_LOOKBACK_DAYS", 14))  # query log history used for the plan
+PREFETCH_QUOTA_SHARE = float(get_env_var("PREFETCH_QUOTA_SHARE", 0.15))  # fraction of AMADEUS_MONTHLY_QUOTA
+PREFETCH_OFFPEAK_START = int(get_env_var("PREFETCH_OFFPEAK_START", 1))  # server-local hour, inclusive
+PREFETCH_OFFPEAK_END = int(get_env_var("PREFETCH_OFFPEAK_END", 6))  # server-local hour, exclusive
+PREFETCH_INTERVAL = int(get_env_var("PREFETCH_INTERVAL", 900))  # seconds between scheduler wake-ups
+PREFETCH_CACHE_TTL = int(get_env_var("PREFETCH_CACHE_TTL", 6 * 3600))  # warm entries must outlive the off-peak window
+PREFETCH_DIR = get_env_var("PREFETCH_DIR", "cache/warm")  # shared by all worker processes
+
+# === Price Alerts ===
+PRICE_WATCH_ENABLED = get_env_boolean("PRICE_WATCH_ENABLED", default=True)
+PRICE_WATCH_INTERVAL = int(get_env_var("PRICE_WATCH_INTERVAL", 3 * 3600))  # seconds between checks per query
+PRICE_WATCH_JITTER = float(get_env_var("PRICE_WATCH_JITTER", 0.1))  # ± fraction of the interval
+PRICE_WATCH_JOURNAL = get_env_var("PRICE_WATCH_JOURNAL", "cache/price_watches.jsonl")
+PRICE_WATCH_SINK = get_env_var("PRICE_WATCH_SINK", "log")  # log | file:<path> | webhook:<url>
+PRICE_WATCH_MAX_QUERIES = int(get_env_var("PRICE_WATCH_MAX_QUERIES", 200))  # distinct watched queries, all contacts
+PRICE_WATCH_MAX_PER_CONTACT = int(get_env_var("PRICE_WATCH_MAX_PER_CONTACT", 10))  # distinct queries per contact
+
+# === Rendering (production) ===
+TEMPLATE_CACHE_DIR = get_env_var("TEMPLATE_CACHE_DIR", "cache/jinja")  # compiled template bytecode, shared by workers
+CARD_CACHE_MAX_ENTRIES = int(get_env_var("CARD_CACHE_MAX_ENTRIES", 5000))  # rendered flight cards kept
+CARD_CACHE_TTL = int(get_env_var("CARD_CACHE_TTL", RESULT_STORE_TTL))  # seconds
+
+# === Startup ===
+# Set by gunicorn.conf.py under --preload: background threads start in each worker (post_fork), not the master
+DEFER_BACKGROUND_SERVICES = get_env_boolean("DEFER_BACKGROUND_SERVICES", False)
+
+# === Static Assets ===
+ASSET_BUILD_ON_BOOT = get_env_boolean("ASSET_BUILD_ON_BOOT", True)  # rebuild static/dist at startup when stale
+ASSET_MAX_AGE = int(get_env_var("ASSET_MAX_AGE", 31536000))  # fingerprinted files never change: cache for a year
+
+# === Date Parsing ===
+DATE_MEMO_SIZE = int(get_env_var("DATE_MEMO_SIZE", 4096))  # (text, reference date) pairs remembered by normalize_date
+
+# === Metrics ===
+METRICS_DIR = get_env_var("METRICS_DIR", "cache/metrics")  # per-worker histogram snapshots merged by /metrics
+METRICS_DUMP_INTERVAL = float(get_env_var("METRICS_DUMP_INTERVAL", 5))  # seconds between snapshots per worker
+
+# === Request Profiling ===
+PROFILE_SAMPLE_RATE = int(get_env_var("PROFILE_SAMPLE_RATE", 0))  # profile 1 in N requests (0 = only X-Profile + admin token)
+PROFILE_DIR = get_env_var("PROFILE_DIR", "logs/profiles")  # .prof captures with .json metadata
+PROFILE_MAX_FILES = int(get_env_var("PROFILE_MAX_FILES", 50))  # newest captures kept per directory
+
 # === Logging Configuration ===
+LOG_ASYNC = get_env_boolean("LOG_ASYNC", True)  # hand records to a listener thread instead of writing stderr inline
+LOG_QUEUE_SIZE = int(get_env_var("LOG_QUEUE_SIZE", 10000))  # records buffered before new ones are dropped
+LOG_RATE_LIMIT_WINDOW = float(get_env_var("LOG_RATE_LIMIT_WINDOW", 60))  # seconds
+LOG_RATE_LIMIT_BURST = int(get_env_var("LOG_RATE_LIMIT_BURST", 5))  # records per call site per window (0 = unlimited)
+LOG_SAMPLE_EVERY = int(get_env_var("LOG_SAMPLE_EVERY", 100))  # past the burst, keep 1 in N (0 = drop all)
+
 def setup_logging():
+    from log_pipeline import install
     log_level = logging.DEBUG if DEBUG_MODE else logging.INFO
-    logging.basicConfig(
-        level=log_level,
-        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-        handlers=[logging.StreamHandler()]
+    install(
+        log_level,
+        '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        use_async=LOG_ASYNC,
+        queue_size=LOG_QUEUE_SIZE,
+        window=LOG_RATE_LIMIT_WINDOW,
+        burst=LOG_RATE_LIMIT_BURST,
+        sample_every=LOG_SAMPLE_EVERY,
     )
 
 setup_logging()
 def get_logger(name):
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
+
+if _missing_settings:
+    get_logger(__name__).warning(f"⚠️ Not set in the environment, using defaults: {', '.join(_missing_settings)}")
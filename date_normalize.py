@@ -0,0 +1,79 @@
+# date_normalize.py — date strings to datetimes without dateparser on the hot path
+#
+#     normalize_date("2025-12-10T10:30")  normalize_date("5/11")  normalize_date("next monday")
+#
+# Tried in order, cheapest first:
+#   iso        datetime.fromisoformat ("2025-12-10", "2025-12-10T10:30:00")
+#   <form>     one of nl_parser's date forms spanning the whole string: dmy,
+#              day_month, month_day, relative, weekday, weekend, in
+#   dateparser everything else, imported on first use (~0.6 s) and memoized
+# Results are memoized per (text, reference date), so relative phrases move on
+# at midnight. date_stats() reports memo hits and which path answered.
+
+import threading
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from config import get_logger, DATE_MEMO_SIZE
+from nl_parser import match_date
+logger = get_logger(__name__)
+
+_paths = {}  # path -> parses that reached it (memo misses only)
+_paths_lock = threading.Lock()
+
+
+def _count(path: str) -> None:
+    with _paths_lock:
+        _paths[path] = _paths.get(path, 0) + 1
+
+
+def _dateparser_parse(text: str, today: date) -> Optional[datetime]:
+    import dateparser
+    # English only: language auto-detection is most of dateparser's cost on strings it cannot parse
+    return dateparser.parse(text, languages=["en"], settings={"RELATIVE_BASE": datetime.combine(today, time())})
+
+
+def resolve(text: str, today: date) -> Tuple[str, Optional[datetime]]:
+    """(path, datetime or None) without the memo."""
+    if len(text) >= 10 and text[4] == "-" and text[:4].isdigit():
+        try:
+            return "iso", datetime.fromisoformat(text)
+        except ValueError:
+            pass
+    matched = match_date(text, today)
+    if matched is not None:
+        return matched[0], datetime.combine(matched[1], time())
+    try:
+        parsed = _dateparser_parse(text, today)
+    except Exception as e:
+        logger.warning(f"⚠️ dateparser failed on {text!r}: {e}")
+        parsed = None
+    return ("dateparser" if parsed else "unparsed"), parsed
+
+
+@lru_cache(maxsize=DATE_MEMO_SIZE)
+def _normalize(text: str, today: date) -> Optional[datetime]:
+    path, value = resolve(text, today)
+    _count(path)
+    return value
+
+
+def normalize_date(text, today: Optional[date] = None) -> Optional[datetime]:
+    """A datetime (midnight unless the text has a time) or None when nothing parses."""
+    if not text:
+        return None
+    return _normalize(str(text).strip(), today or date.today())
+
+
+def date_stats() -> Dict:
+    info = _normalize.cache_info()
+    with _paths_lock:
+        paths = dict(_paths)
+    return {"memo_hits": info.hits, "memo_misses": info.misses, "memo_size": info.currsize, "paths": paths}
+
+
+def reset_stats() -> None:
+    _normalize.cache_clear()
+    with _paths_lock:
+        _paths.clear()
@@ -0,0 +1,182 @@
+# flex_search.py — flexible-date search producing a (depart × return) price calendar
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import get_logger, USE_REAL_API
+from config import FLEX_MAX_DAYS, FLEX_MAX_WORKERS, FLEX_MAX_CALLS, FLEX_QUOTA_RESERVE
+from search_cache import TTLCache, result_cache, make_query_key
+from quota import amadeus_quota
+logger = get_logger(__name__)
+
+# Cells hold only the cheapest offer, so a small per-cell search is enough
+FLEX_CELL_LIMIT = 5
+
+# One shared pool caps concurrent upstream calls across all users
+_executor = ThreadPoolExecutor(max_workers=FLEX_MAX_WORKERS, thread_name_prefix="flex")
+
+# Running/finished calendars, polled by the UI until complete
+flex_jobs = TTLCache(max_entries=200, ttl=1800)
+
+
+class FlexSearchJob:
+    """A price calendar that fills in cell by cell as searches complete."""
+
+    def __init__(self, origin, destination, depart_dates, return_dates, trip_type,
+                 adults=1, cabin_class="economy", direct_only=False):
+        self.job_id = uuid.uuid4().hex
+        self.origin = origin
+        self.destination = destination
+        self.depart_dates = depart_dates
+        self.return_dates = return_dates  # [None] for one-way
+        self.trip_type = trip_type
+        self.adults = adults
+        self.cabin_class = cabin_class
+        self.direct_only = direct_only
+        self.created = time.time()
+        self.calls_used = 0
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._pending = 0
+
+    def cell_key(self, depart, ret):
+        return make_query_key(
+            "cell", self.origin, self.destination, depart, ret, self.trip_type,
+            self.adults, 0, 0, self.cabin_class, self.direct_only
+        )
+
+    def set_cell(self, depart, ret, status, offer=None):
+        with self._lock:
+            self._cells[(depart, ret)] = {"status": status, "offer": offer}
+            if status not in ("pending", "invalid"):
+                self._pending -= 1
+
+    def take_call(self) -> bool:
+        """Per-calendar call budget on top of the global Amadeus quota."""
+        with self._lock:
+            if self.calls_used >= FLEX_MAX_CALLS:
+                return False
+            self.calls_used += 1
+            return True
+
+    @property
+    def complete(self) -> bool:
+        with self._lock:
+            return self._pending <= 0
+
+    def snapshot(self) -> Dict:
+        """JSON-ready view of the matrix: rows are departure dates, columns return dates."""
+        with self._lock:
+            rows = []
+            cheapest = None
+            for depart in self.depart_dates:
+                row = []
+                for ret in self.return_dates:
+                    cell = self._cells.get((depart, ret), {"status": "pending", "offer": None})
+                    offer = cell["offer"]
+                    price = offer.get("price") if offer else None
+                    row.append({
+                        "depart": depart,
+                        "return": ret,
+                        "status": cell["status"],
+                        "price": price,
+                        "currency": offer.get("currency", "EUR") if offer else None,
+                        "airline": offer.get("airline") if offer else None,
+                    })
+                    if price is not None and (cheapest is None or price < cheapest["price"]):
+                        cheapest = row[-1]
+                rows.append(row)
+            return {
+                "job_id": self.job_id,
+                "origin": self.origin,
+                "destination": self.destination,
+                "depart_dates": self.depart_dates,
+                "return_dates": self.return_dates,
+                "cells": rows,
+                "cheapest": cheapest,
+                "complete": self._pending <= 0,
+            }
+
+
+def _date_window(date_str: str, flex_days: int) -> List[str]:
+    center = datetime.strptime(date_str, "%Y-%m-%d").date()
+    return [(center + timedelta(days=d)).isoformat() for d in range(-flex_days, flex_days + 1)]
+
+
+def _search_cell(job: FlexSearchJob, depart: str, ret: Optional[str]):
+    key = job.cell_key(depart, ret)
+    cached = result_cache.get(key)
+    if cached is not None:
+        job.set_cell(depart, ret, "cached", cached or None)
+        return
+
+    try:
+        if not USE_REAL_API:
+            from flight_search import search_flights_mock
+            flights = search_flights_mock(
+                job.origin, job.destination, depart, ret, job.trip_type, limit=FLEX_CELL_LIMIT,
+                direct_only=job.direct_only
+            )
+        else:
+            # Cheap early exit; the reserve itself is enforced atomically by try_acquire in the search
+            if amadeus_quota.remaining() <= FLEX_QUOTA_RESERVE or not job.take_call():
+                job.set_cell(depart, ret, "skipped")
+                return
+            from amadeus_search import search_flights_amadeus
+            flights = search_flights_amadeus(
+                origin=job.origin, destination=job.destination, date_from=depart, date_to=ret,
+                trip_type=job.trip_type, adults=job.adults, cabin_class=job.cabin_class,
+                limit=FLEX_CELL_LIMIT, direct_only=job.direct_only, quota_reserve=FLEX_QUOTA_RESERVE
+            )
+    except Exception as e:
+        logger.error(f"Flex cell {depart}/{ret} failed: {e}")
+        job.set_cell(depart, ret, "error")
+        return
+
+    cheapest = min(flights, key=lambda f: f.get("price") or float("inf")) if flights else None
+    # [] is also what a spent quota or an upstream error returns: only real answers are cached
+    if cheapest:
+        result_cache.set(key, dict(cheapest))
+    job.set_cell(depart, ret, "done", cheapest)
+
+
+def search_flexible_dates(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                          flex_days=1, adults=1, cabin_class="economy", direct_only=False) -> FlexSearchJob:
+    """
+    Fans the ±flex_days (depart, return) grid out over the shared pool and
+    returns immediately; poll job.snapshot() for progressively filled cells.
+    """
+    flex_days = max(0, min(int(flex_days), FLEX_MAX_DAYS))
+    depart_dates = _date_window(date_from_str, flex_days)
+    if trip_type == "round-trip" and date_to_str:
+        return_dates = _date_window(date_to_str, flex_days)
+    else:
+        trip_type = "one-way"
+        return_dates = [None]
+
+    job = FlexSearchJob(origin_code, destination_code, depart_dates, return_dates, trip_type,
+                        adults=adults, cabin_class=cabin_class, direct_only=direct_only)
+    flex_jobs.set(job.job_id, job)
+
+    # Requested dates first, then outward, so the centre of the matrix fills in first
+    cells = []
+    for i, depart in enumerate(depart_dates):
+        for j, ret in enumerate(return_dates):
+            if ret is not None and ret < depart:
+                job.set_cell(depart, ret, "invalid")
+                continue
+            distance = abs(i - flex_days) + (abs(j - flex_days) if ret is not None else 0)
+            cells.append((distance, depart, ret))
+    cells.sort()
+
+    job._pending = len(cells)
+    for _, depart, ret in cells:
+        job.set_cell(depart, ret, "pending")
+        _executor.submit(_search_cell, job, depart, ret)
+
+    logger.info(f"📅 Flex search {job.job_id}: {origin_code} → {destination_code}, {len(cells)} cells")
+    return job
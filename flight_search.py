@@ -2,40 +2,104 @@ from datetime import datetime
 import requests
 import time
 import hashlib
+import logging
 import json as json_module
-import traceback
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 from config import get_logger
 logs = get_logger(__name__)
 logger = logs
 
-from config import AFFILIATE_MARKER, API_TOKEN, HOST, USER_IP, USE_REAL_API, FEATURED_FLIGHT_LIMIT, DEBUG_MODE
+from config import AFFILIATE_MARKER, API_TOKEN, HOST, USER_IP, USE_REAL_API, FEATURED_FLIGHT_LIMIT
 from config import USE_AMADEUS, AMADEUS_API_KEY, FORCE_AMADEUS
 
-from amadeus_search import search_flights_amadeus
 from urllib.parse import urlencode
-from utils import clean_iata
+from utils import clean_iata, parse_timestamp, local_epoch, format_epoch
+from search_cache import result_cache, make_query_key
+from ranking import top_k_by_price
+from query_log import log_query
+from prefetch import load_warm
+from metrics import timed
+
+def cached_flights(cache_key) -> Tuple[Optional[List[Dict]], str]:
+    """(flights, 'hit' | 'warm' | 'miss'): in-process cache first, then the prefetched store."""
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return [dict(f) for f in cached], "hit"
+    warm = load_warm(cache_key)
+    if warm is not None:
+        return [dict(f) for f in warm], "warm"
+    return None, "miss"
+
+
+def record_search(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                  adults, cabin_class, direct_only, limit, cache_status, results=None,
+                  timings=None, source="web"):
+    """One query-log record per search: the query, cache outcome, result count and upstream latencies."""
+    log_query(
+        kind="search", source=source,
+        origin=origin_code, destination=destination_code, date_from=date_from_str,
+        date_to=date_to_str if trip_type == "round-trip" else None, trip_type=trip_type,
+        adults=int(adults or 1), cabin_class=cabin_class, direct_only=bool(direct_only),
+        limit=limit, cache=cache_status, results=results, **(timings or {})
+    )
+
 
 def search_flights(origin_code, destination_code, date_from_str, date_to_str, 
                     trip_type, adults=1, children=0, infants=0, cabin_class="economy", 
-                    limit=None, direct_only=False) -> List[Dict]:
+                    limit=None, direct_only=False, source="web") -> List[Dict]:
     
     if not USE_REAL_API:
         logger.info("🔍 Using Travelpayouts MOCK API (No Deep Link Merge)")
-        return search_flights_mock(
+        flights = search_flights_mock(
             origin_code, destination_code, date_from_str, date_to_str, 
             trip_type, limit=limit, direct_only=direct_only
         )
+        record_search(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                      adults, cabin_class, direct_only, limit, "mock", len(flights), source=source)
+        return flights
     
+    cache_key = make_query_key(
+        "combined", origin_code, destination_code, date_from_str, date_to_str, trip_type,
+        adults, children, infants, cabin_class, direct_only, limit
+    )
+    cached, cache_status = cached_flights(cache_key)
+    if cached is not None:
+        logger.info(f"⚡ Cache {cache_status} for {origin_code} → {destination_code} ({date_from_str})")
+        record_search(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                      adults, cabin_class, direct_only, limit, cache_status, len(cached), source=source)
+        return cached
+
+    timings = {}
+    final_flights = fetch_combined_flights(
+        origin_code, destination_code, date_from_str, date_to_str, trip_type,
+        adults, children, infants, cabin_class, limit, direct_only, timings=timings
+    )
+    record_search(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                  adults, cabin_class, direct_only, limit, cache_status, len(final_flights), timings, source)
+    if final_flights:
+        result_cache.set(cache_key, [dict(f) for f in final_flights])
+    return final_flights
+
+
+def fetch_combined_flights(origin_code, destination_code, date_from_str, date_to_str,
+                           trip_type, adults=1, children=0, infants=0, cabin_class="economy",
+                           limit=None, direct_only=False, timings=None) -> List[Dict]:
+    """
+    Uncached Amadeus + Travelpayouts search (also used by the prefetch scheduler).
+    Per-provider latencies (amadeus_ms, travelpayouts_ms) are written into `timings`.
+    """
     logger.info("Starting HYBRID REAL API search (Amadeus + Travelpayouts Merge)")
+    timings = {} if timings is None else timings
     
     amadeus_flights = []
     travelpayouts_link_map = {}
     
     # 1. Get Flight Details (Amadeus - Primary Source)
     if USE_AMADEUS and AMADEUS_API_KEY:
+        started = time.perf_counter()
         try:
+            from amadeus_search import search_flights_amadeus
             amadeus_flights = search_flights_amadeus(
                 origin=origin_code, destination=destination_code, date_from=date_from_str, 
                 date_to=date_to_str, trip_type=trip_type, adults=adults, children=children, 
@@ -43,12 +107,14 @@ def search_flights(origin_code, destination_code, date_from_str, date_to_str,
             )
             logger.info(f"✅ Amadeus returned {len(amadeus_flights)} flights")
         except Exception as e:
-            logger.error(f"❌ Amadeus search failed: {e}")
-            traceback.print_exc()
+            logger.error(f"❌ Amadeus search failed: {e}", exc_info=True)
+            timings["amadeus_error"] = True
             if FORCE_AMADEUS:
                 # If forced, treat failure as critical and exit the entire function
                 logger.critical("🚨 FORCE_AMADEUS is True. Cannot proceed without Amadeus data.")
                 return [] 
+        finally:
+            timings["amadeus_ms"] = round((time.perf_counter() - started) * 1000)
     else:
         logger.warning("Amadeus search skipped: USE_AMADEUS is False or AMADEUS_API_KEY is missing.")
 
@@ -56,6 +122,7 @@ def search_flights(origin_code, destination_code, date_from_str, date_to_str,
     if not amadeus_flights:
         logger.warning("No Amadeus flights found. Skipping Travelpayouts deep link search.")
     else:
+        started = time.perf_counter()
         try:
             travelpayouts_link_map = search_flights_api(
                 origin_code, destination_code, date_from_str, date_to_str, 
@@ -65,8 +132,9 @@ def search_flights(origin_code, destination_code, date_from_str, date_to_str,
             logger.info(f"✅ Travelpayouts link map size: {len(travelpayouts_link_map)}")
             
         except Exception as e:
-            logger.error(f"❌ Travelpayouts search failed: {e}")
-            traceback.print_exc()
+            logger.error(f"❌ Travelpayouts search failed: {e}", exc_info=True)
+            timings["travelpayouts_error"] = True
+        timings["travelpayouts_ms"] = round((time.perf_counter() - started) * 1000)
 
     # 3. Merge Results 
     if not amadeus_flights:
@@ -82,6 +150,78 @@ def search_flights(origin_code, destination_code, date_from_str, date_to_str,
     return final_flights
 
 
+def stream_search(origin_code, destination_code, date_from_str, date_to_str, 
+                  trip_type, adults=1, children=0, infants=0, cabin_class="economy", 
+                  limit=None, direct_only=False) -> Iterator[Tuple[str, Any]]:
+    """
+    Incremental search_flights(): yields ("offer", flight) as each Amadeus offer
+    is parsed, ("upgrade", flight) whenever a Travelpayouts proposal attaches a
+    deep link, and finally ("done", flights).
+    """
+    if not USE_REAL_API:
+        flights = search_flights_mock(
+            origin_code, destination_code, date_from_str, date_to_str, 
+            trip_type, limit=limit, direct_only=direct_only
+        )
+        record_search(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                      adults, cabin_class, direct_only, limit, "mock", len(flights), source="stream")
+        for flight in flights:
+            yield "offer", flight
+        yield "done", flights
+        return
+
+    cache_key = make_query_key(
+        "combined", origin_code, destination_code, date_from_str, date_to_str, trip_type,
+        adults, children, infants, cabin_class, direct_only, limit
+    )
+    flights, cache_status = cached_flights(cache_key)
+    if flights is not None:
+        record_search(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                      adults, cabin_class, direct_only, limit, cache_status, len(flights), source="stream")
+        for flight in flights:
+            yield "offer", flight
+        yield "done", flights
+        return
+
+    flights = []
+    timings = {}
+    if USE_AMADEUS and AMADEUS_API_KEY:
+        from amadeus_search import stream_flights_amadeus
+        started = time.perf_counter()
+        for flight in stream_flights_amadeus(
+            origin_code, destination_code, date_from_str, date_to_str, trip_type,
+            adults, children, infants, cabin_class, limit, direct_only
+        ):
+            flights.append(flight)
+            yield "offer", flight
+        timings["amadeus_ms"] = round((time.perf_counter() - started) * 1000)
+
+    if flights:
+        started = time.perf_counter()
+        by_key = {}
+        for flight in flights:
+            key = (flight.get("airline", "XX"), local_epoch(flight.get("depart_ts"), flight.get("depart_offset", 0)))
+            by_key.setdefault(key, []).append(flight)
+        try:
+            for changed in iter_travelpayouts_links(
+                origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                adults, children, infants, cabin_class, stream=True
+            ):
+                for key, link_data in changed.items():
+                    for flight in by_key.get(key, []):
+                        yield "upgrade", apply_deep_link(flight, link_data)
+        except Exception as e:
+            logger.error(f"❌ Travelpayouts stream failed: {e}")
+            timings["travelpayouts_error"] = True
+        timings["travelpayouts_ms"] = round((time.perf_counter() - started) * 1000)
+
+        result_cache.set(cache_key, [dict(f) for f in flights])
+
+    record_search(origin_code, destination_code, date_from_str, date_to_str, trip_type,
+                  adults, cabin_class, direct_only, limit, cache_status, len(flights), timings, "stream")
+    yield "done", flights
+
+
 def map_cabin_class(cabin_class):
     return {
         "economy": "Y",
@@ -146,24 +286,34 @@ def generate_signature(token, marker, host, user_ip, locale, trip_class, passeng
             f"{trip_class}:{user_ip}"
         )
     
-    if DEBUG_MODE:
-        print("🔐 Raw signature string:", raw_string)
-    
+    logger.debug("🔐 Raw signature string: %s", raw_string)
+
     return hashlib.md5(raw_string.encode("utf-8")).hexdigest()
 
 
-def search_flights_api(origin_code, destination_code, date_from_str, date_to_str=None, trip_type="round-trip", adults=1, children=0, infants=0, cabin_class="economy", limit=None, direct_only=False):
-    
-    def standardize_api_datetime(raw_date: str, raw_time: str) -> str:
-        combined_dt_str = f"{raw_date} {raw_time}"
-        try:
-            dt_object = datetime.strptime(combined_dt_str, "%Y-%m-%d %H:%M")
-            return dt_object.strftime("%Y-%m-%d %H:%M:%S")
-        except ValueError as e:
-            logger.warning(f"Failed to parse Travelpayouts time for key: {e}. Raw data: {combined_dt_str}")
-            if len(combined_dt_str) == 16:
-                return combined_dt_str + ":00"
-            return combined_dt_str 
+def search_flights_api(origin_code, destination_code, date_from_str, date_to_str=None, trip_type="round-trip", adults=1, children=0, infants=0, cabin_class="economy", limit=None, direct_only=False, extra_legs=None):
+    """
+    Travelpayouts search, returning a deep link map keyed by (carrier, local departure epoch).
+    extra_legs: for multi-city links, [(destination, 'YYYY-MM-DD'), ...] after the first leg.
+    """
+    deep_link_map = {}
+    for changed in iter_travelpayouts_links(
+        origin_code, destination_code, date_from_str, date_to_str, trip_type, adults, children,
+        infants, cabin_class, extra_legs=extra_legs
+    ):
+        deep_link_map.update(changed)
+
+    logger.info(f"Generated deep link map with {len(deep_link_map)} unique links.")
+    return deep_link_map
+
+
+def iter_travelpayouts_links(origin_code, destination_code, date_from_str, date_to_str=None, trip_type="round-trip", adults=1, children=0, infants=0, cabin_class="economy", extra_legs=None, stream=False):
+    """
+    Runs a Travelpayouts search and, after each poll, yields the deep link map
+    entries ({match_key: link_data}) that are new or got cheaper.
+    stream=False stops at the first poll with proposals (the blocking search);
+    stream=True keeps polling until Travelpayouts reports the search complete.
+    """
     
     def to_ddmm(date_str):
         if not date_str or len(date_str) < 10: return ""
@@ -217,65 +367,44 @@ def search_flights_api(origin_code, destination_code, date_from_str, date_to_str
     headers = {"Content-Type": "application/json"}
 
     try:
-        response = requests.post(init_url, json=payload, headers=headers, timeout=10)
+        with timed("travelpayouts_init"):
+            response = requests.post(init_url, json=payload, headers=headers, timeout=10)
         
         if response.status_code != 200:
             logger.error(f"API error: {response.status_code} - {response.text}")
-            return {}
+            return
         
         search_id = response.json().get("search_id") or response.json().get("uuid")
         
         if not search_id:
             logger.error("No search_id returned from API")
-            return {}
+            return
         
         logger.info(f"🔗 Search initiated: {search_id}")
         
     except requests.exceptions.RequestException as e:
         logger.error(f"Request failed: {e}")
-        return {}
-
-    results_url = f"https://api.travelpayouts.com/v1/flight_search_results?uuid={search_id}"
-    raw_proposals = []
-    
-    for attempt in range(5):
-        try:
-            time.sleep(3)
-            results_response = requests.get(results_url, timeout=10)
-            
-            if results_response.status_code == 200:
-                proposals_chunks = results_response.json()
-                
-                for chunk in proposals_chunks:
-                    chunk_proposals = chunk.get("proposals", [])
-                    if chunk_proposals:
-                        raw_proposals.extend(chunk_proposals)
-                
-                if raw_proposals:
-                    logger.info(f"✅ Got {len(raw_proposals)} proposals")
-                    break
-            else:
-                logger.warning(f"Attempt {attempt+1}: Status {results_response.status_code}")
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Polling failed: {e}")
-            
-    if not raw_proposals:
-        logger.warning("No results after polling")
-        return {}
+        return
 
     deep_link_map = {}
-    
-    for proposal in raw_proposals:
+
+    def collect_links(proposals):
+        """Folds proposals into deep_link_map; returns the entries that changed."""
+        changed = {}
+        for proposal in proposals:
+            collect_proposal(proposal, changed)
+        return changed
+
+    def collect_proposal(proposal, changed):
         
         segments_data = proposal.get("segment", [])
         if not segments_data:
-            continue
+            return
 
         outbound_segment = segments_data[0]
         outbound_flights = outbound_segment.get("flight", [])
         if not outbound_flights:
-            continue
+            return
 
         first_flight = outbound_flights[0]
         
@@ -284,11 +413,18 @@ def search_flights_api(origin_code, destination_code, date_from_str, date_to_str
         raw_date = first_flight.get("departure_date", "")
         raw_time = first_flight.get("departure_time", "")
         
-        depart_datetime = standardize_api_datetime(raw_date, raw_time)
-
-        match_key = f"{airline}_{depart_datetime}"
+        # Travelpayouts sends local wall-clock date/time; key on the local epoch
+        # so it lines up with Amadeus departures regardless of string format.
+        depart_ts, depart_offset = parse_timestamp(f"{raw_date} {raw_time}")
+        if depart_ts is None:
+            logger.warning(f"Failed to parse Travelpayouts time: {raw_date} {raw_time}")
+            return
+
+        match_key = (airline, local_epoch(depart_ts, depart_offset))
         
         terms = proposal.get("terms", {})
+        if not terms:
+            return
         
         for gate_id, term_data in terms.items():
             price = term_data.get("price")
@@ -315,18 +451,11 @@ def search_flights_api(origin_code, destination_code, date_from_str, date_to_str
 
             # 2. Handle Multi-city (The "Chain" Logic)
             if trip_type == "multi-city":
-                from flask import request
-                dest2_raw = request.form.get('destination_code_2')
-                date2_raw = request.form.get('date_from_2')
-
-                if dest2_raw and date2_raw:
-                    dest2 = clean_iata(dest2_raw)
-                    date2 = to_ddmm(date2_raw)
-                    
-                    # IMPORTANT: Do NOT repeat the middle airport. 
-                    # We just add DATE2 + DEST2 to the end of the first leg.
-                    # Result: ARN1203LHR + 1503 + CDG = ARN1203LHR1503CDG
-                    search_path += f"{date2}{dest2}"
+                # IMPORTANT: Do NOT repeat the middle airport. 
+                # We just add DATE + DEST of each further leg.
+                # Result: ARN1203LHR + 1503 + CDG = ARN1203LHR1503CDG
+                for leg_dest, leg_date in extra_legs or []:
+                    search_path += f"{to_ddmm(leg_date)}{clean_iata(leg_dest)}"
             
             # 3. Handle Round-trip
             elif trip_type == "round-trip" and date_to_str:
@@ -347,62 +476,96 @@ def search_flights_api(origin_code, destination_code, date_from_str, date_to_str
             
             query_string = urlencode(params)
             booking_link = f"http://{HOST}/search/{search_code}?{query_string}"
-            
-            # DEBUG: Check your console/log to see the generated code
-            print(f"DEBUG: Generated Search Code: {search_code}")
-            
+
             if match_key not in deep_link_map or (price is not None and price < deep_link_map[match_key].get('price', float('inf'))):
                 
                 if booking_link and price is not None:
-                    deep_link_map[match_key] = {
+                    deep_link_map[match_key] = changed[match_key] = {
                         'link': booking_link,
                         'price': price,
                         'currency': currency,
                         'vendor_gate_id': gate_id,
                     }
                 
-    logger.info(f"Generated deep link map with {len(deep_link_map)} unique links.")
+    results_url = f"https://api.travelpayouts.com/v1/flight_search_results?uuid={search_id}"
     
-    return deep_link_map
+    for attempt in range(5):
+        try:
+            time.sleep(3)
+            with timed("travelpayouts_poll"):
+                results_response = requests.get(results_url, timeout=10)
+            
+            if results_response.status_code == 200:
+                proposals_chunks = results_response.json()
+                new_proposals = []
+                complete = False
+                
+                for chunk in proposals_chunks:
+                    chunk_proposals = chunk.get("proposals", [])
+                    if chunk_proposals:
+                        new_proposals.extend(chunk_proposals)
+                    elif set(chunk) <= {"search_id"}:
+                        # A bare {"search_id": ...} chunk marks the end of results
+                        complete = True
+                
+                if new_proposals:
+                    logger.info(f"✅ Got {len(new_proposals)} proposals")
+                    with timed("travelpayouts_proposals"):
+                        changed = collect_links(new_proposals)
+                    if changed:
+                        yield changed
+                    if not stream:
+                        break
+                if complete:
+                    break
+            else:
+                logger.warning(f"Attempt {attempt+1}: Status {results_response.status_code}")
+                
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Polling failed: {e}")
+            
+    if not deep_link_map:
+        logger.warning("No results after polling")
+
+def apply_deep_link(flight: Dict, link_data: Dict) -> Dict:
+    """Attaches a Travelpayouts deep link (and the partner's price) to an Amadeus flight."""
+    flight["link"] = link_data["link"]
+    flight["deeplink"] = link_data["link"]
+    flight["vendor"] = link_data.get("vendor_gate_id", "Travelpayouts")
+    flight["partner_price"] = link_data.get("price")
+    flight["partner_currency"] = link_data.get("currency")
+    return flight
+
 
+@timed("merge")
 def get_combined_flight_results(amadeus_flights: List[Dict], travelpayouts_link_map: Dict) -> List[Dict]:
     final_flights = []
-    
-    logger.info(f"Starting merge process. Amadeus flights: {len(amadeus_flights)}. Deep links available: {len(travelpayouts_link_map)}.")
-
-    logger.debug(f"Deep Link Map Keys: {list(travelpayouts_link_map.keys())}") 
+    unmatched = []
 
     for amadeus_flight in amadeus_flights:
         
         carrier = amadeus_flight.get("airline", "XX")
-        depart_time = amadeus_flight.get("depart", "") 
-        match_key = f"{carrier}_{depart_time}"
-        
-        logger.info(f"🔑 AMADEUS KEY: '{match_key}' (Length: {len(match_key)})")
+        match_key = (carrier, local_epoch(amadeus_flight.get("depart_ts"), amadeus_flight.get("depart_offset", 0)))
 
         if match_key in travelpayouts_link_map:
-            link_data = travelpayouts_link_map[match_key]
-            
-            amadeus_flight["link"] = link_data["link"]
-            amadeus_flight["deeplink"] = link_data["link"]
-            amadeus_flight["vendor"] = link_data.get("vendor_gate_id", "Travelpayouts")
-            
-            final_flights.append(amadeus_flight)
-            logger.info(f"✅ Q2 Solved: Found Deep Link for {match_key}. Link starts with: {link_data['link'][:50]}...")
-            
+            apply_deep_link(amadeus_flight, travelpayouts_link_map[match_key])
         else:
-            final_flights.append(amadeus_flight) 
-            logger.warning(f"❌ Fallback: No deep link match found for {match_key}. Using generic search link.")
-            
+            unmatched.append(match_key)
+        final_flights.append(amadeus_flight)
+
+    # One summary per search instead of a line per flight
+    logger.info(f"🔗 Merged {len(final_flights)} Amadeus flights with {len(travelpayouts_link_map)} deep links: "
+                f"{len(final_flights) - len(unmatched)} matched, {len(unmatched)} on generic search links")
+    if unmatched and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("❌ Unmatched keys (first 10): %s", unmatched[:10])
     return final_flights
 
 def search_flights_mock(origin_code, destination_code, date_from_str, date_to_str, trip_type, limit=None, direct_only=False):
     from mock_data import mock_kiwi_response
     
-    try:
-        date_from = datetime.strptime(date_from_str, "%Y-%m-%d").date()
-        date_to = datetime.strptime(date_to_str, "%Y-%m-%d").date() if date_to_str else None
-    except ValueError:
+    day_start, _ = parse_timestamp(date_from_str)
+    return_day_start, _ = parse_timestamp(date_to_str) if date_to_str else (None, 0)
+    if day_start is None:
         logger.error("Invalid date format")
         return []
 
@@ -413,13 +576,13 @@ def search_flights_mock(origin_code, destination_code, date_from_str, date_to_st
         if flight.get("origin") != origin_code or flight.get("destination") != destination_code:
             continue
         
-        departure_date = flight.get("departure").date() if flight.get("departure") else None
-        if not departure_date or departure_date != date_from:
+        depart_ts, depart_offset = parse_timestamp(flight.get("departure"))
+        if depart_ts is None or not day_start <= depart_ts < day_start + 86400:
             continue
         
-        if date_to:
-            return_date = flight.get("return").date() if flight.get("return") else None
-            if not return_date or return_date != date_to:
+        return_ts, return_offset = parse_timestamp(flight.get("return"))
+        if return_day_start is not None:
+            if return_ts is None or not return_day_start <= return_ts < return_day_start + 86400:
                 continue
         
         deep_link = flight.get("deep_link", "")
@@ -430,8 +593,12 @@ def search_flights_mock(origin_code, destination_code, date_from_str, date_to_st
             "id": generate_flight_id(deep_link, flight.get("airlines", ["Unknown"])[0], str(flight.get("departure"))),
             "airline": flight.get("airlines", ["Unknown"])[0],
             "flight_number": flight.get("flight_number", "N/A"),
-            "depart": flight.get("departure").strftime("%Y-%m-%d %H:%M") if flight.get("departure") else "",
-            "return": flight.get("return").strftime("%Y-%m-%d %H:%M") if flight.get("return") else "",
+            "depart": format_epoch(depart_ts, depart_offset),
+            "return": format_epoch(return_ts, return_offset),
+            "depart_ts": depart_ts,
+            "depart_offset": depart_offset,
+            "return_ts": return_ts,
+            "return_offset": return_offset,
             "duration": flight.get("duration", "N/A"),
             "stops": flight.get("stops", 0),
             "cabin_class": flight.get("cabin_class", "Economy"),
@@ -442,5 +609,4 @@ def search_flights_mock(origin_code, destination_code, date_from_str, date_to_st
             "trip_type": trip_type
         })
     
-    filtered.sort(key=lambda x: x.get("price", float("inf")))
-    return filtered[:limit or FEATURED_FLIGHT_LIMIT]
\ No newline at end of file
+    return top_k_by_price(filtered, limit or FEATURED_FLIGHT_LIMIT)
\ No newline at end of file
@@ -0,0 +1,38 @@
+# gunicorn.conf.py — preloaded app, background services started per worker
+#
+# Usage: gunicorn app:app   (this file is picked up automatically)
+#
+# With preload_app the master imports the app once: templates are compiled,
+# assets built and reference data (airports.json) parsed a single time, then
+# shared copy-on-write by every forked worker. Threads do not survive fork, so
+# the prefetcher / price-watch threads are started in post_fork instead.
+
+import gc
+import os
+import time
+
+# Read by config.py when the master imports the app
+os.environ.setdefault("DEFER_BACKGROUND_SERVICES", "true")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+preload_app = True
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))  # recycle workers after N requests (0 = never)
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    # Objects built during preload never need collecting; freezing them keeps the
+    # GC from touching (and so copying) their pages in every worker
+    gc.freeze()
+    server.log.info("Preloaded app frozen for copy-on-write sharing")
+
+
+def post_fork(server, worker):
+    started = time.perf_counter()
+    from app import app, start_background_services
+    start_background_services(app)
+    server.log.info(f"Worker {worker.pid} booted in {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,308 @@
+# hedging.py — hedged upstream calls, triggered by live latency percentiles
+#
+#     response = hedger.call("flight-offers", lambda: requests.get(...), budget=amadeus_quota,
+#                            is_ok=lambda r: r.status_code == 200)
+#
+# Every call's latency feeds a streaming P² quantile estimate per endpoint (no
+# samples kept). Once an endpoint has enough history, a call still running at
+# its live p95 gets one duplicate, provided the quota budget (minus a reserve)
+# allows it and hedges stay under HEDGE_MAX_RATIO of calls. Whichever OK answer
+# arrives first is returned (a fast 429 does not beat a slow 200); the other is
+# cancelled if it has not started, and otherwise abandoned and its response
+# closed when it lands (a blocking requests call cannot be interrupted mid-read).
+#
+# A primary that may be hedged runs on a thread of its own, so upstream
+# concurrency is never capped by a pool and no queueing shows up in the
+# latency; only hedges use the HEDGE_MAX_WORKERS pool, which therefore never
+# has a primary ahead of them.
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from config import (
+    get_logger, HEDGE_ENABLED, HEDGE_QUANTILE, HEDGE_MIN_SAMPLES, HEDGE_WINDOW, HEDGE_MIN_DELAY,
+    HEDGE_MAX_RATIO, HEDGE_MAX_WORKERS, HEDGE_QUOTA_RESERVE,
+)
+from metrics import register_collector
+logger = get_logger(__name__)
+
+
+def _close(result) -> None:
+    close = getattr(result, "close", None)
+    if close is not None:
+        close()
+
+
+def _close_result(future) -> None:
+    if future.exception() is None:
+        _close(future.result())
+
+
+class P2Quantile:
+    """
+    Jain & Chlamtac's P² estimator: five markers track the min, p/2, p,
+    (1+p)/2 and max of a stream, adjusted with a piecewise-parabolic fit.
+    O(1) memory and time per observation.
+    """
+
+    __slots__ = ("p", "count", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            if self.count == 5:
+                q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(int(round(self.p * (len(ordered) - 1))), len(ordered) - 1)]
+        return self.heights[2]
+
+
+class LatencyTracker:
+    """
+    Live quantile for one endpoint. The estimator restarts every `window`
+    observations so the estimate follows drift; until the new one has
+    `min_samples`, the previous window's value is used.
+    """
+
+    def __init__(self, p: float, window: int, min_samples: int):
+        self.p = p
+        self.window = window
+        self.min_samples = min_samples
+        self.total = 0
+        self._current = P2Quantile(p)
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.total += 1
+            self._current.add(seconds)
+            if self._current.count >= self.window:
+                self._previous, self._current = self._current, P2Quantile(self.p)
+
+    def quantile(self) -> Optional[float]:
+        """None until there is enough history to trust."""
+        with self._lock:
+            if self._current.count >= self.min_samples:
+                return self._current.value()
+            if self._previous is not None:
+                return self._previous.value()
+            return None
+
+
+class Hedger:
+    def __init__(self, p: float = HEDGE_QUANTILE, window: int = HEDGE_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES,
+                 min_delay: float = HEDGE_MIN_DELAY, max_ratio: float = HEDGE_MAX_RATIO,
+                 max_workers: int = HEDGE_MAX_WORKERS, enabled: bool = HEDGE_ENABLED):
+        self.p = p
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.max_workers = max_workers
+        self.enabled = enabled
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    # --- bookkeeping ---
+
+    def tracker(self, key: str) -> LatencyTracker:
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            with self._lock:
+                tracker = self._trackers.setdefault(key, LatencyTracker(self.p, self.window, self.min_samples))
+                self._stats.setdefault(key, {"calls": 0, "hedged": 0, "hedge_won": 0, "primary_won": 0,
+                                             "skipped_budget": 0, "skipped_ratio": 0})
+        return tracker
+
+    def _count(self, key: str, field: str) -> None:
+        with self._lock:
+            self._stats[key][field] += 1
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Created per process: a pool built in a preloaded gunicorn master has no threads after fork
+        if self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="hedge")
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while disabled or warming up."""
+        if not self.enabled:
+            return None
+        quantile = self.tracker(key).quantile()
+        if quantile is None:
+            return None
+        return max(quantile, self.min_delay)
+
+    def _may_hedge(self, key: str, budget, reserve: int) -> bool:
+        with self._lock:
+            stats = self._stats[key]
+            if stats["hedged"] + 1 > self.max_ratio * stats["calls"]:
+                stats["skipped_ratio"] += 1
+                return False
+        # A hedge is optional: the reserve check stays quiet, unlike try_acquire's "quota exhausted"
+        if budget is not None and (budget.remaining() <= reserve or not budget.try_acquire(reserve=reserve)):
+            self._count(key, "skipped_budget")
+            return False
+        return True
+
+    # --- calls ---
+
+    def _attempt(self, key: str, fn: Callable):
+        started = time.perf_counter()
+        result = fn()
+        self.tracker(key).observe(time.perf_counter() - started)
+        return result
+
+    def _start_primary(self, key: str, fn: Callable) -> Future:
+        """Runs the attempt on a dedicated thread, returned as a future like the hedge's."""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._attempt(key, fn))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="hedge-primary", daemon=True).start()
+        return future
+
+    @staticmethod
+    def _discard(future) -> None:
+        """Cancels a losing attempt, or closes its response once it lands."""
+        if not future.cancel():
+            future.add_done_callback(_close_result)
+
+    def call(self, key: str, fn: Callable, budget=None, reserve: int = HEDGE_QUOTA_RESERVE,
+             is_ok: Optional[Callable] = None):
+        """
+        Runs fn() and returns its result, hedging once past the live quantile.
+        The primary call's quota is the caller's; the hedge takes one from `budget`.
+        A result failing `is_ok` (say a 429) counts as a failed attempt: the other
+        one is still awaited, and it is only returned if neither attempt is OK.
+        """
+        self.tracker(key)
+        self._count(key, "calls")
+        delay = self.hedge_delay(key)
+        if delay is None:
+            return self._attempt(key, fn)
+
+        primary = self._start_primary(key, fn)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._may_hedge(key, budget, reserve):
+            return primary.result()
+
+        self._count(key, "hedged")
+        hedge = self._executor().submit(self._attempt, key, fn)
+        logger.info(f"🪁 Hedging {key}: primary still running after {delay * 1000:.0f} ms")
+        pending, error, fallback = {primary, hedge}, None, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                result = future.result()
+                if is_ok is None or is_ok(result):
+                    self._count(key, "hedge_won" if future is hedge else "primary_won")
+                    for loser in pending:
+                        self._discard(loser)
+                    if fallback is not None:
+                        _close(fallback)
+                    return result
+                if fallback is None:
+                    fallback = result
+                else:
+                    _close(result)
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            snapshot = {key: dict(stats) for key, stats in self._stats.items()}
+        for key, stats in snapshot.items():
+            quantile = self._trackers[key].quantile()
+            stats[f"p{int(self.p * 100)}_ms"] = round(quantile * 1000, 1) if quantile is not None else None
+            stats["observed"] = self._trackers[key].total
+            stats["hedge_win_rate"] = round(stats["hedge_won"] / stats["hedged"], 3) if stats["hedged"] else None
+        return snapshot
+
+    def render_prometheus(self) -> List[str]:
+        lines = ["# HELP flightfinder_hedge_total Hedged upstream calls by outcome",
+                 "# TYPE flightfinder_hedge_total counter"]
+        gauge = ["# HELP flightfinder_upstream_latency_quantile_seconds Live latency quantile driving hedges",
+                 "# TYPE flightfinder_upstream_latency_quantile_seconds gauge"]
+        for key, stats in sorted(self.stats().items()):
+            for outcome in ("calls", "hedged", "hedge_won", "primary_won", "skipped_budget", "skipped_ratio"):
+                lines.append(f'flightfinder_hedge_total{{endpoint="{key}",outcome="{outcome}"}} {stats[outcome]}')
+            quantile = self._trackers[key].quantile()
+            if quantile is not None:
+                gauge.append(f'flightfinder_upstream_latency_quantile_seconds{{endpoint="{key}",quantile="{self.p}"}} '
+                             f'{quantile:.6f}')
+        return lines + gauge
+
+
+hedger = Hedger()
+register_collector(hedger.render_prometheus)
@@ -0,0 +1,95 @@
+# http_utils.py — fast JSON bodies, negotiated compression and ETag handling
+
+import gzip
+import hashlib
+import hmac
+import json
+
+from flask import Response, request
+
+import config
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # br is only offered when the package is installed
+    brotli = None
+
+# Bodies smaller than this are sent as-is (compression overhead > savings)
+MIN_COMPRESS_BYTES = 512
+
+
+def dumps(data) -> bytes:
+    """Compact UTF-8 JSON; orjson when available, otherwise the stdlib encoder."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def admin_token_valid() -> bool:
+    """X-Admin-Token matches ADMIN_TOKEN (always False while admin is disabled)."""
+    if not config.ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), config.ADMIN_TOKEN)
+
+
+def make_etag(body: bytes) -> str:
+    """Strong validator (unquoted) over the uncompressed representation."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Best supported content-coding from an Accept-Encoding header ('' = identity)."""
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name.lower()] = q
+    for coding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if offered.get(coding, 0) > 0:
+            return coding
+    return ""
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=5)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def json_response(data, status: int = 200, max_age: int = 0) -> Response:
+    """
+    JSON response with an ETag (answers If-None-Match with 304) and the body
+    compressed per Accept-Encoding. Vary keeps shared caches honest, and the
+    ETag carries the content-coding: a strong validator must differ between
+    the gzip, br and identity bodies.
+    """
+    body = dumps(data)
+    coding = negotiate_encoding(request.headers.get("Accept-Encoding", "")) if len(body) >= MIN_COMPRESS_BYTES else ""
+    etag = make_etag(body) + (f"-{coding}" if coding else "")
+    headers = {
+        "ETag": f'"{etag}"',
+        "Vary": "Accept-Encoding",
+        "Cache-Control": f"private, max-age={max_age}" if max_age else "no-cache",
+    }
+
+    if status == 200 and request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    if coding:
+        body = compress(body, coding)
+        headers["Content-Encoding"] = coding
+
+    return Response(body, status=status, mimetype="application/json", headers=headers)
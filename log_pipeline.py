@@ -0,0 +1,132 @@
+# log_pipeline.py — logging off the request thread, with per-call-site rate limits
+#
+# Request threads only format a record and put it on a bounded queue; a listener
+# thread does the stderr I/O. When the queue is full records are dropped and
+# counted rather than blocking a search. Repetitive warnings (the same logger
+# line firing in a loop) pass a burst per window, then one in N is sampled, and
+# the next record through reports how many were suppressed. INFO summaries and
+# errors are never limited.
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+
+
+class RateLimitFilter(logging.Filter):
+    """Caps WARNING records per call site (logger, file, line) at `burst` per `window` seconds."""
+
+    def __init__(self, window: float = 60.0, burst: int = 5, sample_every: int = 0,
+                 level: int = logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.sample_every = sample_every  # after the burst, let 1 in N through (0 = none)
+        self.level = level  # only records at exactly this level are limited
+        self._sites = {}  # (name, pathname, lineno) -> [window_start, seen, suppressed]
+        self._lock = threading.Lock()
+        self.suppressed_total = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0 or record.levelno != self.level:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                if len(self._sites) > 10000:
+                    self._sites.clear()
+                self._sites[key] = [now, 1, 0]
+            else:
+                site[1] += 1
+                over = site[1] - self.burst
+                if over > 0 and not (self.sample_every and over % self.sample_every == 0):
+                    site[2] += 1
+                    self.suppressed_total += 1
+                    return False
+                suppressed, site[2] = site[2], 0
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} similar suppressed)"
+        return True
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    QueueHandler that owns its listener. The listener thread is started lazily
+    in whichever process logs first, so gunicorn workers forked from a
+    preloaded master each get their own.
+    """
+
+    def __init__(self, handlers, maxsize: int = 10000):
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = list(handlers)
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self) -> None:
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked child: the parent's queue may hold records its listener owns
+                self.queue = queue.Queue(self.maxsize)
+            self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        """Drains the queue and joins the listener (registered with atexit)."""
+        with self._start_lock:
+            listener, self._listener = self._listener, None
+            if listener is not None and self._pid == os.getpid():
+                listener.stop()
+            self._pid = None
+
+    def stats(self) -> Dict:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+
+def install(level: int, fmt: str, use_async: bool = True, queue_size: int = 10000,
+            window: float = 60.0, burst: int = 5, sample_every: int = 0) -> logging.Handler:
+    """Replaces the root handlers with a (queued) stderr handler behind the rate limiter."""
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(fmt))
+    handler = AsyncLogHandler([stream], queue_size) if use_async else stream
+    handler.addFilter(RateLimitFilter(window, burst, sample_every))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
+
+
+def log_stats() -> Dict:
+    """Queue depth, drops and suppressed records for /health."""
+    stats = {"async": False, "suppressed": 0}
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, AsyncLogHandler):
+            stats.update(handler.stats(), **{"async": True})
+        for f in handler.filters:
+            if isinstance(f, RateLimitFilter):
+                stats["suppressed"] += f.suppressed_total
+    return stats
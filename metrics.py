@@ -0,0 +1,320 @@
+# metrics.py — per-stage timings: histograms for /metrics, Server-Timing per request
+#
+#     with timed("amadeus_http"): ...        or        @timed("merge")
+#
+# Each observation goes into a fixed-bucket histogram (one lock, a few adds)
+# and, inside a request, into a per-request list rendered as a Server-Timing
+# header (not for streamed SSE responses, whose body outlives the headers;
+# those are timed when the stream closes).
+#
+# Histograms are per process, so each worker snapshots its own into
+# METRICS_DIR/<pid>.json every METRICS_DUMP_INTERVAL seconds and /metrics
+# serves the sum over all of them: any worker answering a scrape reports the
+# same monotonic totals. A worker folds its counts into archive.json on exit
+# (or a later scrape does it for one that died), so recycling never resets a
+# counter.
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Dict, List, Tuple
+
+from flask import g, has_request_context, request
+
+from config import METRICS_DIR, METRICS_DUMP_INTERVAL
+
+# Seconds; upstream calls dominate, so the buckets reach well past the 10 s searches
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by one label (stage or endpoint)."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}  # label value -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float) -> None:
+        if _dumper_pid != os.getpid():
+            _start_dumper()
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def snapshot(self) -> Dict[str, List]:
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def render(self, series_by_key: Dict[str, List] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        series_by_key = self.snapshot() if series_by_key is None else series_by_key
+        for key, series in sorted(series_by_key.items()):
+            label = f'{self.label}="{key}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {series[-1]}")
+        return lines
+
+
+stage_seconds = Histogram("flightfinder_stage_seconds", "Time spent in each search stage", "stage")
+request_seconds = Histogram("flightfinder_request_seconds", "Request handling time by endpoint", "endpoint")
+HISTOGRAMS = (stage_seconds, request_seconds)
+
+
+# --- cross-worker aggregation ---
+
+_dumper_pid = None
+_dumper_lock = threading.Lock()
+ARCHIVE = "archive"  # METRICS_DIR/archive.json: totals of workers that have exited
+
+
+def _snapshot_path(name) -> str:
+    return os.path.join(METRICS_DIR, f"{name}.json")
+
+
+def _merge_lock():
+    from utils import file_lock  # utils pulls in the parsers; metrics is imported early
+    return file_lock(os.path.join(METRICS_DIR, "merge.lock"))
+
+
+def _read_snapshot(path: str) -> Dict[str, Dict[str, List]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_snapshot(path: str, data: Dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _merge(into: Dict[str, Dict[str, List]], data: Dict[str, Dict[str, List]]) -> None:
+    for name, series_by_key in data.items():
+        merged = into.setdefault(name, {})
+        for key, series in series_by_key.items():
+            if key in merged and len(merged[key]) == len(series):
+                merged[key] = [a + b for a, b in zip(merged[key], series)]
+            else:
+                merged.setdefault(key, list(series))
+
+
+def dump_snapshot() -> None:
+    """Writes this process's histograms to METRICS_DIR/<pid>.json."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_snapshot(_snapshot_path(os.getpid()), {h.name: h.snapshot() for h in HISTOGRAMS})
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _fold_into_archive(pids) -> None:
+    """Moves the snapshots of exited workers into archive.json (call with the merge lock held)."""
+    archive = _read_snapshot(_snapshot_path(ARCHIVE))
+    for pid in pids:
+        _merge(archive, _read_snapshot(_snapshot_path(pid)))
+    _write_snapshot(_snapshot_path(ARCHIVE), archive)
+    for pid in pids:
+        try:
+            os.remove(_snapshot_path(pid))
+        except FileNotFoundError:
+            pass
+
+
+def aggregated_series() -> Dict[str, Dict[str, List]]:
+    """Histogram series summed over every worker, live and exited."""
+    try:
+        dump_snapshot()
+        with _merge_lock():
+            pids = [int(n[:-5]) for n in os.listdir(METRICS_DIR) if n.endswith(".json") and n[:-5].isdigit()]
+            dead = [pid for pid in pids if not _pid_alive(pid)]
+            if dead:
+                _fold_into_archive(dead)
+            total = _read_snapshot(_snapshot_path(ARCHIVE))
+            for pid in pids:
+                if pid not in dead:
+                    _merge(total, _read_snapshot(_snapshot_path(pid)))
+        return total
+    except OSError:
+        # Unwritable METRICS_DIR: this worker's own share is still better than nothing
+        return {h.name: h.snapshot() for h in HISTOGRAMS}
+
+
+def _dump_loop(pid: int) -> None:
+    while _dumper_pid == pid:
+        time.sleep(METRICS_DUMP_INTERVAL)
+        with _dumper_lock:
+            if _dumper_pid != pid:
+                return  # retired meanwhile: a late dump would resurrect the archived snapshot
+            try:
+                dump_snapshot()
+            except OSError:
+                pass
+
+
+def _retire() -> None:
+    global _dumper_pid
+    with _dumper_lock:
+        if _dumper_pid != os.getpid():
+            return
+        _dumper_pid = None
+        try:
+            dump_snapshot()
+            with _merge_lock():
+                _fold_into_archive([os.getpid()])
+        except OSError:
+            pass
+
+
+def _start_dumper() -> None:
+    # Per process: gunicorn workers forked from a preloaded master each start their own
+    global _dumper_pid
+    with _dumper_lock:
+        if _dumper_pid == os.getpid():
+            return
+        _dumper_pid = os.getpid()
+        threading.Thread(target=_dump_loop, args=(_dumper_pid,), name="metrics-dump", daemon=True).start()
+
+
+def _reset_after_fork() -> None:
+    # A forked worker starts from zero; what the master observed stays in the master's own snapshot
+    for histogram in HISTOGRAMS:
+        histogram._series = {}
+
+
+atexit.register(_retire)
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def observe(stage: str, seconds: float) -> None:
+    stage_seconds.observe(stage, seconds)
+    if has_request_context():
+        g.setdefault("stage_timings", []).append((stage, seconds))
+
+
+class timed:
+    """Times a block or a function (as a decorator) under `stage`."""
+
+    __slots__ = ("stage", "_started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self._started)
+        return False
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - started)
+        return wrapper
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """'stage;dur=ms;desc="xN"' per stage (summed), plus the whole request."""
+    totals, counts = {}, {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+        counts[stage] = counts.get(stage, 0) + 1
+    parts = [
+        f'{stage};dur={seconds * 1000:.1f}' + (f';desc="x{counts[stage]}"' if counts[stage] > 1 else "")
+        for stage, seconds in totals.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# Other modules' series (counters, gauges): callables returning exposition lines
+_collectors = []
+
+
+def register_collector(collect) -> None:
+    _collectors.append(collect)
+
+
+def render_prometheus() -> str:
+    """Histograms summed across workers, then the registered collectors (this worker)."""
+    series = aggregated_series()
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render(series.get(histogram.name, {}))
+    for collect in _collectors:
+        lines += collect()
+    return "\n".join(lines) + "\n"
+
+
+def init_metrics(app) -> None:
+    """Request timing, template render timing and the Server-Timing header."""
+    from flask import before_render_template, template_rendered
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _server_timing(response):
+        """
+        Observes the request and sets Server-Timing. A streamed (SSE) response
+        has not produced its body yet, so it is observed when the stream closes
+        and gets no Server-Timing: the headers are gone by then.
+        """
+        started = g.pop("request_started", None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        if response.is_streamed:
+            response.call_on_close(lambda: request_seconds.observe(endpoint, time.perf_counter() - started))
+            return response
+        total = time.perf_counter() - started
+        request_seconds.observe(endpoint, total)
+        response.headers["Server-Timing"] = server_timing(g.get("stage_timings", []), total)
+        return response
+
+    def _render_started(sender, template, context, **extra):
+        g.setdefault("render_started", []).append(time.perf_counter())
+
+    def _render_finished(sender, template, context, **extra):
+        stack = g.get("render_started")
+        if stack:
+            observe("render", time.perf_counter() - stack.pop())
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
@@ -0,0 +1,147 @@
+# multi_city.py — multi-city search: per-leg parallel fetch + k-best itinerary combination
+
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import get_logger, USE_REAL_API
+from config import MULTI_CITY_MIN_CONNECTION, MULTI_CITY_LEG_LIMIT, MULTI_CITY_MAX_EXPANSIONS
+from search_cache import result_cache, make_query_key
+logger = get_logger(__name__)
+
+
+def _arrival_ts(flight: Dict) -> Optional[int]:
+    """Arrival epoch, estimated from departure + duration when the provider omits it."""
+    if flight.get("arrive_ts") is not None:
+        return flight["arrive_ts"]
+    if flight.get("depart_ts") is None:
+        return None
+    return flight["depart_ts"] + int(flight.get("duration_minutes") or 0) * 60
+
+
+def _search_leg(origin, destination, date, adults, cabin_class, direct_only) -> List[Dict]:
+    key = make_query_key("leg", origin, destination, date, None, "one-way",
+                         adults, 0, 0, cabin_class, direct_only, MULTI_CITY_LEG_LIMIT)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return [dict(f) for f in cached]
+
+    if not USE_REAL_API:
+        from flight_search import search_flights_mock
+        flights = search_flights_mock(origin, destination, date, None, "one-way",
+                                      limit=MULTI_CITY_LEG_LIMIT, direct_only=direct_only)
+    else:
+        from amadeus_search import search_flights_amadeus
+        flights = search_flights_amadeus(
+            origin=origin, destination=destination, date_from=date, trip_type="one-way",
+            adults=adults, cabin_class=cabin_class, limit=MULTI_CITY_LEG_LIMIT, direct_only=direct_only
+        )
+
+    # An empty leg is as likely a spent quota or upstream error as a real "no flights": not cached
+    if flights:
+        result_cache.set(key, [dict(f) for f in flights])
+    return flights
+
+
+def k_best_combinations(options: Sequence[Sequence[Dict]], k: int,
+                        is_valid: Callable[[Tuple[Dict, ...]], bool] = lambda combo: True,
+                        max_expansions: int = MULTI_CITY_MAX_EXPANSIONS) -> Iterator[Tuple[float, Tuple[Dict, ...]]]:
+    """
+    Lazily yields up to k valid combinations (one option per leg) in order of
+    total price, without materializing the Cartesian product.
+
+    Each leg's options must be sorted by price. Every index tuple is reached
+    from exactly one parent (decrement its last non-zero position), so the
+    heap never holds duplicates.
+    """
+    if not options or any(not leg for leg in options):
+        return
+
+    def total(idx):
+        return sum(options[leg][i]["price"] for leg, i in enumerate(idx))
+
+    start = (0,) * len(options)
+    heap = [(total(start), start, 0)]
+    found = expansions = 0
+
+    while heap and found < k and expansions < max_expansions:
+        price, idx, pivot = heapq.heappop(heap)
+        expansions += 1
+
+        combo = tuple(options[leg][i] for leg, i in enumerate(idx))
+        if is_valid(combo):
+            found += 1
+            yield price, combo
+
+        for leg in range(pivot, len(options)):
+            if idx[leg] + 1 < len(options[leg]):
+                nxt = idx[:leg] + (idx[leg] + 1,) + idx[leg + 1:]
+                heapq.heappush(heap, (total(nxt), nxt, leg))
+
+
+def connections_ok(combo: Tuple[Dict, ...], min_connection_minutes: int = MULTI_CITY_MIN_CONNECTION) -> bool:
+    """Each leg must depart at least min_connection_minutes after the previous one lands."""
+    for prev, nxt in zip(combo, combo[1:]):
+        arrive = _arrival_ts(prev)
+        depart = nxt.get("depart_ts")
+        if arrive is None or depart is None or depart - arrive < min_connection_minutes * 60:
+            return False
+    return True
+
+
+def build_itinerary(price: float, combo: Tuple[Dict, ...]) -> Dict:
+    first, last = combo[0], combo[-1]
+    airlines = {leg.get("airline") for leg in combo}
+    return {
+        "id": hashlib.md5("|".join(str(leg.get("id")) for leg in combo).encode()).hexdigest(),
+        "trip_type": "multi-city",
+        "price": round(price, 2),
+        "currency": first.get("currency", "EUR"),
+        "airline": first.get("airline") if len(airlines) == 1 else "Multiple",
+        "origin": first.get("origin"),
+        "destination": last.get("destination"),
+        "depart": first.get("depart"),
+        "depart_ts": first.get("depart_ts"),
+        "depart_offset": first.get("depart_offset", 0),
+        "arrive_ts": _arrival_ts(last),
+        "arrive_offset": last.get("arrive_offset", 0),
+        "stops": sum(int(leg.get("stops") or 0) for leg in combo),
+        "legs": list(combo),
+        "vendor": "Multi-city",
+    }
+
+
+def search_multi_city(legs: List[Tuple[str, str, str]], adults=1, cabin_class="economy",
+                      direct_only=False, k=10, min_connection_minutes=MULTI_CITY_MIN_CONNECTION) -> List[Dict]:
+    """
+    legs: [(origin, destination, 'YYYY-MM-DD'), ...]
+    Searches every leg concurrently (separate one-way requests) and returns the
+    k cheapest itineraries that respect the minimum connection time.
+    """
+    with ThreadPoolExecutor(max_workers=len(legs), thread_name_prefix="leg") as pool:
+        futures = [
+            pool.submit(_search_leg, origin, destination, date, adults, cabin_class, direct_only)
+            for origin, destination, date in legs
+        ]
+        options = []
+        for (origin, destination, date), future in zip(legs, futures):
+            try:
+                flights = future.result()
+            except Exception as e:
+                logger.error(f"Multi-city leg {origin} → {destination} failed: {e}")
+                flights = []
+            priced = [f for f in flights if f.get("price") is not None]
+            priced.sort(key=lambda f: f["price"])
+            options.append(priced)
+
+    logger.info(f"🧭 Multi-city legs fetched: {[len(o) for o in options]} offers")
+
+    itineraries = [
+        build_itinerary(price, combo)
+        for price, combo in k_best_combinations(
+            options, k, lambda combo: connections_ok(combo, min_connection_minutes)
+        )
+    ]
+    logger.info(f"🧭 Multi-city: {len(itineraries)} itineraries")
+    return itineraries
@@ -0,0 +1,391 @@
+# nl_parser.py — free-text trip parsing: "Stockholm to Tokyo next Friday for 2"
+#
+# Places come from a word-level trie over city and airport names (airports.json
+# plus iata_codes.city_to_iata), so "New York", "Heathrow" or "stockholm" are
+# found without the "(IATA)" hints the old regexes needed. Dates and passenger
+# counts use precompiled patterns; dateparser and word2number are not involved.
+# The trie is built once per process (in the gunicorn master under --preload).
+#
+#     python nl_parser.py "from Berlin to Madrid on 10 sep for a week, 2 adults"
+
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from iata_codes import city_to_iata
+
+AIRPORTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "airports.json")
+
+_END = ""  # trie key marking a complete name
+
+MONTHS = {name: i for i, names in enumerate((
+    ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",), ("jun", "june"),
+    ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"), ("oct", "october"),
+    ("nov", "november"), ("dec", "december")), 1) for name in names}
+WEEKDAYS = {name: i for i, names in enumerate((
+    ("mon", "monday"), ("tue", "tues", "tuesday"), ("wed", "wednesday"), ("thu", "thur", "thurs", "thursday"),
+    ("fri", "friday"), ("sat", "saturday"), ("sun", "sunday"))) for name in names}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "couple": 2, "a couple of": 2}
+
+# Names that are also everyday words: matched only after from/to or when capitalized
+AMBIGUOUS_NAMES = {
+    "nice", "page", "male", "homer", "ruby", "hail", "flint", "dole", "mare", "david", "craig", "hue", "mora",
+    "rota", "saga", "elim", "bam", "nan", "pai", "eek", "kake", "moro", "mus", "leon", "split", "mobile",
+    "reading", "orange", "batman", "bath", "sale", "hope", "gold coast", "victoria", "of", "can",
+}
+# Airport names too generic to stand alone once "Intl"/"Airport" is stripped
+GENERIC_AIRPORT_WORDS = {
+    "capital", "central", "municipal", "muni", "general", "city", "county", "regional", "international",
+    "memorial", "national", "island", "base", "field", "fld", "new", "north", "south", "east", "west", "grand",
+    "long", "lake", "river", "bay", "port", "point", "valley", "falls", "springs", "harbor", "harbour", "air",
+    "king", "st", "san", "santa", "fort", "mount", "seaplane", "heliport", "metropolitan", "downtown",
+}
+_AIRPORT_SUFFIX = re.compile(r"\b(?:intl|international|airport|arpt|apt|rgnl|regional|airfield|aerodrome)\b")
+# Never read as places or codes
+RESERVED_WORDS = set(MONTHS) | set(WEEKDAYS) | set(NUMBER_WORDS) | {
+    "from", "to", "for", "on", "in", "next", "this", "today", "tomorrow", "and", "the", "me", "my", "return",
+    "week", "weekend", "day", "days", "one", "way", "trip", "round",
+}
+CODE_STOPWORDS = {"THE", "FOR", "CAN", "AND", "ALL", "ANY", "YOU", "NOT", "ONE", "TWO", "BUT", "ARE", "WAY"}
+
+_TOKEN = re.compile(r"[^\W_]+(?:'[^\W_]+)?|->|→", re.UNICODE)
+_ORIGIN_MARKERS = {"from", "leaving", "departing"}
+_DESTINATION_MARKERS = {"to", "into", "towards", "->", "→"}
+
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_NUMBER = r"(\d{1,2}|a|an|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)"
+_DATE_PATTERNS = (
+    ("iso", r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b"),
+    ("dmy", r"\b(\d{1,2})[./](\d{1,2})(?:[./](\d{4}|\d{2}))?\b"),
+    ("day_month", r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?" + _MONTH + r"\.?(?:,?\s+(\d{4}))?\b"),
+    ("month_day", r"\b" + _MONTH + r"\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s+(\d{4}))?"),
+    ("relative", r"\b(day after tomorrow|today|tonight|tomorrow)\b"),
+    ("weekday", r"\b(?:(next|this|on)\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b"),
+    # Short forms ("sun", "wed") are everyday words on their own
+    ("weekday_short", r"\b(next|this|on)\s+(mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)\b"),
+    ("weekend", r"\b(?:(next|this)\s+)?weekend\b"),
+    ("in", r"\bin\s+" + _NUMBER + r"\s+(day|week)s?\b"),
+)
+# Every date form in one pattern; at the same position the earlier alternative wins
+_DATES = re.compile("|".join(f"(?P<{kind}>{pattern})" for kind, pattern in _DATE_PATTERNS))
+
+
+def _field_slices() -> Dict[str, slice]:
+    """kind -> the slice of match.groups() holding that alternative's fields."""
+    slices, offset = {}, 0
+    for kind, pattern in _DATE_PATTERNS:
+        fields = re.compile(pattern).groups
+        slices[kind] = slice(offset + 1, offset + 1 + fields)
+        offset += fields + 1
+    return slices
+
+
+_DATE_FIELDS = _field_slices()
+_DATE_TRIGGERS = set(MONTHS) | set(WEEKDAYS) | {"next", "this", "on", "in", "today", "tonight", "tomorrow", "day",
+                                                "weekend"}
+_DURATION = re.compile(r"\bfor\s+" + _NUMBER + r"\s+(day|night|week)s?\b")
+_ONE_WAY = re.compile(r"\bone[\s-]way\b")
+_ROUND_TRIP = re.compile(r"\b(?:round[\s-]trip|return)\b")
+_PASSENGER_COUNT = re.compile(
+    r"\b(\d{1,2}|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|a couple of)\s+"
+    r"(?:adults?|passengers?|people|persons?|travell?ers?|pax|tickets?|seats?|of us)\b")
+_FOR_COUNT = re.compile(
+    r"\bfor\s+(\d{1,2}|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)\b"
+    r"(?![-/.:]|\s*(?:days?|nights?|weeks?|months?|hours?|am|pm|\d|of\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)))")
+_GROUP_WORDS = (
+    (re.compile(r"\b(?:me and my|my (?:partner|wife|husband|girlfriend|boyfriend)|couple)\b"), 2),
+    (re.compile(r"\bfamily\b"), 4),
+    (re.compile(r"\bgroup\b"), 5),
+    (re.compile(r"\b(?:solo|alone|just me|by myself)\b"), 1),
+)
+_BARE_COUNT = re.compile(r"^\s*(\d{1,2}|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)\s*$")
+# "we are 3", "party of 4", "there are 2 of us": a count only where the wording says it is one
+_CUED_COUNT = re.compile(
+    r"\b(?:we(?:'re| are)|there(?:'re| are)|party of|group of|family of)\s+"
+    r"(\d{1,2}|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)\b(?![-/.:])")
+
+
+def fold(text: str) -> str:
+    """Lowercase without accents: 'Zürich' -> 'zurich'."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _words(name: str) -> Tuple[str, ...]:
+    return tuple(fold(w) for w in _TOKEN.findall(name.replace("\\'", "'")))
+
+
+class Gazetteer:
+    """Word-level trie: ('new', 'york') -> {'code': 'NYC', 'city': 'New York'}."""
+
+    def __init__(self):
+        self.root = {}
+        self.by_code = {}
+        self.size = 0
+
+    def add(self, words: Tuple[str, ...], code: str, city: str, replace: bool = False) -> None:
+        if not words or words[0] in RESERVED_WORDS or (len(words) == 1 and len(words[0]) < 3):
+            return
+        node = self.root
+        for word in words:
+            node = node.setdefault(word, {})
+        if replace or _END not in node:
+            self.size += _END not in node
+            node[_END] = {"code": code, "city": city, "name": " ".join(words)}
+
+    def longest_match(self, tokens: List[str], start: int) -> Tuple[int, Optional[Dict]]:
+        """End index and entry of the longest name starting at tokens[start]."""
+        node, end, entry = self.root, start, None
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if _END in node:
+                end, entry = i + 1, node[_END]
+        return end, entry
+
+
+def build_gazetteer(records: List[Dict]) -> Gazetteer:
+    """
+    City names map to their busiest airport (curated city codes win), then
+    distinctive airport names ('heathrow', 'charles de gaulle') are added.
+    """
+    gazetteer = Gazetteer()
+    busiest = {}
+    for record in records:
+        code, city = record.get("iata_code"), record.get("city") or ""
+        if not code:
+            continue
+        gazetteer.by_code.setdefault(code, city)
+        key = _words(city)
+        if key and (key not in busiest or record.get("links_count", 0) > busiest[key][2]):
+            busiest[key] = (code, city, record.get("links_count", 0))
+
+    for key, (code, city, _) in busiest.items():
+        gazetteer.add(key, code, city)
+    for name, code in city_to_iata.items():
+        city = name.title()
+        gazetteer.add(_words(name), code, city, replace=True)
+        gazetteer.by_code.setdefault(code, city)
+
+    for record in records:
+        code, city = record.get("iata_code"), record.get("city") or ""
+        words = _words(_AIRPORT_SUFFIX.sub(" ", fold(record.get("name") or "")))
+        if (not code or not words or words in busiest or all(w in GENERIC_AIRPORT_WORDS for w in words)
+                or (len(words) == 1 and len(words[0]) < 5)):
+            continue
+        gazetteer.add(words, code, city)
+    return gazetteer
+
+
+@lru_cache(maxsize=1)
+def gazetteer() -> Gazetteer:
+    try:
+        with open(AIRPORTS_PATH, "r", encoding="utf-8") as f:
+            records = json.load(f)
+    except (OSError, ValueError):
+        records = []
+    return build_gazetteer(records)
+
+
+def _number(word: str) -> int:
+    return int(word) if word.isdigit() else NUMBER_WORDS[word]
+
+
+def _upcoming(month: int, day: int, year: Optional[int], today: date) -> Optional[date]:
+    try:
+        if year is not None:
+            return date(year + 2000 if year < 100 else year, month, day)
+        candidate = date(today.year, month, day)
+        return candidate if candidate >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def _resolve(kind: str, groups: Tuple, today: date) -> Optional[date]:
+    if kind == "iso":
+        return _upcoming(int(groups[1]), int(groups[2]), int(groups[0]), today)
+    if kind == "dmy":
+        return _upcoming(int(groups[1]), int(groups[0]), int(groups[2]) if groups[2] else None, today)
+    if kind == "day_month":
+        return _upcoming(MONTHS[groups[1]], int(groups[0]), int(groups[2]) if groups[2] else None, today)
+    if kind == "month_day":
+        return _upcoming(MONTHS[groups[0]], int(groups[1]), int(groups[2]) if groups[2] else None, today)
+    if kind == "relative":
+        return today + timedelta(days={"today": 0, "tonight": 0, "tomorrow": 1}.get(groups[0], 2))
+    if kind in ("weekday", "weekday_short", "weekend"):
+        target = 5 if kind == "weekend" else WEEKDAYS[groups[1]]
+        ahead = (target - today.weekday()) % 7
+        if groups[0] == "next" or (ahead == 0 and groups[0] != "this"):
+            ahead = ahead or 7
+        return today + timedelta(days=ahead)
+    if kind == "in":
+        return today + timedelta(days=_number(groups[0]) * (7 if groups[1] == "week" else 1))
+    return None
+
+
+def tokenize(text: str) -> List[Tuple[str, str, int]]:
+    """(word as written, folded word, offset) for each word and arrow."""
+    if not text.isascii():
+        return [(m.group(), fold(m.group()), m.start()) for m in _TOKEN.finditer(text)]
+    lowered = text.lower()
+    return [(m.group(), lowered[m.start():m.end()], m.start()) for m in _TOKEN.finditer(text)]
+
+
+def parse_dates(text: str, today: Optional[date] = None, tokens=None) -> List[date]:
+    """
+    Dates in the order they appear. The combined pattern is only tried at
+    words that can start a date (digits, month and weekday names, "next"...),
+    not at every character.
+    """
+    today = today or date.today()
+    lowered = text.lower()
+    found, resume = [], 0
+    for _, word, start in tokens if tokens is not None else tokenize(text):
+        if start < resume or not (word[0].isdigit() or word in _DATE_TRIGGERS):
+            continue
+        match = _DATES.match(lowered, start)
+        if match is None:
+            continue
+        kind = match.lastgroup
+        resolved = _resolve(kind, match.groups()[_DATE_FIELDS[kind]], today)
+        if resolved is not None:
+            found.append(resolved)
+            resume = match.end()
+    return found
+
+
+def match_date(text: str, today: Optional[date] = None) -> Optional[Tuple[str, date]]:
+    """(form, date) when the whole of `text` is one date form ('next monday', '5/11'), else None."""
+    match = _DATES.fullmatch(text.strip().lower())
+    if match is None:
+        return None
+    kind = match.lastgroup
+    resolved = _resolve(kind, match.groups()[_DATE_FIELDS[kind]], today or date.today())
+    return (kind, resolved) if resolved is not None else None
+
+
+def parse_passengers(text: str) -> Optional[int]:
+    """'2 adults', 'for two', 'me and my wife', 'family', 'we are 3'; None when not stated."""
+    lowered = text.lower()
+    match = (_PASSENGER_COUNT.search(lowered) or _FOR_COUNT.search(lowered) or _CUED_COUNT.search(lowered)
+             or _BARE_COUNT.match(lowered))
+    if match:
+        return _number(match.group(1))
+    for pattern, count in _GROUP_WORDS:
+        if pattern.search(lowered):
+            return count
+    return None
+
+
+def find_places(text: str, tokens=None) -> List[Dict]:
+    """Places in order, each {'city', 'code', 'role', 'start', 'end'} (token indexes); role may be None."""
+    tokens = tokens if tokens is not None else tokenize(text)
+    raw = [t[0] for t in tokens]
+    offsets = [t[2] for t in tokens]
+    tokens = [t[1] for t in tokens]
+    names = gazetteer()
+    first_words = names.root
+    places = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] not in first_words and len(raw[i]) != 3:
+            i += 1
+            continue
+        previous = tokens[i - 1] if i else ""
+        role = "origin" if previous in _ORIGIN_MARKERS else "destination" if previous in _DESTINATION_MARKERS else None
+        end, entry = names.longest_match(tokens, i)
+        if entry is not None and (entry["name"] not in AMBIGUOUS_NAMES or role or raw[i][:1].isupper()):
+            last = places[-1] if places else None
+            if last is not None and last["end"] == i and last["city"] == entry["city"]:
+                # "London Heathrow": the airport refines the city just matched
+                last["code"], last["end"] = entry["code"], end
+            else:
+                places.append({"city": entry["city"], "code": entry["code"], "role": role, "start": i, "end": end})
+            # "Stockholm (ARN)", "new york jfk", "Paris BVA": a code right after the name wins; one
+            # written in caps or parentheses is taken as the user's choice even if we file it elsewhere
+            code = raw[end].upper() if end < len(raw) else ""
+            explicit = (code in names.by_code and code not in CODE_STOPWORDS
+                        and tokens[end] not in RESERVED_WORDS and tokens[end] not in _DATE_TRIGGERS
+                        and (raw[end].isupper() or text[offsets[end] - 1:offsets[end]] == "("))
+            if len(code) == 3 and (explicit or names.by_code.get(code) == entry["city"]):
+                places[-1]["code"], places[-1]["end"] = code, end + 1
+                end += 1
+            i = end
+            continue
+        token = raw[i]
+        if len(token) == 3 and token.isupper() and token in names.by_code and token not in CODE_STOPWORDS:
+            places.append({"city": names.by_code[token] or token, "code": token, "role": role, "start": i,
+                           "end": i + 1})
+        i += 1
+    return places
+
+
+def parse_trip(text: str, today: Optional[date] = None) -> Dict:
+    """
+    Origin, destination, dates, trip type and passengers from free text, in the
+    keys extract_travel_entities always returned (dates as datetimes).
+    """
+    info = {}
+    tokens = tokenize(text)
+    places = find_places(text, tokens)
+    origin = next((p for p in places if p["role"] == "origin"), None)
+    destination = next((p for p in places if p["role"] == "destination" and p is not origin), None)
+    for place in places:
+        if place is origin or place is destination:
+            continue
+        if origin is None:
+            origin = place
+        elif destination is None:
+            destination = place
+    if origin:
+        info["origin"], info["origin_code"] = origin["city"], origin["code"]
+    if destination:
+        info["destination"], info["destination_code"] = destination["city"], destination["code"]
+    elif origin:
+        info["destination_code"] = ""
+
+    lowered = text.lower()
+    dates = parse_dates(text, today, tokens)
+    if dates:
+        info["date_from"] = datetime.combine(dates[0], datetime.min.time())
+        date_to = dates[1] if len(dates) > 1 else None
+        duration = _DURATION.search(lowered)
+        if date_to is None and duration:
+            days = _number(duration.group(1)) * (7 if duration.group(2) == "week" else 1)
+            date_to = dates[0] + timedelta(days=days)
+        if date_to is not None and date_to >= dates[0] and not _ONE_WAY.search(lowered):
+            info["date_to"] = datetime.combine(date_to, datetime.min.time())
+        info["trip_type"] = "round-trip" if "date_to" in info or _ROUND_TRIP.search(lowered) else "one-way"
+
+    passengers = parse_passengers(text)
+    if passengers:
+        info["passengers"] = passengers
+    return info
+
+
+def main(argv=None):
+    text = " ".join(argv if argv is not None else sys.argv[1:]) or "Stockholm to Tokyo next Friday for 2"
+    started = time.perf_counter()
+    gazetteer()
+    built = time.perf_counter()
+    rounds = 2000
+    for _ in range(rounds):
+        result = parse_trip(text)
+    per_call = (time.perf_counter() - built) / rounds
+    print(f"{text!r}\n  {result}")
+    print(f"  gazetteer: {gazetteer().size} names in {(built - started) * 1000:.1f} ms; "
+          f"parse: {per_call * 1e6:.1f} µs per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# offer_store.py — the offers a visitor was last shown, resolvable by offer ID
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from flask import session
+
+from config import get_logger
+from config import OFFER_STORE_BACKEND, OFFER_STORE_MAX_SESSIONS, OFFER_STORE_MAX_OFFERS, OFFER_STORE_TTL
+from search_cache import TTLCache
+logger = get_logger(__name__)
+
+
+class SqliteOfferBackend:
+    """
+    Offer sets in one SQLite file (WAL), so any gunicorn worker can resolve an
+    offer stored by another. One connection per thread; expired rows are
+    purged every few hundred writes.
+    """
+
+    PURGE_EVERY = 200
+
+    def __init__(self, path: str, ttl: float = OFFER_STORE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS offers (namespace TEXT NOT NULL, offer_id TEXT NOT NULL, "
+                "expires REAL NOT NULL, data TEXT NOT NULL, PRIMARY KEY (namespace, offer_id))"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def put(self, namespace: str, offers: Dict[str, Dict]) -> None:
+        expires = time.time() + self.ttl
+        rows = [(namespace, offer_id, expires, json.dumps(offer, default=str)) for offer_id, offer in offers.items()]
+        with self._conn() as conn:
+            conn.execute("DELETE FROM offers WHERE namespace = ?", (namespace,))
+            conn.executemany("INSERT OR REPLACE INTO offers VALUES (?, ?, ?, ?)", rows)
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM offers WHERE expires < ?", (time.time(),))
+
+    def get(self, namespace: str, offer_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT data FROM offers WHERE namespace = ? AND offer_id = ? AND expires >= ?",
+            (namespace, offer_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def drop(self, namespace: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM offers WHERE namespace = ?", (namespace,))
+
+
+def make_backend(spec: str):
+    """'memory' (None: per-process only) or 'sqlite:<path>' (OFFER_STORE_BACKEND)."""
+    kind, _, target = (spec or "memory").partition(":")
+    if kind == "sqlite" and target:
+        return SqliteOfferBackend(target)
+    return None
+
+
+class OfferStore:
+    """
+    Offers keyed by namespace (a session or search ID), then by offer ID.
+    Storing a namespace replaces its previous offers; other namespaces are
+    untouched. Memory is bounded by LRU/TTL over namespaces and a cap on
+    offers per namespace; an optional backend shares sets across workers.
+    """
+
+    def __init__(self, backend=None, max_namespaces: int = OFFER_STORE_MAX_SESSIONS,
+                 max_offers: int = OFFER_STORE_MAX_OFFERS, ttl: float = OFFER_STORE_TTL):
+        self.backend = backend
+        self.max_offers = max_offers
+        self._cache = TTLCache(max_entries=max_namespaces, ttl=ttl)
+
+    def put(self, namespace: str, offers: Iterable[Dict]) -> None:
+        by_id = {}
+        for offer in offers:
+            if offer.get("id") is not None:
+                by_id[str(offer["id"])] = offer
+                if len(by_id) >= self.max_offers:
+                    break
+        self._cache.set(namespace, by_id)
+        if self.backend is not None:
+            try:
+                self.backend.put(namespace, by_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Offer store backend write failed: {e}")
+
+    def get(self, namespace: str, offer_id: str) -> Optional[Dict]:
+        offer = (self._cache.get(namespace) or {}).get(str(offer_id))
+        if offer is None and self.backend is not None:
+            try:
+                offer = self.backend.get(namespace, str(offer_id))
+            except sqlite3.Error as e:
+                logger.warning(f"Offer store backend read failed: {e}")
+        return offer
+
+    def offers(self, namespace: str) -> List[Dict]:
+        return list((self._cache.get(namespace) or {}).values())
+
+    def drop(self, namespace: str) -> None:
+        self._cache.pop(namespace)
+        if self.backend is not None:
+            self.backend.drop(namespace)
+
+    def stats(self) -> Dict:
+        return {
+            "namespaces": len(self._cache),
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "backend": type(self.backend).__name__ if self.backend is not None else "memory",
+        }
+
+
+def session_namespace() -> str:
+    """Stable per-visitor namespace, kept in the signed session cookie."""
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return session["sid"]
+
+
+offer_store = OfferStore(make_backend(OFFER_STORE_BACKEND))
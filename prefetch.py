@@ -0,0 +1,225 @@
+# prefetch.py — off-peak cache warming for the most searched routes
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import get_logger, USE_REAL_API, AMADEUS_MONTHLY_QUOTA, FLEX_QUOTA_RESERVE
+from config import (PREFETCH_ENABLED, PREFETCH_TOP_ROUTES, PREFETCH_WINDOWS_PER_ROUTE, PREFETCH_LOOKBACK_DAYS,
+                    PREFETCH_QUOTA_SHARE, PREFETCH_OFFPEAK_START, PREFETCH_OFFPEAK_END, PREFETCH_INTERVAL,
+                    PREFETCH_CACHE_TTL, PREFETCH_DIR, QUOTA_STATE_DIR)
+from query_log import iter_queries
+from quota import QuotaBudget, amadeus_quota
+from search_cache import result_cache, make_query_key
+from utils import acquire_process_lock
+logger = get_logger(__name__)
+
+# Prefetch spends at most this slice of the monthly Amadeus budget
+prefetch_quota = QuotaBudget("Prefetch", int(AMADEUS_MONTHLY_QUOTA * PREFETCH_QUOTA_SHARE),
+                             os.path.join(QUOTA_STATE_DIR, "prefetch.json"))
+
+# Log fields that identify a search apart from its dates
+ROUTE_FIELDS = ("origin", "destination", "trip_type", "adults", "cabin_class", "direct_only", "limit")
+
+
+# --- Warm store: prefetched results shared by every worker process ---
+
+def _warm_path(cache_key) -> str:
+    digest = hashlib.blake2b(repr(cache_key).encode(), digest_size=16).hexdigest()
+    return os.path.join(PREFETCH_DIR, f"{digest}.json")
+
+
+def store_warm(cache_key, flights: List[Dict], ttl: float = PREFETCH_CACHE_TTL) -> None:
+    os.makedirs(PREFETCH_DIR, exist_ok=True)
+    path = _warm_path(cache_key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"expires": time.time() + ttl, "flights": flights}, f, separators=(",", ":"))
+    os.replace(tmp, path)  # atomic: readers never see a partial file
+
+
+def load_warm(cache_key) -> Optional[List[Dict]]:
+    """Prefetched flights for this search, or None (missing or expired)."""
+    path = _warm_path(cache_key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    ttl = entry.get("expires", 0) - time.time()
+    if ttl <= 0:
+        return None
+    # Promote into this process's cache for the entry's remaining lifetime
+    result_cache.set(cache_key, entry["flights"], ttl=ttl)
+    return entry["flights"]
+
+
+# --- Planning from the query log ---
+
+def plan_prefetch(records, today: Optional[date] = None, top_routes: int = PREFETCH_TOP_ROUTES,
+                  windows_per_route: int = PREFETCH_WINDOWS_PER_ROUTE) -> List[Dict]:
+    """
+    Top routes by search count, each with its most common (days ahead, stay
+    length) windows, turned into concrete searches relative to today.
+    """
+    today = today or date.today()
+    routes = Counter()
+    windows = {}
+    for r in records:
+        if r.get("kind", "search") != "search" or r.get("cache") == "mock" or not r.get("date_from"):
+            continue
+        try:
+            searched_on = datetime.fromtimestamp(r["ts"]).date()
+            depart = date.fromisoformat(r["date_from"])
+            stay = (date.fromisoformat(r["date_to"]) - depart).days if r.get("date_to") else None
+        except (KeyError, ValueError):
+            continue
+        route = tuple(r.get(f) for f in ROUTE_FIELDS)
+        routes[route] += 1
+        windows.setdefault(route, Counter())[((depart - searched_on).days, stay)] += 1
+
+    plan = []
+    for route, count in routes.most_common(top_routes):
+        for (days_ahead, stay), _ in windows[route].most_common(windows_per_route):
+            if days_ahead < 0:
+                continue
+            depart = today + timedelta(days=days_ahead)
+            query = dict(zip(ROUTE_FIELDS, route))
+            query.update(
+                date_from=depart.isoformat(),
+                date_to=(depart + timedelta(days=stay)).isoformat() if stay is not None else None,
+                searches=count,
+            )
+            plan.append(query)
+    return plan
+
+
+def query_cache_key(q: Dict):
+    return make_query_key("combined", q["origin"], q["destination"], q["date_from"], q["date_to"],
+                          q["trip_type"], q["adults"], 0, 0, q["cabin_class"], q["direct_only"], q["limit"])
+
+
+def warm_stats(records) -> Dict:
+    """Share of real searches answered from the prefetched (warm) store vs. cache vs. upstream."""
+    counts = Counter(r.get("cache") for r in records if r.get("cache") in ("hit", "warm", "miss"))
+    total = sum(counts.values())
+    return {
+        "searches": total,
+        "warm_hits": counts["warm"],
+        "cache_hits": counts["hit"],
+        "misses": counts["miss"],
+        "warm_hit_rate": round(counts["warm"] / total, 4) if total else 0.0,
+        "hit_rate": round((counts["warm"] + counts["hit"]) / total, 4) if total else 0.0,
+    }
+
+
+# --- Scheduler ---
+
+def in_offpeak(hour: int, start: int = PREFETCH_OFFPEAK_START, end: int = PREFETCH_OFFPEAK_END) -> bool:
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end  # window wraps midnight
+
+
+class Prefetcher:
+    """Background thread that warms the hottest searches once per off-peak window."""
+
+    def __init__(self, interval: float = PREFETCH_INTERVAL):
+        self.interval = interval
+        self.last_run = None
+        self.last_plan_size = 0
+        self.warmed = 0
+        self._done_for = None  # date whose off-peak window has been served
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def _elect(self) -> bool:
+        """Only the process holding the lock file prefetches (gunicorn runs several workers)."""
+        if self._lock_file is None:
+            self._lock_file = acquire_process_lock(os.path.join(PREFETCH_DIR, ".prefetch.lock"))
+        return self._lock_file is not None
+
+    def run_once(self) -> int:
+        """Warm every planned search not already warm; returns upstream searches made."""
+        from flight_search import fetch_combined_flights
+
+        since = time.time() - PREFETCH_LOOKBACK_DAYS * 86400
+        plan = plan_prefetch(iter_queries(since=since))
+        self.last_plan_size = len(plan)
+        made = 0
+        for q in plan:
+            key = query_cache_key(q)
+            if key in result_cache or load_warm(key) is not None:
+                continue
+            if amadeus_quota.remaining() <= FLEX_QUOTA_RESERVE or not prefetch_quota.try_acquire():
+                logger.info("🔥 Prefetch budget spent, stopping this window")
+                break
+            try:
+                flights = fetch_combined_flights(
+                    q["origin"], q["destination"], q["date_from"], q["date_to"], q["trip_type"],
+                    adults=q["adults"], cabin_class=q["cabin_class"], limit=q["limit"],
+                    direct_only=q["direct_only"]
+                )
+            except Exception as e:
+                logger.error(f"Prefetch {q['origin']} → {q['destination']} failed: {e}")
+                continue
+            made += 1
+            if flights:
+                store_warm(key, flights)
+                result_cache.set(key, [dict(f) for f in flights], ttl=PREFETCH_CACHE_TTL)
+
+        self.warmed += made
+        self.last_run = time.time()
+        logger.info(f"🔥 Prefetch: {made} searches warmed of {len(plan)} planned "
+                    f"(budget used {prefetch_quota.used}/{prefetch_quota.monthly_limit})")
+        return made
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            now = datetime.now()
+            if not in_offpeak(now.hour) or self._done_for == now.date():
+                continue
+            if not self._elect():
+                continue
+            try:
+                self.run_once()
+                self._done_for = now.date()
+                stats = warm_stats(iter_queries(since=time.time() - 86400))
+                logger.info(f"🔥 Warm-hit rate (24h): {stats['warm_hit_rate']:.1%} of {stats['searches']} searches")
+            except Exception as e:
+                logger.error(f"Prefetch cycle failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "last_run": self.last_run,
+            "last_plan_size": self.last_plan_size,
+            "searches_warmed": self.warmed,
+            "budget_used": prefetch_quota.used,
+            "budget_limit": prefetch_quota.monthly_limit,
+            "offpeak_hours": [PREFETCH_OFFPEAK_START, PREFETCH_OFFPEAK_END],
+        }
+
+
+prefetcher = Prefetcher()
+
+
+def start_prefetcher():
+    """Starts the scheduler thread when prefetching makes sense (real API mode)."""
+    if PREFETCH_ENABLED and USE_REAL_API:
+        prefetcher.start()
+        logger.info("🔥 Prefetch scheduler started")
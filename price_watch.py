@@ -0,0 +1,429 @@
+# price_watch.py — price alerts: shared polling per canonical query, pluggable notification sinks
+
+import heapq
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import date
+from typing import Dict, List, Optional
+
+import requests
+
+from config import get_logger, USE_REAL_API, FLEX_QUOTA_RESERVE
+from config import (PRICE_WATCH_ENABLED, PRICE_WATCH_INTERVAL, PRICE_WATCH_JITTER, PRICE_WATCH_JOURNAL,
+                    PRICE_WATCH_SINK, PRICE_WATCH_MAX_QUERIES, PRICE_WATCH_MAX_PER_CONTACT)
+from quota import amadeus_quota
+from search_cache import result_cache, make_query_key
+from utils import acquire_process_lock, file_lock
+logger = get_logger(__name__)
+
+# Offers fetched per check; only the cheapest matters
+WATCH_SEARCH_LIMIT = 10
+# How often the engine picks up subscriptions written by other workers
+JOURNAL_SYNC_SECONDS = 30
+# The journal is rewritten as one record per live subscription once it holds
+# this many lines and at least twice as many as there are subscriptions
+JOURNAL_COMPACT_MIN_LINES = 1000
+
+QUERY_FIELDS = ("origin", "destination", "date_from", "date_to", "trip_type", "adults", "cabin_class", "direct_only")
+
+
+def canonical_query(origin, destination, date_from, date_to=None, trip_type="one-way",
+                    adults=1, cabin_class="economy", direct_only=False) -> Dict:
+    trip_type = "round-trip" if trip_type == "round-trip" and date_to else "one-way"
+    return {
+        "origin": str(origin).strip().upper(),
+        "destination": str(destination).strip().upper(),
+        "date_from": date_from,
+        "date_to": date_to if trip_type == "round-trip" else None,
+        "trip_type": trip_type,
+        "adults": int(adults or 1),
+        "cabin_class": str(cabin_class or "economy").lower(),
+        "direct_only": bool(direct_only),
+    }
+
+
+def watch_key(query: Dict) -> tuple:
+    return make_query_key("watch", *(query[f] for f in QUERY_FIELDS[:6]), 0, 0,
+                          query["cabin_class"], query["direct_only"])
+
+
+# --- Notification sinks ---
+
+class LogSink:
+    def send(self, event: Dict) -> None:
+        logger.info(f"🔔 Price alert {event['subscription_id']}: {event['origin']} → {event['destination']} "
+                    f"{event['old_price']} → {event['new_price']} {event.get('currency', '')}")
+
+
+class FileSink:
+    """Appends events as JSON lines (local stand-in for email/push delivery)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, event: Dict) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+
+class WebhookSink:
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, event: Dict) -> None:
+        requests.post(self.url, json=event, timeout=self.timeout).raise_for_status()
+
+
+def make_sink(spec: str):
+    """'log', 'file:<path>' or 'webhook:<url>' (PRICE_WATCH_SINK)."""
+    kind, _, target = (spec or "log").partition(":")
+    if kind == "file" and target:
+        return FileSink(target)
+    if kind == "webhook" and target:
+        return WebhookSink(target)
+    return LogSink()
+
+
+# --- Subscription journal (append-only; any worker can write, the engine tails it) ---
+
+def _journal_lock(path: str):
+    # Held by every writer; separate from the engine's leader lock (<journal>.lock)
+    return file_lock(path + ".write.lock")
+
+
+def _write_journal(record: Dict, path: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def _append_journal(record: Dict, path: str = PRICE_WATCH_JOURNAL) -> None:
+    with _journal_lock(path):
+        _write_journal(record, path)
+
+
+def read_journal(path: str = PRICE_WATCH_JOURNAL) -> Dict[str, Dict]:
+    """Live subscriptions after replaying the journal: id -> its "add" record."""
+    live = {}
+    if not os.path.exists(path):
+        return live
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("op") == "add":
+                live[record["id"]] = record
+            elif record.get("op") == "remove":
+                live.pop(record.get("id"), None)
+    return live
+
+
+def subscribe(query: Dict, threshold: float, contact: str = "", path: str = PRICE_WATCH_JOURNAL) -> str:
+    """
+    Registers an alert for `query` firing when the cheapest price is <= threshold.
+    Every distinct query costs an upstream search per interval, so a new one is
+    refused (ValueError) past PRICE_WATCH_MAX_QUERIES overall or
+    PRICE_WATCH_MAX_PER_CONTACT for this contact.
+    """
+    key = watch_key(query)
+    with _journal_lock(path):
+        all_keys, contact_keys = set(), set()
+        for record in read_journal(path).values():
+            existing = watch_key(canonical_query(**record["query"]))
+            all_keys.add(existing)
+            if record.get("contact") == contact:
+                contact_keys.add(existing)
+        if key not in all_keys and len(all_keys) >= PRICE_WATCH_MAX_QUERIES:
+            raise ValueError("Price alerts are at capacity, please try again later")
+        if key not in contact_keys and len(contact_keys) >= PRICE_WATCH_MAX_PER_CONTACT:
+            raise ValueError(f"At most {PRICE_WATCH_MAX_PER_CONTACT} watched searches per contact")
+
+        subscription_id = uuid.uuid4().hex
+        _write_journal({"op": "add", "id": subscription_id, "query": query, "threshold": float(threshold),
+                        "contact": contact, "ts": int(time.time())}, path)
+    return subscription_id
+
+
+def unsubscribe(subscription_id: str) -> None:
+    _append_journal({"op": "remove", "id": subscription_id, "ts": int(time.time())})
+
+
+class WatchedQuery:
+    """One canonical search shared by every subscriber watching it."""
+
+    def __init__(self, key, query: Dict):
+        self.key = key
+        self.query = query
+        self.subscribers = {}  # subscription id -> {"threshold", "contact", "notified_price", "ts"}
+        self.last_price = None
+        self.last_offer_id = None
+        self.last_checked = None
+        self.checks = 0
+        self.seq = None  # seq of this query's live heap entry
+
+
+class PriceWatchEngine:
+    """
+    Polls each watched query once per interval (jittered), ordered by a
+    next-due heap, and notifies subscribers when the cheapest price moves
+    to or below their threshold.
+    """
+
+    def __init__(self, sink=None, interval: float = PRICE_WATCH_INTERVAL, jitter: float = PRICE_WATCH_JITTER,
+                 journal_path: str = PRICE_WATCH_JOURNAL):
+        self.sink = sink or make_sink(PRICE_WATCH_SINK)
+        self.interval = interval
+        self.jitter = jitter
+        self.journal_path = journal_path
+        self.queries = {}  # watch key -> WatchedQuery
+        self._by_subscription = {}  # subscription id -> watch key
+        self._heap = []  # (due, seq, key); entries whose seq is not the query's live one are skipped
+        self._seq = 0
+        self._journal_offset = 0
+        self._journal_lines = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self.notifications = 0
+
+    def _schedule(self, watched: WatchedQuery, delay: float):
+        self._seq += 1
+        watched.seq = self._seq
+        spread = delay * self.jitter
+        heapq.heappush(self._heap, (time.time() + delay + random.uniform(-spread, spread), self._seq, watched.key))
+
+    def sync_journal(self) -> int:
+        """Applies journal records written since the last sync; returns how many."""
+        if not os.path.exists(self.journal_path):
+            return 0
+        applied = 0
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written; picked up next sync
+                self._journal_offset += len(line)
+                self._journal_lines += 1
+                try:
+                    self.apply(json.loads(line))
+                    applied += 1
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Bad price-watch journal record: {e}")
+        return applied
+
+    def compact_journal(self) -> bool:
+        """
+        Rewrites the journal as one "add" record per live subscription (carrying
+        its notified price) once removals and notifications dominate it.
+        """
+        with self._lock:
+            live = len(self._by_subscription)
+        if self._journal_lines < max(JOURNAL_COMPACT_MIN_LINES, 2 * live):
+            return False
+        with _journal_lock(self.journal_path):
+            self.sync_journal()  # records appended since the last sync
+            with self._lock:
+                records = [
+                    {"op": "add", "id": subscription_id, "query": watched.query, "threshold": sub["threshold"],
+                     "contact": sub["contact"], "notified_price": sub["notified_price"], "ts": sub["ts"]}
+                    for watched in self.queries.values() for subscription_id, sub in watched.subscribers.items()
+                ]
+            tmp = self.journal_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+            os.replace(tmp, self.journal_path)
+            logger.info(f"🔔 Compacted price-watch journal: {self._journal_lines} → {len(records)} records")
+            self._journal_offset = os.path.getsize(self.journal_path)
+            self._journal_lines = len(records)
+        return True
+
+    def _record_notified(self, subscription_id: str, price) -> None:
+        """Journals the last alerted price, so a restarted engine does not alert again."""
+        try:
+            _append_journal({"op": "notified", "id": subscription_id, "price": price, "ts": int(time.time())},
+                            self.journal_path)
+        except OSError as e:
+            logger.warning(f"Could not journal price-alert state for {subscription_id}: {e}")
+
+    def apply(self, record: Dict) -> None:
+        with self._lock:
+            if record["op"] == "notified":
+                watched = self.queries.get(self._by_subscription.get(record["id"]))
+                if watched and record["id"] in watched.subscribers:
+                    watched.subscribers[record["id"]]["notified_price"] = record["price"]
+                return
+
+            if record["op"] == "remove":
+                key = self._by_subscription.pop(record["id"], None)
+                watched = self.queries.get(key)
+                if watched:
+                    watched.subscribers.pop(record["id"], None)
+                    if not watched.subscribers:
+                        del self.queries[key]
+                return
+
+            query = canonical_query(**record["query"])
+            key = watch_key(query)
+            watched = self.queries.get(key)
+            if watched is None:
+                watched = self.queries[key] = WatchedQuery(key, query)
+                self._schedule(watched, min(60, self.interval))  # baseline soon, spread out
+            watched.subscribers[record["id"]] = {
+                "threshold": record["threshold"], "contact": record.get("contact", ""),
+                "notified_price": record.get("notified_price"), "ts": record.get("ts"),
+            }
+            self._by_subscription[record["id"]] = key
+
+    def _search(self, query: Dict) -> List[Dict]:
+        if not USE_REAL_API:
+            from flight_search import search_flights_mock
+            return search_flights_mock(query["origin"], query["destination"], query["date_from"],
+                                       query["date_to"], query["trip_type"], limit=WATCH_SEARCH_LIMIT,
+                                       direct_only=query["direct_only"])
+
+        from flight_search import cached_flights, fetch_combined_flights
+        cache_key = make_query_key("combined", *(query[f] for f in QUERY_FIELDS[:6]), 0, 0,
+                                   query["cabin_class"], query["direct_only"], WATCH_SEARCH_LIMIT)
+        flights, _ = cached_flights(cache_key)
+        if flights is None:
+            flights = fetch_combined_flights(
+                query["origin"], query["destination"], query["date_from"], query["date_to"], query["trip_type"],
+                adults=query["adults"], cabin_class=query["cabin_class"], limit=WATCH_SEARCH_LIMIT,
+                direct_only=query["direct_only"]
+            )
+            if flights:
+                result_cache.set(cache_key, [dict(f) for f in flights])
+        return flights
+
+    def check(self, watched: WatchedQuery) -> int:
+        """One upstream search for all of this query's subscribers; returns notifications sent."""
+        flights = [f for f in self._search(watched.query) if f.get("price") is not None]
+        watched.checks += 1
+        watched.last_checked = time.time()
+        if not flights:
+            return 0
+
+        cheapest = min(flights, key=lambda f: f["price"])
+        old_price, new_price = watched.last_price, cheapest["price"]
+        watched.last_price, watched.last_offer_id = new_price, cheapest.get("id")
+        if old_price is not None and new_price == old_price:
+            return 0
+
+        sent = 0
+        for subscription_id, sub in list(watched.subscribers.items()):
+            if new_price > sub["threshold"]:
+                if sub["notified_price"] is not None:
+                    sub["notified_price"] = None  # re-arm once it climbs back above
+                    self._record_notified(subscription_id, None)
+                continue
+            if sub["notified_price"] is not None and new_price >= sub["notified_price"]:
+                continue
+            event = {
+                "subscription_id": subscription_id,
+                "contact": sub["contact"],
+                **watched.query,
+                "threshold": sub["threshold"],
+                "old_price": old_price,
+                "new_price": new_price,
+                "currency": cheapest.get("currency"),
+                "offer_id": cheapest.get("id"),
+                "link": cheapest.get("link"),
+                "checked_at": int(watched.last_checked),
+            }
+            try:
+                self.sink.send(event)
+                sub["notified_price"] = new_price
+                self._record_notified(subscription_id, new_price)
+                sent += 1
+            except Exception as e:
+                logger.error(f"Price alert delivery failed for {subscription_id}: {e}")
+        self.notifications += sent
+        return sent
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Checks every query whose next-due time has passed (each once); returns checks made."""
+        now = now or time.time()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self._heap)
+                watched = self.queries.get(key)
+                if watched is None or watched.seq != seq:
+                    continue  # every subscriber left, or it was removed and re-added since
+                if watched.query["date_from"] < date.today().isoformat():
+                    self._drop(key)
+                    continue
+                due.append(watched)
+            for watched in due:
+                self._schedule(watched, self.interval)
+
+        checks = 0
+        for watched in due:
+            if USE_REAL_API and amadeus_quota.remaining() <= FLEX_QUOTA_RESERVE:
+                logger.warning("🔔 Price watch paused: Amadeus quota reserve reached")
+                break
+            try:
+                self.check(watched)
+                checks += 1
+            except Exception as e:
+                logger.error(f"Price watch check {watched.query['origin']} → {watched.query['destination']} failed: {e}")
+        return checks
+
+    def _drop(self, key):
+        watched = self.queries.pop(key, None)
+        if watched:
+            for subscription_id in watched.subscribers:
+                self._by_subscription.pop(subscription_id, None)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self._lock_file is None:
+                self._lock_file = acquire_process_lock(self.journal_path + ".lock")
+                if self._lock_file is None:
+                    self._stop.wait(JOURNAL_SYNC_SECONDS)  # another worker runs the engine
+                    continue
+            try:
+                self.sync_journal()
+                self.run_due()
+                self.compact_journal()
+            except Exception as e:
+                logger.error(f"Price watch cycle failed: {e}")
+            with self._lock:
+                next_due = self._heap[0][0] if self._heap else float("inf")
+            self._stop.wait(max(1.0, min(next_due - time.time(), JOURNAL_SYNC_SECONDS)))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="price-watch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "queries": len(self.queries),
+                "subscriptions": len(self._by_subscription),
+                "notifications": self.notifications,
+            }
+
+
+price_watch = PriceWatchEngine()
+
+
+def start_price_watch():
+    if PRICE_WATCH_ENABLED:
+        price_watch.start()
+        logger.info("🔔 Price watch engine started")
@@ -0,0 +1,288 @@
+# query_log.py — append-only JSON-lines log of searches (analytics + prefetch planning)
+#
+# Requests only enqueue records; a background flusher batches writes, fsyncs
+# on an interval, rotates the active segment by size/age and gzips old ones.
+# Whatever is still queued is written at interpreter exit (worker recycle,
+# deploy), and rotated segments a crash left uncompressed are gzipped when the
+# next flusher starts.
+
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from config import get_logger
+from config import (QUERY_LOG_PATH, QUERY_LOG_QUEUE_SIZE, QUERY_LOG_FLUSH_INTERVAL, QUERY_LOG_FSYNC_INTERVAL,
+                    QUERY_LOG_MAX_BYTES, QUERY_LOG_ROTATE_SECONDS)
+from utils import acquire_process_lock
+logger = get_logger(__name__)
+
+
+def segment_paths(path: str = QUERY_LOG_PATH) -> List[str]:
+    """Rotated segments (oldest first, gzipped or not yet) followed by the active file."""
+    base, ext = os.path.splitext(path)
+    compressed = set(glob.glob(f"{base}-*{ext}.gz"))
+    # A plain segment whose .gz already exists is mid-cleanup: read the .gz only
+    plain = {p for p in glob.glob(f"{base}-*{ext}") if p + ".gz" not in compressed}
+    return sorted(compressed | plain) + ([path] if os.path.exists(path) else [])
+
+
+def segment_end(segment: str, path: str) -> Optional[float]:
+    """Rotation time encoded in a segment name (None for the active file)."""
+    if segment == path:
+        return None
+    stamp = os.path.basename(segment)[len(os.path.basename(os.path.splitext(path)[0])) + 1:][:15]
+    try:
+        return datetime.strptime(stamp, "%Y%m%dT%H%M%S").timestamp()
+    except ValueError:
+        return None
+
+
+def open_segment(segment: str):
+    """Binary line iterator over a segment, transparently gunzipping."""
+    return gzip.open(segment, "rb") if segment.endswith(".gz") else open(segment, "rb")
+
+
+class QueryLogWriter:
+    """
+    Non-blocking JSONL writer. log() never touches the disk: records go into a
+    bounded queue (dropped and counted when full) and one flusher thread per
+    process appends them in batches. Several processes may share the file;
+    rotation is done under a lock file and other writers follow the rename.
+    """
+
+    def __init__(self, path: str = QUERY_LOG_PATH, queue_size: int = QUERY_LOG_QUEUE_SIZE,
+                 flush_interval: float = QUERY_LOG_FLUSH_INTERVAL, fsync_interval: float = QUERY_LOG_FSYNC_INTERVAL,
+                 max_bytes: int = QUERY_LOG_MAX_BYTES, rotate_seconds: float = QUERY_LOG_ROTATE_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._segment_start = None
+        self._last_fsync = time.monotonic()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.written = 0
+        self.dropped = 0
+
+    # --- request side ---
+
+    def log(self, record: Dict) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        # Started lazily (and restarted after fork) so gunicorn workers each get a flusher
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._file = None
+                self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+                self._thread.start()
+
+    # --- flusher side ---
+
+    def _run(self):
+        try:
+            self._compress_leftovers()
+        except OSError as e:
+            logger.warning(f"Query log leftover compression failed: {e}")
+        while not self._stop.is_set():
+            batch = self._drain(timeout=self.flush_interval)
+            try:
+                if batch:
+                    self._write(batch)
+                self._maybe_fsync()
+                self._maybe_rotate()
+            except OSError as e:
+                logger.warning(f"Query log write failed ({len(batch)} records lost): {e}")
+                self._file = None
+
+    def _drain(self, timeout: float) -> List[Dict]:
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < 1000:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _open(self):
+        """(Re)open the active segment, following a rotation done by another process."""
+        if self._file is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            self._file.close()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._segment_start = self._first_ts() or time.time()
+
+    def _first_ts(self) -> Optional[float]:
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(f.readline()).get("ts")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _write(self, batch: List[Dict]):
+        self._open()
+        data = b"".join(json.dumps(r, separators=(",", ":")).encode("utf-8") + b"\n" for r in batch)
+        self._file.write(data)  # one append per batch keeps lines from interleaving across processes
+        self._file.flush()
+        self.written += len(batch)
+
+    def _maybe_fsync(self):
+        if self._file is not None and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+    def _due_for_rotation(self, segment_start: Optional[float]) -> bool:
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return False
+        if size == 0:
+            return False
+        return size >= self.max_bytes or time.time() - (segment_start or time.time()) >= self.rotate_seconds
+
+    def _maybe_rotate(self):
+        if self._file is None or not self._due_for_rotation(self._segment_start):
+            return
+        lock = acquire_process_lock(self.path + ".lock")
+        if lock is None:
+            return  # another process is rotating
+        try:
+            if not self._due_for_rotation(self._first_ts()):
+                self._open()  # someone else rotated; pick up the new segment
+                return
+            base, ext = os.path.splitext(self.path)
+            now = datetime.now()
+            stamp = f"{now.strftime('%Y%m%dT%H%M%S')}{now.microsecond // 1000:03d}-{os.getpid()}"
+            rotated, n = f"{base}-{stamp}{ext}", 0
+            while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+                n += 1
+                rotated = f"{base}-{stamp}-{n}{ext}"
+            os.replace(self.path, rotated)
+        finally:
+            lock.close()
+        self._open()
+        self._compress(rotated)
+
+    def _compress(self, segment: str, wait: bool = True):
+        if wait:
+            time.sleep(self.flush_interval * 2)  # let other writers notice the rename and finish their batch
+        tmp = f"{segment}.gz.{os.getpid()}.tmp"
+        with open(segment, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, segment + ".gz")
+        os.remove(segment)
+        logger.info(f"🗜️ Query log segment compressed: {os.path.basename(segment)}.gz")
+
+    def _compress_leftovers(self, min_age: float = 60.0):
+        """Gzips rotated segments a crashed process never got to (or never finished) compressing."""
+        base, ext = os.path.splitext(self.path)
+        leftovers = [p for p in glob.glob(f"{base}-*{ext}") if time.time() - os.path.getmtime(p) >= min_age]
+        if not leftovers:
+            return
+        lock = acquire_process_lock(self.path + ".lock")
+        if lock is None:
+            return  # another process is rotating; the next start tries again
+        try:
+            for segment in leftovers:
+                if not os.path.exists(segment):
+                    continue
+                if os.path.exists(segment + ".gz"):
+                    os.remove(segment)  # compressed already, the crash came before the cleanup
+                else:
+                    self._compress(segment, wait=False)
+        finally:
+            lock.close()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Waits until everything queued so far is on disk (used by tests and shutdown)."""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(self.flush_interval)
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stops the flusher and writes whatever is still queued (registered atexit)."""
+        if self._pid != os.getpid():
+            return  # no flusher ever ran in this process
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if batch:
+                self._write(batch)
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+        except OSError as e:
+            logger.warning(f"Query log final flush failed ({len(batch)} records lost): {e}")
+
+    def stats(self) -> Dict:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+
+query_log = QueryLogWriter()
+# Registered before click_tracking's drain (it imports this module), so it runs after it
+atexit.register(query_log.close)
+
+
+def log_query(**fields) -> None:
+    """Enqueue one record; never blocks and never lets logging break a search."""
+    query_log.log({"ts": int(time.time()), **fields})
+
+
+def iter_queries(since: Optional[float] = None, path: str = QUERY_LOG_PATH) -> Iterator[Dict]:
+    """Records across all segments in write order, optionally only those newer than `since`."""
+    for segment in segment_paths(path):
+        end = segment_end(segment, path)
+        if since is not None and end is not None and end < since:
+            continue  # whole segment rotated out before the window
+        try:
+            with open_segment(segment) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since is None or record.get("ts", 0) >= since:
+                        yield record
+        except (OSError, EOFError) as e:
+            logger.warning(f"Skipping unreadable query log segment {segment}: {e}")
@@ -0,0 +1,256 @@
+# query_stats.py — query-log analytics: routes, lead times, cache ratios, latencies, zero results
+#
+# Usage: python query_stats.py [--days 7] [--top 20] [--json] [--path logs/queries.jsonl]
+#
+# One streaming pass over the (gzipped) JSONL segments pulls only the needed
+# fields out of each raw line with precompiled byte regexes into array columns;
+# aggregation then runs over those columns instead of per-record dicts.
+
+import argparse
+import json
+import re
+import sys
+import time
+from array import array
+from collections import Counter
+from datetime import date
+from typing import Dict, Optional
+
+from config import QUERY_LOG_PATH
+from query_log import segment_paths, segment_end, open_segment
+
+# One match per search record, following the field order record_search() writes.
+# Blocks where the match count disagrees with the number of search records
+# (older layouts, hand-edited lines) fall back to json.loads per line.
+_SEARCH_RECORD = re.compile(
+    rb'\{"ts":(\d+),"kind":"search","source":"[\w-]*","origin":"(\w{3})","destination":"(\w{3})",'
+    rb'"date_from":(?:"([\d-]{10})"|null),"date_to":(?:"[\d-]{10}"|null),"trip_type":"[\w-]+","adults":\d+,'
+    rb'"cabin_class":"\w+","direct_only":(?:true|false),"limit":(?:\d+|null),"cache":"(\w+)","results":(\d+)'
+    rb'(?:,"amadeus_error":true)?(?:,"amadeus_ms":(\d+))?(?:,"travelpayouts_error":true)?(?:,"travelpayouts_ms":(\d+))?'
+)
+_SEARCH_MARKER = b'"kind":"search"'
+BLOCK_BYTES = 4 * 1024 * 1024
+
+CACHE_CODES = {b"miss": 0, b"hit": 1, b"warm": 2, b"mock": 3}
+LEAD_BUCKETS = ((0, "0-3"), (4, "4-7"), (8, "8-14"), (15, "15-30"), (31, "31-60"), (61, "61-90"), (91, "91+"))
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MISSING = -1
+
+
+class SearchColumns:
+    """Column arrays for search records; routes are interned to small ints."""
+
+    def __init__(self):
+        self.route_names = []
+        self._route_ids = {}
+        self.route = array("I")
+        self.lead_days = array("i")
+        self.cache = array("b")
+        self.results = array("i")
+        self.amadeus_ms = array("i")
+        self.travelpayouts_ms = array("i")
+
+    def __len__(self):
+        return len(self.route)
+
+    def route_id(self, origin: bytes, destination: bytes) -> int:
+        key = (origin, destination)
+        rid = self._route_ids.get(key)
+        if rid is None:
+            rid = self._route_ids[key] = len(self.route_names)
+            self.route_names.append(f"{origin.decode().upper()}-{destination.decode().upper()}")
+        return rid
+
+    @staticmethod
+    def date_ordinal(raw: bytes) -> Optional[int]:
+        try:
+            return date.fromisoformat(raw.decode()).toordinal()
+        except ValueError:
+            return None
+
+
+def _fallback_rows(block: bytes):
+    """Slow path: parse each search line as JSON into the same tuple layout as _SEARCH_RECORD."""
+    rows = []
+    for line in block.splitlines():
+        if _SEARCH_MARKER not in line and b'"kind"' in line:
+            continue
+        try:
+            r = json.loads(line)
+        except ValueError:
+            continue
+        if r.get("kind", "search") != "search" or not r.get("origin") or not r.get("destination"):
+            continue
+        rows.append(tuple(
+            str(v).encode() if v is not None else b""
+            for v in (r.get("ts", 0), r["origin"], r["destination"], r.get("date_from"), r.get("cache"),
+                      r.get("results"), r.get("amadeus_ms"), r.get("travelpayouts_ms"))
+        ))
+    return rows
+
+
+def _segment_rows(segment: str):
+    """Raw field tuples for every search record in a segment, read in large blocks."""
+    with open_segment(segment) as f:
+        rest = b""
+        while True:
+            chunk = f.read(BLOCK_BYTES)
+            block = rest + chunk
+            if chunk:
+                cut = block.rfind(b"\n") + 1
+                block, rest = block[:cut], block[cut:]
+            if not block:
+                return
+            rows = _SEARCH_RECORD.findall(block)
+            # Every search line must have matched, and records without a kind are legacy searches
+            if len(rows) != block.count(_SEARCH_MARKER) or block.count(b'{"ts":') != block.count(b'"kind":'):
+                rows = _fallback_rows(block)
+            yield from rows
+            if not chunk:
+                return
+
+
+def _int(value: bytes) -> int:
+    return int(value) if value else MISSING
+
+
+def load_columns(path: str = QUERY_LOG_PATH, since: Optional[float] = None) -> SearchColumns:
+    """Appends each record straight onto the columns; no row list is ever held."""
+    cols = SearchColumns()
+    route, lead_days, cache = cols.route.append, cols.lead_days.append, cols.cache.append
+    results, amadeus_ms, travelpayouts_ms = cols.results.append, cols.amadeus_ms.append, cols.travelpayouts_ms.append
+    ordinals = {}  # departure dates repeat heavily: resolve each distinct one once
+    for segment in segment_paths(path):
+        end = segment_end(segment, path)
+        if since is not None and end is not None and end < since:
+            continue
+        for ts, origin, destination, depart, cached, count, a_ms, tp_ms in _segment_rows(segment):
+            ts = int(ts)
+            if since is not None and ts < since:
+                continue
+            route(cols.route_id(origin, destination))
+            cache(CACHE_CODES.get(cached, MISSING))
+            results(_int(count))
+            amadeus_ms(_int(a_ms))
+            travelpayouts_ms(_int(tp_ms))
+            if depart not in ordinals:
+                ordinals[depart] = cols.date_ordinal(depart) if depart else None
+            ordinal = ordinals[depart]
+            lead_days(ordinal - (ts // 86400 + EPOCH_ORDINAL) if ordinal is not None else MISSING)
+    return cols
+
+
+def percentiles(values, points=(50, 90, 95, 99)) -> Dict:
+    data = sorted(v for v in values if v != MISSING)
+    if not data:
+        return {"count": 0}
+    out = {"count": len(data)}
+    for p in points:
+        out[f"p{p}"] = data[min(len(data) - 1, (len(data) * p) // 100)]
+    return out
+
+
+def summarize(cols: SearchColumns, top: int = 20) -> Dict:
+    n = len(cols)
+    route_counts = Counter(cols.route)
+    top_routes = route_counts.most_common(top)
+
+    # Lead-time histogram (bucket lower bounds ascending)
+    lead_hist = Counter()
+    for days in cols.lead_days:
+        if days < 0:
+            continue
+        for lower, label in reversed(LEAD_BUCKETS):
+            if days >= lower:
+                lead_hist[label] += 1
+                break
+
+    # Per-route cache outcome and zero-result counts, via combined integer keys
+    cache_counts = Counter(r * 4 + c for r, c in zip(cols.route, cols.cache) if c >= 0)
+    zero_counts = Counter(r for r, res in zip(cols.route, cols.results) if res == 0)
+    answered = Counter(r for r, res in zip(cols.route, cols.results) if res != MISSING)
+
+    routes = []
+    for rid, count in top_routes:
+        miss, hit, warm = cache_counts[rid * 4], cache_counts[rid * 4 + 1], cache_counts[rid * 4 + 2]
+        real = miss + hit + warm
+        routes.append({
+            "route": cols.route_names[rid],
+            "searches": count,
+            "cache_hit_ratio": round((hit + warm) / real, 4) if real else None,
+            "warm_hits": warm,
+            "zero_result_rate": round(zero_counts[rid] / answered[rid], 4) if answered[rid] else None,
+        })
+
+    total_answered = sum(answered.values())
+    cache_total = Counter(c for c in cols.cache if c >= 0)
+    real_total = cache_total[0] + cache_total[1] + cache_total[2]
+    return {
+        "searches": n,
+        "routes": len(cols.route_names),
+        "top_routes": routes,
+        "lead_time_days": {
+            "histogram": {label: lead_hist[label] for _, label in LEAD_BUCKETS},
+            **{k: v for k, v in percentiles(cols.lead_days).items() if k != "count"},
+        },
+        "cache_hit_ratio": round((cache_total[1] + cache_total[2]) / real_total, 4) if real_total else None,
+        "latency_ms": {
+            "amadeus": percentiles(cols.amadeus_ms),
+            "travelpayouts": percentiles(cols.travelpayouts_ms),
+        },
+        "zero_result_rate": round(sum(zero_counts.values()) / total_answered, 4) if total_answered else None,
+    }
+
+
+def query_stats(days: Optional[float] = None, top: int = 20, path: str = QUERY_LOG_PATH) -> Dict:
+    started = time.perf_counter()
+    since = time.time() - days * 86400 if days else None
+    stats = summarize(load_columns(path, since), top)
+    stats["days"] = days
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
+
+
+def print_report(stats: Dict, out=sys.stdout):
+    window = f"last {stats['days']:g} days" if stats["days"] else "all time"
+    print(f"📊 {stats['searches']} searches over {stats['routes']} routes ({window}, {stats['elapsed_ms']} ms)", file=out)
+    print(f"   cache hit ratio: {stats['cache_hit_ratio']}   zero-result rate: {stats['zero_result_rate']}", file=out)
+
+    print("\nTop routes", file=out)
+    print(f"  {'route':<10}{'searches':>10}{'cache hit':>11}{'warm':>7}{'zero res':>10}", file=out)
+    for r in stats["top_routes"]:
+        print(f"  {r['route']:<10}{r['searches']:>10}{str(r['cache_hit_ratio']):>11}{r['warm_hits']:>7}"
+              f"{str(r['zero_result_rate']):>10}", file=out)
+
+    lead = stats["lead_time_days"]
+    print("\nLead time (days before departure)", file=out)
+    for label, count in lead["histogram"].items():
+        print(f"  {label:>6}: {count}", file=out)
+    if "p50" in lead:
+        print(f"  p50={lead['p50']} p90={lead['p90']}", file=out)
+
+    print("\nUpstream latency (ms)", file=out)
+    for provider, p in stats["latency_ms"].items():
+        if p["count"]:
+            print(f"  {provider:<14} n={p['count']} p50={p['p50']} p90={p['p90']} p95={p['p95']} p99={p['p99']}", file=out)
+        else:
+            print(f"  {provider:<14} no samples", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search query-log analytics")
+    parser.add_argument("--days", type=float, default=7, help="window to analyse (0 = all segments)")
+    parser.add_argument("--top", type=int, default=20, help="routes to list")
+    parser.add_argument("--path", default=QUERY_LOG_PATH, help="active query log file")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    stats = query_stats(args.days or None, args.top, args.path)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_report(stats)
+
+
+if __name__ == "__main__":
+    main()
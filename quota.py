@@ -0,0 +1,95 @@
+# quota.py — Amadeus call budget (free tier: 2,000 calls/month)
+#
+# The counter lives in a small JSON file under QUOTA_STATE_DIR, read and
+# rewritten under an flock, so every gunicorn worker draws from one budget and
+# a recycled worker does not start the month over.
+
+import json
+import os
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Optional, Tuple
+
+from config import get_logger, AMADEUS_MONTHLY_QUOTA, QUOTA_STATE_DIR
+from utils import file_lock
+logger = get_logger(__name__)
+
+
+class QuotaBudget:
+    """
+    Counts upstream calls per calendar month and refuses new ones once the
+    budget is spent. A limit of 0 disables the check. With a `state_path` the
+    count is shared by every process using that file; without one it is
+    per-process.
+    """
+
+    def __init__(self, name: str, monthly_limit: int, state_path: Optional[str] = None):
+        self.name = name
+        self.monthly_limit = monthly_limit
+        self.state_path = state_path
+        self._period = self._current_period()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _current_period() -> str:
+        return datetime.utcnow().strftime("%Y-%m")
+
+    def _load(self) -> Tuple[str, int]:
+        if self.state_path is None:
+            return self._period, self._used
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            return state["period"], int(state["used"])
+        except FileNotFoundError:
+            return self._current_period(), 0
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Unreadable {self.name} quota state, keeping the last known count: {e}")
+            return self._period, self._used
+
+    def _store(self, period: str, used: int) -> None:
+        self._period, self._used = period, used
+        if self.state_path is None:
+            return
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"period": period, "used": used}, f)
+        os.replace(tmp, self.state_path)
+
+    def _state_lock(self, shared: bool = False):
+        return file_lock(self.state_path + ".lock", shared=shared) if self.state_path else nullcontext()
+
+    def _current(self) -> int:
+        """Calls used this month; call with the locks held."""
+        period, used = self._load()
+        if period != self._current_period():
+            return 0
+        self._period, self._used = period, used
+        return used
+
+    def try_acquire(self, n: int = 1, reserve: int = 0) -> bool:
+        """Take n calls from the budget, keeping `reserve` calls untouched. False if not available."""
+        with self._lock, self._state_lock():
+            used = self._current()
+            if self.monthly_limit and used + n > self.monthly_limit - reserve:
+                if used + n > self.monthly_limit:
+                    logger.warning(f"⛔ {self.name} quota exhausted ({used}/{self.monthly_limit} this month)")
+                return False
+            self._store(self._current_period(), used + n)
+            return True
+
+    def remaining(self):
+        if not self.monthly_limit:
+            return float("inf")
+        with self._lock, self._state_lock(shared=True):
+            return max(self.monthly_limit - self._current(), 0)
+
+    @property
+    def used(self) -> int:
+        with self._lock, self._state_lock(shared=True):
+            return self._current()
+
+
+amadeus_quota = QuotaBudget("Amadeus", AMADEUS_MONTHLY_QUOTA, os.path.join(QUOTA_STATE_DIR, "amadeus.json"))
@@ -0,0 +1,56 @@
+# ranking.py — top-k selection, "best" scoring and the price/duration Pareto front
+
+import heapq
+from typing import Dict, Iterable, List, Sequence
+
+# Relative weight of each criterion in the "best" score (lower score = better)
+BEST_WEIGHTS = {"price": 0.6, "duration": 0.3, "stops": 0.1}
+
+
+def _price(flight: Dict) -> float:
+    price = flight.get("price")
+    return float("inf") if price is None else price
+
+
+def top_k_by_price(flights: Iterable[Dict], k: int = None) -> List[Dict]:
+    """The k cheapest flights in price order, in O(n log k) instead of a full sort."""
+    if k is None:
+        return sorted(flights, key=_price)
+    return heapq.nsmallest(k, flights, key=_price)
+
+
+def best_scores(prices: Sequence[float], durations: Sequence[int], stops: Sequence[int],
+                weights: Dict[str, float] = BEST_WEIGHTS) -> List[float]:
+    """
+    Weighted min-max score per offer, computed column-wise over the arrays
+    (C-level min/max per column, then a single zip pass).
+    """
+    if not prices:
+        return []
+    p_min, d_min = min(prices), min(durations)
+    p_span = (max(prices) - p_min) or 1.0
+    d_span = (max(durations) - d_min) or 1
+    wp, wd, ws = weights["price"] / p_span, weights["duration"] / d_span, weights["stops"] / 2
+    return [wp * (p - p_min) + wd * (d - d_min) + ws * min(s, 2) for p, d, s in zip(prices, durations, stops)]
+
+
+def pareto_front(prices: Sequence[float], durations: Sequence[int]) -> List[int]:
+    """
+    Indices of offers not beaten on both price and duration by any other offer,
+    ordered by price: sort once by (price, duration), keep each strictly faster one.
+    """
+    order = sorted(range(len(prices)), key=lambda i: (prices[i], durations[i]))
+    front = []
+    fastest = float("inf")
+    for i in order:
+        if durations[i] < fastest:
+            front.append(i)
+            fastest = durations[i]
+    return front
+
+
+def best_order(prices: Sequence[float], durations: Sequence[int], stops: Sequence[int]) -> List[int]:
+    """Pareto-optimal offers first (by score), then everything else by score."""
+    scores = best_scores(prices, durations, stops)
+    on_front = set(pareto_front(prices, durations))
+    return sorted(range(len(prices)), key=lambda i: (i not in on_front, scores[i]))
@@ -0,0 +1,72 @@
+# render_cache.py — production render mode: Jinja bytecode cache, boot-time template
+# compilation and a fragment cache for rendered flight cards
+
+import os
+import time
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from config import get_logger, TEMPLATE_CACHE_DIR, CARD_CACHE_MAX_ENTRIES, CARD_CACHE_TTL
+from search_cache import TTLCache
+logger = get_logger(__name__)
+
+CARD_TEMPLATE = "_flight_card.html"
+DEFAULT_LOCALE = "en"
+
+# Rendered card HTML by (offer, presentation) key; enabled in production only
+card_cache = TTLCache(max_entries=CARD_CACHE_MAX_ENTRIES, ttl=CARD_CACHE_TTL)
+_cards_enabled = False
+
+
+def card_key(flight, currency, trip_type, locale=DEFAULT_LOCALE) -> tuple:
+    """
+    Offer IDs already hash the itinerary; the mutable parts of a card (price,
+    badge, partner deep link) are added so an upgraded offer renders afresh.
+    """
+    return (
+        flight.get("id"), locale, currency, trip_type,
+        flight.get("price"), bool(flight.get("best_value")), flight.get("deeplink"),
+        flight.get("vendor"), flight.get("partner_price"), flight.get("partner_currency"),
+    )
+
+
+def render_flight_card(flight, currency=None, trip_type=None, locale=DEFAULT_LOCALE) -> Markup:
+    """_flight_card.html for one offer, served from the fragment cache when possible."""
+    key = card_key(flight, currency, trip_type, locale) if _cards_enabled and flight.get("id") else None
+    if key is not None:
+        html = card_cache.get(key)
+        if html is not None:
+            return html
+    template = current_app.jinja_env.get_template(CARD_TEMPLATE)
+    html = Markup(template.render(flight=flight, currency=currency, trip_type=trip_type))
+    if key is not None:
+        card_cache.set(key, html)
+    return html
+
+
+def init_render_pipeline(app) -> None:
+    """
+    Development keeps auto-reload. Production turns off per-render stat checks,
+    shares compiled templates between workers via a bytecode cache on disk,
+    compiles every template at boot and enables card fragment caching.
+    """
+    global _cards_enabled
+    app.jinja_env.globals["flight_card"] = render_flight_card
+
+    if app.debug:
+        app.config["TEMPLATES_AUTO_RELOAD"] = True
+        return
+
+    app.config["TEMPLATES_AUTO_RELOAD"] = False
+    app.jinja_env.auto_reload = False
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    _cards_enabled = True
+
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates(extensions=["html"])
+    for name in names:
+        app.jinja_env.get_template(name)
+    logger.info(f"🧩 Precompiled {len(names)} templates in {(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,185 @@
+# request_profiler.py — opt-in cProfile capture of live requests
+#
+# A request is profiled when it carries `X-Profile: 1` together with a valid
+# X-Admin-Token, or when it falls in the sampled 1-in-PROFILE_SAMPLE_RATE
+# fraction of traffic. Each capture is written to PROFILE_DIR as a .prof file
+# (pstats / snakeviz) plus a .json sidecar with the route, parameters and
+# timing; only the newest PROFILE_MAX_FILES captures are kept. Secret-looking
+# parameter values (tokens, keys) are redacted before writing.
+#
+# cProfile follows the thread that enabled it, so a capture covers the view
+# and template rendering but not the body of a streamed (SSE) response.
+
+import cProfile
+import hmac
+import io
+import itertools
+import json
+import os
+import pstats
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+from flask import g, request
+
+import config
+from config import get_logger
+logger = get_logger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+SKIP_ENDPOINTS = {"static", "assets.asset", "assets.service_worker", "metrics.metrics"}
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+# Query parameters whose values never reach the sidecar (tokens, API keys...)
+_SECRET_ARG = re.compile(r"token|secret|passw|key|auth|signature|session", re.IGNORECASE)
+_sequence = itertools.count()
+
+
+def _admin_requested() -> bool:
+    if request.headers.get(PROFILE_HEADER) != "1" or not config.ADMIN_TOKEN:
+        return False
+    token = request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(token, config.ADMIN_TOKEN)
+
+
+def profile_trigger() -> Optional[str]:
+    """'admin', 'sampled' or None for the current request."""
+    if request.endpoint in SKIP_ENDPOINTS or request.endpoint is None:
+        return None
+    if request.path.startswith("/admin/profiles"):
+        return None
+    if _admin_requested():
+        return "admin"
+    rate = config.PROFILE_SAMPLE_RATE
+    if rate > 0 and random.random() < 1.0 / rate:
+        return "sampled"
+    return None
+
+
+def redacted_args(args) -> Dict[str, List[str]]:
+    return {name: ["<redacted>"] * len(values) if _SECRET_ARG.search(name) else values
+            for name, values in args.to_dict(flat=False).items()}
+
+
+def profile_dir() -> str:
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    return config.PROFILE_DIR
+
+
+def top_functions(stats: pstats.Stats, limit: int = 15, sort: str = "cumulative") -> str:
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def profile_name(started_at: float, endpoint: str) -> str:
+    """Sortable by time: 20250101T120000-travel.search_flights-<pid>-<n>."""
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(started_at))
+    return _SAFE_NAME.sub("_", f"{stamp}-{endpoint}-{os.getpid()}-{next(_sequence):05d}")
+
+
+def save_profile(profiler: cProfile.Profile, meta: Dict) -> None:
+    """Writes <name>.prof and <name>.json, then prunes old captures."""
+    directory = profile_dir()
+    stem = meta["name"]
+    stats = pstats.Stats(profiler)
+    stats.dump_stats(os.path.join(directory, stem + ".prof"))
+    meta = {**meta, "functions": stats.total_calls, "top": top_functions(stats)}
+    tmp = os.path.join(directory, stem + ".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(directory, stem + ".json"))
+    prune(directory, config.PROFILE_MAX_FILES)
+
+
+def prune(directory: str, keep: int) -> None:
+    stems = sorted((name[:-5] for name in os.listdir(directory) if name.endswith(".json")), reverse=True)
+    for stem in stems[keep:]:
+        for ext in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, stem + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(limit: int = 100) -> List[Dict]:
+    """Newest first, without the text summaries."""
+    if not os.path.isdir(config.PROFILE_DIR):
+        return []
+    stems = sorted((n[:-5] for n in os.listdir(config.PROFILE_DIR) if n.endswith(".json")), reverse=True)
+    profiles = []
+    for stem in stems[:limit]:
+        meta = load_meta(stem)
+        if meta:
+            meta.pop("top", None)
+            profiles.append(meta)
+    return profiles
+
+
+def load_meta(name: str) -> Optional[Dict]:
+    if _SAFE_NAME.search(name):
+        return None
+    try:
+        with open(os.path.join(config.PROFILE_DIR, name + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def init_profiler(app) -> None:
+    """Starts cProfile before triggered requests and saves the capture once the response is sent."""
+
+    @app.before_request
+    def _start_profile():
+        trigger = profile_trigger()
+        if trigger is None:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is already active in this thread
+            return
+        g.profile = (profiler, trigger, time.time(), time.perf_counter())
+
+    @app.after_request
+    def _finish_profile(response):
+        capture = g.pop("profile", None)
+        if capture is None:
+            return response
+        profiler, trigger, started_at, started = capture
+        profiler.disable()
+        meta = {
+            "name": profile_name(started_at, request.endpoint),
+            "started_at": started_at,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "trigger": trigger,
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "args": redacted_args(request.args),
+            "form": sorted(request.form.keys()) if request.method == "POST" else [],
+            "status": response.status_code,
+            "pid": os.getpid(),
+        }
+
+        def _write():
+            try:
+                save_profile(profiler, meta)
+                logger.info(f"🔬 Profiled {meta['endpoint']} ({trigger}, {meta['duration_ms']} ms) → {meta['name']}")
+            except OSError as e:
+                logger.warning(f"⚠️ Could not save profile: {e}")
+
+        # Dumping stats happens after the client has the response
+        response.call_on_close(_write)
+        if trigger == "admin":
+            response.headers["X-Profile-Id"] = meta["name"]
+        return response
+
+    @app.teardown_request
+    def _drop_profile(exc):
+        # after_request is skipped when a request dies mid-flight; never leave the profiler on
+        capture = g.pop("profile", None)
+        if capture is not None:
+            capture[0].disable()
@@ -0,0 +1,168 @@
+# result_store.py — full offer sets per search, refined (page/sort/filter) without re-querying
+
+import re
+import time
+import uuid
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional
+
+from config import get_logger, RESULT_STORE_MAX_SEARCHES, RESULT_STORE_TTL
+from search_cache import TTLCache
+from ranking import best_order, pareto_front
+logger = get_logger(__name__)
+
+SORT_KEYS = ("best", "price", "duration", "depart", "stops")
+
+_HOURS_RE = re.compile(r"(\d+)\s*h")
+_MINUTES_RE = re.compile(r"(\d+)\s*m")
+
+
+def duration_minutes(flight: Dict) -> int:
+    """Numeric duration; falls back to parsing display strings like '6h 30m'."""
+    if flight.get("duration_minutes") is not None:
+        return int(flight["duration_minutes"])
+    text = str(flight.get("duration") or "")
+    hours = _HOURS_RE.search(text)
+    minutes = _MINUTES_RE.search(text)
+    return (int(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+
+
+class ResultSet:
+    """
+    One search's offers with column arrays, precomputed sort permutations and
+    filter bitsets (bit i set = offer i matches), built once at store time.
+    """
+
+    def __init__(self, search_id: str, offers: List[Dict], meta: Optional[Dict] = None):
+        self.search_id = search_id
+        self.offers = offers
+        self.meta = meta or {}
+        self.created = time.time()
+
+        n = len(offers)
+        self.prices = array("d", (float(f.get("price") or 0) for f in offers))
+        self.durations = array("l", (duration_minutes(f) for f in offers))
+        self.stops = array("b", (min(int(f.get("stops") or 0), 2) for f in offers))
+        self.departs = array("q", (
+            (f["depart_ts"] + f.get("depart_offset", 0) * 60) if f.get("depart_ts") is not None else 0
+            for f in offers
+        ))
+
+        self.orders = {
+            "price": sorted(range(n), key=self.prices.__getitem__),
+            "duration": sorted(range(n), key=self.durations.__getitem__),
+            "depart": sorted(range(n), key=self.departs.__getitem__),
+            "stops": sorted(range(n), key=lambda i: (self.stops[i], self.prices[i])),
+            "best": best_order(self.prices, self.durations, self.stops),
+        }
+        self.pareto = set(pareto_front(self.prices, self.durations))
+        for i in self.pareto:
+            offers[i]["best_value"] = True
+
+        self.all_bits = (1 << n) - 1
+        self.stops_bits = {}
+        self.airline_bits = {}
+        self.hour_bits = [0] * 24
+        for i, f in enumerate(offers):
+            bit = 1 << i
+            self.stops_bits[self.stops[i]] = self.stops_bits.get(self.stops[i], 0) | bit
+            airline = str(f.get("airline_code") or f.get("airline") or "")
+            self.airline_bits[airline] = self.airline_bits.get(airline, 0) | bit
+            if f.get("depart_ts") is not None:
+                self.hour_bits[(self.departs[i] % 86400) // 3600] |= bit
+
+        # Max-duration filter: prefix bitsets over the duration order + bisect
+        self.sorted_durations = [self.durations[i] for i in self.orders["duration"]]
+        self.duration_prefix_bits = [0]
+        for i in self.orders["duration"]:
+            self.duration_prefix_bits.append(self.duration_prefix_bits[-1] | (1 << i))
+
+    def tab_summary(self) -> Dict:
+        """Headline offer for each of the Best / Cheapest / Fastest tabs."""
+        if not self.offers:
+            return {}
+        return {
+            tab: {"price": self.offers[order[0]].get("price"), "duration": self.offers[order[0]].get("duration")}
+            for tab, order in (("best", self.orders["best"]), ("price", self.orders["price"]),
+                               ("duration", self.orders["duration"]))
+        }
+
+    def facets(self) -> Dict:
+        return {
+            "airlines": {code: bits.bit_count() for code, bits in self.airline_bits.items() if code},
+            "stops": {stops: bits.bit_count() for stops, bits in self.stops_bits.items()},
+            "max_duration": self.sorted_durations[-1] if self.sorted_durations else 0,
+        }
+
+    def filter_mask(self, stops: Optional[Iterable[int]] = None, airlines: Optional[Iterable[str]] = None,
+                    depart_from: Optional[int] = None, depart_to: Optional[int] = None,
+                    max_duration: Optional[int] = None) -> int:
+        mask = self.all_bits
+        if stops:
+            bits = 0
+            for s in stops:
+                bits |= self.stops_bits.get(min(int(s), 2), 0)
+            mask &= bits
+        if airlines:
+            bits = 0
+            for code in airlines:
+                bits |= self.airline_bits.get(code, 0)
+            mask &= bits
+        if depart_from is not None or depart_to is not None:
+            start, end = depart_from or 0, depart_to if depart_to is not None else 24
+            bits = 0
+            for hour in range(max(start, 0), min(end, 24)):
+                bits |= self.hour_bits[hour]
+            mask &= bits
+        if max_duration is not None:
+            mask &= self.duration_prefix_bits[bisect_right(self.sorted_durations, max_duration)]
+        return mask
+
+    def query(self, sort: str = "best", descending: bool = False, page: int = 1, per_page: int = 10,
+              **filters) -> Dict:
+        """Page of offers matching the filters, in the requested order."""
+        mask = self.filter_mask(**filters)
+        order = self.orders.get(sort, self.orders["price"])
+        if descending:
+            order = reversed(order)
+
+        page = max(page, 1)
+        skip = (page - 1) * per_page
+        offers = []
+        for i in order:
+            if not (mask >> i) & 1:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            offers.append(self.offers[i])
+            if len(offers) >= per_page:
+                break
+
+        return {
+            "search_id": self.search_id,
+            "total": mask.bit_count(),
+            "page": page,
+            "per_page": per_page,
+            "offers": offers,
+        }
+
+
+class ResultSetStore:
+    """Bounded (LRU + TTL) store of ResultSets keyed by search ID."""
+
+    def __init__(self, max_searches: int = RESULT_STORE_MAX_SEARCHES, ttl: float = RESULT_STORE_TTL):
+        self._cache = TTLCache(max_entries=max_searches, ttl=ttl)
+
+    def put(self, offers: List[Dict], meta: Optional[Dict] = None, search_id: Optional[str] = None) -> str:
+        """Stores a set under a fresh ID, or under a caller-derived one (same query, same ID)."""
+        search_id = search_id or uuid.uuid4().hex
+        self._cache.set(search_id, ResultSet(search_id, offers, meta))
+        return search_id
+
+    def get(self, search_id: str) -> Optional[ResultSet]:
+        return self._cache.get(search_id)
+
+
+result_sets = ResultSetStore()
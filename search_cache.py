@@ -0,0 +1,86 @@
+# search_cache.py — in-process result cache shared by the search paths
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from config import get_logger, RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES
+logger = get_logger(__name__)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+    Used for search results, flexible-date jobs and other short-lived state.
+    """
+
+    def __init__(self, max_entries: int = 500, ttl: float = 900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else default
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def make_query_key(namespace, origin, destination, date_from, date_to=None, trip_type="round-trip",
+                   adults=1, children=0, infants=0, cabin_class="economy", direct_only=False, limit=None) -> tuple:
+    """Canonical, hashable key for a search so equivalent queries share one cache entry."""
+    return (
+        namespace,
+        str(origin or "").strip().upper(),
+        str(destination or "").strip().upper(),
+        str(date_from or ""),
+        str(date_to or "") if trip_type == "round-trip" else "",
+        trip_type,
+        int(adults or 1), int(children or 0), int(infants or 0),
+        str(cabin_class or "economy").lower(),
+        bool(direct_only),
+        limit,
+    )
+
+
+# Shared cache of upstream search results (lists of flight dicts)
+result_cache = TTLCache(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL)
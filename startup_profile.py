@@ -0,0 +1,192 @@
+# startup_profile.py — where cold-start time goes: imports, boot phases, first request
+#
+# Usage: flask --app app startup-profile [--path /] [--top 25] [--out logs/startup]
+#        python startup_profile.py [same options]
+#
+# Boots the app in a fresh interpreter under `python -X importtime`, serves one
+# request through the test client, then writes a ranked text report, the raw
+# numbers as JSON and a folded-stack file for flamegraph.pl / speedscope.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import click
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULT_MARKER = "@@startup-profile@@"
+
+# Runs in the child interpreter: import the app, time the first request
+_DRIVER = f"""
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+response = app_module.app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print({RESULT_MARKER!r} + json.dumps({{
+    "import_app_ms": round((imported - started) * 1000, 1),
+    "first_request_ms": round((served - imported) * 1000, 1),
+    "first_request_status": response.status_code,
+    "boot": app_module.app.config.get("BOOT_TIMINGS", {{}}),
+}}))
+"""
+
+
+class ImportNode:
+    __slots__ = ("name", "self_us", "cumulative_us", "children")
+
+    def __init__(self, name: str, self_us: int, cumulative_us: int):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.children = []
+
+
+def parse_importtime(lines) -> List[ImportNode]:
+    """
+    Import tree from `-X importtime` output. Lines arrive in post-order (a module
+    after everything it imported), nesting shown by two spaces per level.
+    """
+    pending = []  # (depth, node) not yet attached to a parent
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        self_us, cumulative_us, name = fields
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        node = ImportNode(name.strip(), int(self_us), int(cumulative_us))
+        while pending and pending[-1][0] > depth:
+            node.children.insert(0, pending.pop()[1])
+        pending.append((depth, node))
+    return [node for _, node in pending]
+
+
+def walk(roots: List[ImportNode], prefix=()):
+    for node in roots:
+        path = prefix + (node.name,)
+        yield path, node
+        yield from walk(node.children, path)
+
+
+def folded_stacks(roots: List[ImportNode]) -> List[str]:
+    """'a;b;c <self µs>' lines (Brendan Gregg's folded format)."""
+    return [f"{';'.join(path)} {node.self_us}" for path, node in walk(roots) if node.self_us]
+
+
+def summarize(roots: List[ImportNode], top: int = 25) -> Dict:
+    nodes = [node for _, node in walk(roots)]
+    by_package = defaultdict(int)
+    for node in nodes:
+        by_package[node.name.split(".")[0]] += node.self_us
+    total_us = sum(node.cumulative_us for node in roots)
+    # A module can appear once only (later imports hit sys.modules), so names are unique
+    ranked = sorted(nodes, key=lambda n: n.cumulative_us, reverse=True)
+    return {
+        "imports_total_ms": round(total_us / 1000, 1),
+        "modules": len(nodes),
+        "top_cumulative": [{"module": n.name, "cumulative_ms": round(n.cumulative_us / 1000, 1),
+                            "self_ms": round(n.self_us / 1000, 1)} for n in ranked[:top]],
+        "top_packages": [{"package": name, "self_ms": round(us / 1000, 1),
+                          "share": round(us / total_us, 3) if total_us else 0}
+                         for name, us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]],
+    }
+
+
+def run_profile(path: str = "/", top: int = 25, env: Optional[Dict] = None) -> Dict:
+    """Boots the app in a child interpreter and returns timings plus the import tree."""
+    started = time.perf_counter()
+    child_env = {**os.environ, "DEFER_BACKGROUND_SERVICES": "true", **(env or {})}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _DRIVER, path],
+        cwd=BASE_DIR, env=child_env, capture_output=True, text=True,
+    )
+    wall_ms = round((time.perf_counter() - started) * 1000, 1)
+    result_line = next((l for l in proc.stdout.splitlines() if l.startswith(RESULT_MARKER)), None)
+    if proc.returncode != 0 or result_line is None:
+        raise RuntimeError(f"App failed to boot (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+    roots = parse_importtime(proc.stderr.splitlines())
+    result = json.loads(result_line[len(RESULT_MARKER):])
+    imports = summarize(roots, top)
+    config_node = next((n for _, n in walk(roots) if n.name == "config"), None)
+    boot = result.get("boot", {})
+    result.update({
+        "wall_ms": wall_ms,
+        "phases_ms": {
+            "interpreter_and_imports": imports["imports_total_ms"],
+            "config": round(config_node.cumulative_us / 1000, 1) if config_node else None,
+            "blueprints": boot.get("blueprints_ms"),
+            "assets": boot.get("assets_ms"),
+            "templates": boot.get("templates_ms"),
+            "reference_data": boot.get("reference_data_ms"),
+            "first_request": result["first_request_ms"],
+        },
+        "imports": imports,
+        "folded": folded_stacks(roots),
+    })
+    return result
+
+
+def format_report(profile: Dict) -> str:
+    lines = [f"⏱️ Cold start: {profile['wall_ms']} ms wall, app import {profile['import_app_ms']} ms, "
+             f"first request {profile['first_request_ms']} ms (HTTP {profile['first_request_status']})", "",
+             "Phases (ms)"]
+    lines += [f"  {name:<24}{value if value is not None else '-':>10}" for name, value in profile["phases_ms"].items()]
+    lines += ["", f"Heaviest imports ({profile['imports']['modules']} modules, cumulative ms)"]
+    lines += [f"  {i:>2}. {m['module']:<44}{m['cumulative_ms']:>9}{m['self_ms']:>9}"
+              for i, m in enumerate(profile["imports"]["top_cumulative"], 1)]
+    lines += ["", "Packages by own import time (ms, share)"]
+    lines += [f"  {p['package']:<30}{p['self_ms']:>9}{p['share'] * 100:>7.1f}%"
+              for p in profile["imports"]["top_packages"]]
+    return "\n".join(lines) + "\n"
+
+
+def write_outputs(profile: Dict, out_dir: str) -> Dict[str, str]:
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, f"startup-{time.strftime('%Y%m%dT%H%M%S')}")
+    paths = {"report": stem + ".txt", "json": stem + ".json", "folded": stem + ".folded"}
+    with open(paths["report"], "w", encoding="utf-8") as f:
+        f.write(format_report(profile))
+    with open(paths["json"], "w", encoding="utf-8") as f:
+        json.dump({k: v for k, v in profile.items() if k != "folded"}, f, indent=2)
+    with open(paths["folded"], "w", encoding="utf-8") as f:
+        f.write("\n".join(profile["folded"]) + "\n")
+    return paths
+
+
+def profile_startup(path: str = "/", top: int = 25, out_dir: str = "logs/startup") -> Dict[str, str]:
+    profile = run_profile(path, top)
+    print(format_report(profile))
+    paths = write_outputs(profile, out_dir)
+    print(f"📝 Wrote {paths['report']}, {paths['json']} and {paths['folded']} (flamegraph.pl / speedscope)")
+    return paths
+
+
+@click.command("startup-profile")
+@click.option("--path", default="/", help="URL served as the first request")
+@click.option("--top", default=25, help="Modules and packages to list")
+@click.option("--out", "out_dir", default="logs/startup", help="Directory for the report files")
+def startup_profile_command(path, top, out_dir):
+    """Profile a cold start: import times, boot phases and the first request."""
+    profile_startup(path, top, out_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start profile of the FlightFinder app")
+    parser.add_argument("--path", default="/", help="URL served as the first request")
+    parser.add_argument("--top", type=int, default=25, help="modules and packages to list")
+    parser.add_argument("--out", default="logs/startup", help="directory for the report files")
+    args = parser.parse_args(argv)
+    profile_startup(args.path, args.top, args.out)
+
+
+if __name__ == "__main__":
+    main()
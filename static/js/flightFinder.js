@@ -3,11 +3,99 @@
  * Handles Autocomplete, UI Toggles, Reset, Loading States, and Back-Button Fix
  */
 
+// --- 0. OFFLINE AIRPORT INDEX ---
+// Ranked [iata, city, name, links_count] rows built from airports.json at deploy
+// time (data-airports-url on the form), indexed by the first two letters of every
+// word. Without a bundle (development) autocomplete asks /search-airports instead.
+const AirportIndex = {
+  rows: null,
+  words: null,
+  buckets: null,
+  loading: null,
+
+  load(url) {
+    if (!url || !window.fetch) return Promise.resolve(null);
+    if (!this.loading) {
+      this.loading = fetch(url)
+        .then((response) => (response.ok ? response.json() : Promise.reject(response.status)))
+        .then((rows) => {
+          this.build(rows);
+          return this;
+        })
+        .catch(() => {
+          this.loading = null;
+          return null;
+        });
+    }
+    return this.loading;
+  },
+
+  normalize(text) {
+    return text.normalize("NFD").replace(/[\u0300-\u036f]/g, "").toLowerCase();
+  },
+
+  tokens(text) {
+    return this.normalize(text).split(/[^a-z0-9]+/).filter((t) => t.length);
+  },
+
+  build(rows) {
+    const buckets = new Map();
+    this.words = rows.map((row, i) => {
+      const words = this.tokens(`${row[0]} ${row[1]} ${row[2]}`);
+      words.forEach((word) => {
+        const key = word.slice(0, 2);
+        let list = buckets.get(key);
+        if (!list) buckets.set(key, (list = []));
+        if (list[list.length - 1] !== i) list.push(i);
+      });
+      return words;
+    });
+    this.rows = rows;
+    this.buckets = buckets;
+  },
+
+  // Airports where every query word prefixes some word of the IATA code, city or
+  // name; buckets hold rows in rank order, so the first hits are the busiest.
+  search(query, limit = 10) {
+    const terms = this.tokens(query);
+    const lead = terms.reduce((a, b) => (b.length > a.length ? b : a), "");
+    if (lead.length < 2) return [];
+    const results = [];
+    for (const i of this.buckets.get(lead.slice(0, 2)) || []) {
+      const words = this.words[i];
+      if (terms.every((t) => words.some((w) => w.startsWith(t)))) {
+        const row = this.rows[i];
+        results.push({ code: row[0], country_name: row[1], name: row[2] });
+        if (results.length >= limit) break;
+      }
+    }
+    return results;
+  },
+};
+
 // --- 1. THE AUTOCOMPLETE ENGINE ---
 function setupAirportAutocomplete(inputId, hiddenId) {
   const $input = $("#" + inputId);
   const $hidden = $("#" + hiddenId);
   const $list = $("#" + inputId + "-list");
+  const airportsUrl = $input.closest("form").data("airports-url");
+
+  function render(query, data) {
+    if ($input.val().trim() !== query) return; // a newer keystroke already answered
+    let html = "";
+    if (data && data.length > 0) {
+      data.forEach((item) => {
+        const name = `${item.name}, ${item.country_name} (${item.code})`;
+        html += `<div class="suggestion-item" data-code="${item.code}" data-full-name="${name}">${name}</div>`;
+      });
+      $list.html(html).show();
+    } else {
+      $list.empty().hide();
+    }
+  }
+
+  // Fetch the bundle as soon as the user reaches for the field
+  $input.one("focus", () => AirportIndex.load(airportsUrl));
 
   $input.on("input", function () {
     const query = $(this).val().trim();
@@ -15,18 +103,15 @@ function setupAirportAutocomplete(inputId, hiddenId) {
       $list.empty().hide();
       return;
     }
-    const url = `/search-airports?term=${encodeURIComponent(query)}`;
-
-    $.getJSON(url, function (data) {
-      let html = "";
-      if (data && data.length > 0) {
-        data.forEach((item) => {
-          const name = `${item.name}, ${item.country_name} (${item.code})`;
-          html += `<div class="suggestion-item" data-code="${item.code}" data-full-name="${name}">${name}</div>`;
-        });
-        $list.html(html).show();
+    if (AirportIndex.rows) {
+      render(query, AirportIndex.search(query));
+      return;
+    }
+    AirportIndex.load(airportsUrl).then((index) => {
+      if (index) {
+        render(query, index.search(query));
       } else {
-        $list.empty().hide();
+        $.getJSON(`/search-airports?term=${encodeURIComponent(query)}`, (data) => render(query, data));
       }
     });
   });
@@ -46,7 +131,59 @@ function setupAirportAutocomplete(inputId, hiddenId) {
   );
 }
 
+// --- 1b. PROGRESSIVE RESULTS (Server-Sent Events) ---
+// Cards arrive one by one from /stream-search; Travelpayouts deep links
+// upgrade them in place, and "done" unlocks the refine bar.
+function streamSearchResults($list) {
+  const $count = $("#results-count");
+  const source = new EventSource($list.data("stream-url"));
+  let total = 0;
+
+  source.addEventListener("offer", function (e) {
+    const offer = JSON.parse(e.data);
+    total += 1;
+    $count.text(total);
+    if (offer.html) $list.append(offer.html);
+  });
+
+  source.addEventListener("upgrade", function (e) {
+    const upgrade = JSON.parse(e.data);
+    const $card = $("#card-" + upgrade.id);
+    if (!$card.length) return;
+    if (upgrade.link) $card.find(".book-link").attr("href", upgrade.link);
+    if (upgrade.price) {
+      $card.find(".partner-info").text(`via ${upgrade.vendor} · ${upgrade.price} ${upgrade.currency || ""}`);
+    }
+  });
+
+  source.addEventListener("done", function (e) {
+    const done = JSON.parse(e.data);
+    source.close();
+    $("#stream-status").remove();
+    $list.attr("data-search-id", done.search_id);
+    $count.text(done.total);
+    if (!done.total) {
+      $list.html('<div class="sync-search-text" style="color: #888;">😕 No flights found. Please try a different search.</div>');
+    }
+    $("#refineForm")
+      .attr("data-results-url", done.results_url)
+      .removeClass("d-none")
+      .addClass("d-flex");
+  });
+
+  source.onerror = function () {
+    source.close();
+    $("#stream-status").remove();
+  };
+}
+
 $(document).ready(function () {
+  // 0. Progressive results page
+  const $streamList = $("#results-list[data-stream-url]");
+  if ($streamList.length && window.EventSource) {
+    streamSearchResults($streamList);
+  }
+
   // 1. Initial UI State
   $("#loading").hide();
   const $searchBtn = $('#searchForm button[type="submit"]');
@@ -119,6 +256,16 @@ $(document).ready(function () {
       }
     });
 
+    // Exact-date one-way/round-trip searches stream in on the live results page
+    if (
+      window.EventSource &&
+      $("#trip_type").val() !== "multi-city" &&
+      ($("#flex_days").val() || "0") === "0"
+    ) {
+      window.location.href = "/live-results?" + $(this).serialize();
+      return false;
+    }
+
     // UI FEEDBACK: Show spinner and change button
     $("#loading").show();
     $searchBtn
@@ -1,22 +1,101 @@
-const CACHE_NAME = "flightfinder-v1";
-const OFFLINE_URL = '/travel-ui/offline'; // Update this to match your blueprint path
+// Served by the app at /sw.js (root scope) with the placeholders below filled in:
+// the version changes whenever a fingerprinted asset or this file changes.
+const VERSION = "__SW_VERSION__";
+const PRECACHE_URLS = __PRECACHE_URLS__;
 
-// 1. Install - Cache the offline page
+const SHELL_CACHE = `flightfinder-shell-${VERSION}`;
+const AIRPORTS_CACHE = "flightfinder-airports-v1";
+const CDN_CACHE = "flightfinder-cdn-v1";
+const KEEP_CACHES = [SHELL_CACHE, AIRPORTS_CACHE, CDN_CACHE];
+
+const OFFLINE_URL = "/offline";
+const SHELL_PAGES = ["/"];
+const AIRPORTS_PATH = "/search-airports";
+const AIRPORTS_MAX_ENTRIES = 300;
+const CDN_HOSTS = ["cdn.jsdelivr.net", "code.jquery.com"];
+
+// 1. Install - precache the app shell (form page, offline page, CSS, JS, icons)
 self.addEventListener("install", (event) => {
   event.waitUntil(
-    caches.open(CACHE_NAME).then((cache) => {
-      return cache.addAll([OFFLINE_URL]);
-    }),
+    caches.open(SHELL_CACHE)
+      .then((cache) => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting()),
   );
 });
 
-// 2. Fetch - If network fails, show the offline page
+// 2. Activate - drop caches from previous versions
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((keys) => Promise.all(
+        keys.filter((key) => key.startsWith("flightfinder-") && !KEEP_CACHES.includes(key))
+          .map((key) => caches.delete(key)),
+      ))
+      .then(() => self.clients.claim()),
+  );
+});
+
+// Serve from cache at once, refresh the cached copy in the background
+function staleWhileRevalidate(event, cacheName, maxEntries) {
+  return caches.open(cacheName).then((cache) =>
+    cache.match(event.request).then((cached) => {
+      const network = fetch(event.request)
+        .then((response) => {
+          if (response.ok || response.type === "opaque") {
+            cache.put(event.request, response.clone()).then(() => maxEntries && trimCache(cache, maxEntries));
+          }
+          return response;
+        })
+        .catch(() => cached);
+      if (cached) {
+        event.waitUntil(network.catch(() => {}));
+        return cached;
+      }
+      return network;
+    }),
+  );
+}
+
+function trimCache(cache, maxEntries) {
+  return cache.keys().then((keys) =>
+    Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map((key) => cache.delete(key))),
+  );
+}
+
+// 3. Fetch - route by request type
 self.addEventListener("fetch", (event) => {
-  if (event.request.mode === "navigate") {
+  const request = event.request;
+  if (request.method !== "GET") return;
+  const url = new URL(request.url);
+
+  if (url.origin !== self.location.origin) {
+    if (CDN_HOSTS.includes(url.hostname)) {
+      event.respondWith(staleWhileRevalidate(event, CDN_CACHE));
+    }
+    return;
+  }
+
+  if (url.pathname === AIRPORTS_PATH) {
+    event.respondWith(staleWhileRevalidate(event, AIRPORTS_CACHE, AIRPORTS_MAX_ENTRIES));
+    return;
+  }
+
+  if (request.mode === "navigate") {
+    // The search form is shell: instant from cache. Results must be fresh: network first.
+    if (SHELL_PAGES.includes(url.pathname) && !url.search) {
+      event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+      return;
+    }
+    event.respondWith(
+      fetch(request).catch(() => caches.match(request).then((cached) => cached || caches.match(OFFLINE_URL))),
+    );
+    return;
+  }
+
+  // Fingerprinted assets never change: cache first
+  if (url.pathname.startsWith("/assets/") || url.pathname.startsWith("/static/")) {
     event.respondWith(
-      fetch(event.request).catch(() => {
-        return caches.match(OFFLINE_URL);
-      }),
+      caches.match(request).then((cached) => cached || fetch(request)),
     );
   }
 });
@@ -4,6 +4,7 @@ from utils import extract_travel_entities
 from flight_search import search_flights
 from iata_codes import city_to_iata
 from mock_data import AIRLINE_NAMES  
+from ranking import top_k_by_price
 from datetime import date, datetime
 from flask import request
 
@@ -91,7 +92,7 @@ def travel_chatbot(user_input: str, trip_type: str = "round-trip", limit=None, d
 
     # ✅ Prepare flight data for template
     prepared_flights = []
-    sorted_flights = sorted(flights, key=lambda x: x["price"])
+    sorted_flights = top_k_by_price(flights, limit)
     
     for flight in sorted_flights:
         airline_code = flight.get("airline", "Unknown")
@@ -101,6 +102,10 @@ def travel_chatbot(user_input: str, trip_type: str = "round-trip", limit=None, d
             "price": flight.get("price"),
             "depart": flight.get("depart"),
             "return": flight.get("return"),
+            "depart_ts": flight.get("depart_ts"),
+            "depart_offset": flight.get("depart_offset", 0),
+            "arrive_ts": flight.get("arrive_ts"),
+            "arrive_offset": flight.get("arrive_offset", 0),
             "airline": airline_name,
             "flight_number": flight.get("flight_number", "N/A"),
             "duration": flight.get("duration", "N/A"),
@@ -1,4 +1,4 @@
-from flask import Blueprint, redirect, render_template, request, jsonify, url_for, session, send_from_directory, current_app
+from flask import Blueprint, Response, redirect, render_template, request, jsonify, url_for, session, send_from_directory, current_app, stream_with_context
 import requests
 from travel import travel_chatbot
 from datetime import datetime
@@ -6,17 +6,16 @@ import config  # Simple and clean
 
 from urllib.parse import urlparse  # Required for cleaning the 404 links
 
-# Then use it like this:
-if config.IS_LOCAL:
-    print("Running locally")
 
 limit = config.FEATURED_FLIGHT_LIMIT
 
 
 import json
+import time
 import traceback
 import os
-from utils import get_city_name, get_airline_name
+from functools import lru_cache
+from utils import get_city_name, get_airline_name, format_epoch
 
 # Database imports commented out as requested
 # from database import db
@@ -24,44 +23,109 @@ from utils import get_city_name, get_airline_name
 # from db import save_booking
 
 from utils import extract_travel_entities, extract_iata, build_flight_deeplink
-from flight_search import get_combined_flight_results, search_flights as search_flights_func
+from flight_search import get_combined_flight_results, search_flights as search_flights_func, stream_search
 from iata_codes import city_to_iata
+from flex_search import search_flexible_dates, flex_jobs
+from multi_city import search_multi_city
+from result_store import result_sets
+from offer_store import offer_store, session_namespace
+from click_tracking import split_tracking, track_click
+from query_log import log_query
+from render_cache import render_flight_card
 from travel import generate_booking_reference, travel_form_handler
 
 from urllib.parse import urlencode
 from config import get_logger, AFFILIATE_MARKER, API_TOKEN
 logger = get_logger(__name__)
+if config.IS_LOCAL:
+    logger.info("🏠 Running locally")
 
 from dotenv import load_dotenv
 load_dotenv()
 
-offers_db = {}
 travel_bp = Blueprint("travel", __name__)
 
 # === Helper Functions ===
 
-def format_datetime(dt_str):
-    try:
-        dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-        return dt.strftime("%b %d, %H:%M")
-    except Exception:
+def format_datetime(ts, offset=0):
+    if ts is None:
         return "Not available"
+    return format_epoch(ts, offset, "%b %d, %H:%M")
 
-def format_time_only(dt_str):
-    try:
-        if ' ' in dt_str:
-            return dt_str.split(' ')[1][:5]
-        return dt_str
-    except Exception:
+def format_time_only(ts, offset=0):
+    if ts is None:
         return "--:--"
+    return format_epoch(ts, offset, "%H:%M")
 
-def format_date_only(dt_str):
-    try:
-        if ' ' in dt_str:
-            return dt_str.split(' ')[0]
-        return dt_str
-    except Exception:
+def format_date_only(ts, offset=0):
+    if ts is None:
         return ""
+    return format_epoch(ts, offset, "%Y-%m-%d")
+
+def prepare_result_flight(flight, trip_type, passengers, form):
+    """Adds the display fields and the cleaned deeplink a result card needs."""
+    # A. Inject basic trip data
+    flight["trip_type"] = trip_type
+    flight["passengers"] = passengers
+
+    # B. CAPTURE AND CLEAN AIRLINE CODE
+    # We check multiple possible keys from different APIs
+    raw_code = (
+        flight.get("airline_code") or
+        flight.get("airline") or
+        flight.get("carrierCode") or
+        "XX"
+    )
+    # C. Generate the monetized link
+    # This uses the helper function we added to create the final URL
+    flight['monetized_url'] = generate_booking_link(
+    flight.get('origin'), 
+    flight.get('destination'), 
+    flight.get('depart_date_formatted')
+    )
+
+
+    clean_code = str(raw_code).strip().upper()[:2]
+    flight["airline_code"] = clean_code
+
+    # C. DEFINE AIRLINE DISPLAY (The translation step)
+    # This adds the 'airline_display' key to the flight dictionary
+    flight["airline_display"] = get_airline_name(clean_code)
+
+    # D. Handle Multi-City specific data
+    if trip_type in ['multi-city', 'multi_city']:
+        flight["origin_2"] = form.get("origin_code_2")
+        flight["destination_2"] = form.get("destination_code_2")
+        flight["depart_date_2"] = form.get("date_from_2")
+
+    # E. REBUILD AND CLEAN DEEPLINK (Fixes the 404 error)
+    flight["deeplink"] = clean_deeplink(flight)
+    return flight
+
+def clean_deeplink(flight):
+    """build_flight_deeplink() reduced to its path and query, served from our own host."""
+    raw_link = build_flight_deeplink(flight, config.AFFILIATE_MARKER)
+    parsed = urlparse(raw_link)
+    clean_link = parsed.path
+    if parsed.query:
+        clean_link += f"?{parsed.query}"
+
+    if not clean_link.startswith("/"):
+        clean_link = "/" + clean_link
+    return clean_link
+
+@travel_bp.app_template_filter("clock")
+def clock_filter(ts, offset=0):
+    """Jinja filter: {{ flight.depart_ts|clock(flight.depart_offset) }} -> '10:30'"""
+    if not isinstance(ts, int):
+        return "--:--"
+    return format_time_only(ts, offset or 0)
+
+@lru_cache(maxsize=1)
+def airport_records():
+    """airports.json parsed once per process (once in the gunicorn master under --preload)"""
+    with open(os.path.join(os.path.dirname(__file__), 'airports.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 def is_token_match(token, airport):
     return (
@@ -111,18 +175,18 @@ def travel_ui():
 
         try:
             result = travel_chatbot(user_input, trip_type=trip_type, limit=limit, direct_only=direct_only)
-            offers_db.clear()
             trip_info = result.get("trip_info", {})
             flights = result.get("flights", [])
 
             for pf in flights:
                 pf["origin"] = trip_info.get("origin", origin_code)
                 pf["destination"] = trip_info.get("destination", destination_code)
-                if pf.get("depart"):
-                    pf["depart_formatted"] = format_datetime(pf["depart"])
-                    pf["depart_time"] = format_time_only(pf["depart"])
-                    pf["depart_date"] = format_date_only(pf["depart"])
-                offers_db[pf["id"]] = pf
+                if pf.get("depart_ts") is not None:
+                    pf["depart_formatted"] = format_datetime(pf["depart_ts"], pf.get("depart_offset", 0))
+                    pf["depart_time"] = format_time_only(pf["depart_ts"], pf.get("depart_offset", 0))
+                    pf["depart_date"] = format_date_only(pf["depart_ts"], pf.get("depart_offset", 0))
+
+            offer_store.put(session_namespace(), flights)
 
             return render_template(
                 "search_results.html",
@@ -164,6 +228,7 @@ def search_flights():
 
     limit = int(request.form.get("limit", config.FEATURED_FLIGHT_LIMIT))
     direct_only = request.form.get("direct_only") == "on"
+    flex_days = request.form.get("flex_days", 0, type=int) or 0
 
     # 2. Display Names for Header
     display_origin = get_city_name(origin_raw)
@@ -175,71 +240,83 @@ def search_flights():
                                errors=["Please provide origin, destination, and departure date"],
                                form_data=request.form)
 
-    try:
-        # 3. Perform the API Search
-        flights = search_flights_func(
+    # Flexible dates: start the price calendar and let the page poll it
+    if flex_days > 0 and trip_type in ("one-way", "round-trip"):
+        try:
+            for value in (depart_date, return_date if trip_type == "round-trip" else None):
+                if value:
+                    datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            return render_template("travel_form.html",
+                                   errors=["Please enter dates as YYYY-MM-DD for a flexible-date search"],
+                                   form_data=request.form)
+        job = search_flexible_dates(
             origin_raw, dest1_raw, depart_date,
             return_date if trip_type == "round-trip" else None,
-            trip_type=trip_type, adults=int(passengers),
-            cabin_class=cabin_class, limit=limit, direct_only=direct_only
+            trip_type, flex_days=flex_days, adults=int(passengers),
+            cabin_class=cabin_class, direct_only=direct_only
+        )
+        log_query(kind="flex", source="web", origin=origin_raw, destination=dest1_raw,
+                  date_from=depart_date, date_to=return_date or None, trip_type=trip_type,
+                  flex_days=flex_days, cells=sum(len(row) for row in job.snapshot()["cells"]))
+        return render_template(
+            "flex_calendar.html",
+            job=job.snapshot(),
+            origin=display_origin,
+            destination=display_dest1,
+            origin_code=origin_raw,
+            destination_code=dest1_raw,
+            trip_type=trip_type,
+            passengers=passengers,
+            cabin_class=cabin_class,
+            direct_only=direct_only,
+            limit=limit
         )
 
-        safe_flights = []
+    try:
+        # 3. Perform the API Search
+        if trip_type in ['multi-city', 'multi_city'] and dest2_raw and depart_date_2:
+            # Every leg is searched for real and combined by total price
+            started = time.perf_counter()
+            flights = search_multi_city(
+                [(origin_raw, dest1_raw, depart_date), (dest1_raw, dest2_raw, depart_date_2)],
+                adults=int(passengers), cabin_class=cabin_class,
+                direct_only=direct_only, k=limit
+            )
+            log_query(kind="multi-city", source="web", origin=origin_raw, destination=dest2_raw,
+                      via=dest1_raw, date_from=depart_date, date_to=depart_date_2, trip_type=trip_type,
+                      adults=int(passengers), results=len(flights),
+                      total_ms=round((time.perf_counter() - started) * 1000))
+        else:
+            flights = search_flights_func(
+                origin_raw, dest1_raw, depart_date,
+                return_date if trip_type == "round-trip" else None,
+                trip_type=trip_type, adults=int(passengers),
+                cabin_class=cabin_class, limit=max(limit, config.RESULT_SET_SIZE), direct_only=direct_only
+            )
 
         # 4. Process Each Flight for the Template
-        for flight in flights:
-            if isinstance(flight, dict):
-                # A. Inject basic trip data
-                flight["trip_type"] = trip_type
-                flight["passengers"] = passengers
-
-                # B. CAPTURE AND CLEAN AIRLINE CODE
-                # We check multiple possible keys from different APIs
-                raw_code = (
-                    flight.get("airline_code") or
-                    flight.get("airline") or
-                    flight.get("carrierCode") or
-                    "XX"
-                )
-                # C. Generate the monetized link
-                # This uses the helper function we added to create the final URL
-                flight['monetized_url'] = generate_booking_link(
-                flight.get('origin'), 
-                flight.get('destination'), 
-                flight.get('depart_date_formatted')
-                )
-                
-                
-                clean_code = str(raw_code).strip().upper()[:2]
-                flight["airline_code"] = clean_code
-
-                # C. DEFINE AIRLINE DISPLAY (The translation step)
-                # This adds the 'airline_display' key to the flight dictionary
-                flight["airline_display"] = get_airline_name(clean_code)
-
-                # D. Handle Multi-City specific data
-                if trip_type in ['multi-city', 'multi_city']:
-                    flight["origin_2"] = request.form.get("origin_code_2")
-                    flight["destination_2"] = request.form.get("destination_code_2")
-                    flight["depart_date_2"] = request.form.get("date_from_2")
-
-                # E. REBUILD AND CLEAN DEEPLINK (Fixes the 404 error)
-                raw_link = build_flight_deeplink(flight, config.AFFILIATE_MARKER)
-                parsed = urlparse(raw_link)
-                clean_link = parsed.path
-                if parsed.query:
-                    clean_link += f"?{parsed.query}"
-
-                if not clean_link.startswith("/"):
-                    clean_link = "/" + clean_link
-
-                flight["deeplink"] = clean_link
-                safe_flights.append(flight)
-
-        # 5. Render Template with Processed Data
+        safe_flights = [
+            prepare_result_flight(flight, trip_type, passengers, request.form)
+            for flight in flights if isinstance(flight, dict)
+        ]
+
+        # 5. Keep the full set so refinements never hit the airlines again
+        search_id = result_sets.put(safe_flights, {
+            "origin": origin_raw, "destination": dest1_raw, "trip_type": trip_type, "currency": "SEK"
+        })
+        offer_store.put(session_namespace(), safe_flights)
+        result_set = result_sets.get(search_id)
+        first_page = result_set.query(sort="best", per_page=limit)
+
+        # 6. Render Template with Processed Data
         return render_template(
             "search_results.html",
-            flights=safe_flights[:limit],
+            flights=first_page["offers"],
+            total_count=first_page["total"],
+            search_id=search_id,
+            facets=result_set.facets(),
+            tabs=result_set.tab_summary(),
             origin=display_origin,
             destination=display_dest1,
             destination_2=display_dest2,
@@ -257,6 +334,138 @@ def search_flights():
                                errors=[f"Search failed: {str(e)}"],
                                form_data=request.form)
 
+def sse_event(event, data):
+    """One Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@travel_bp.route("/live-results")
+def live_results():
+    """Results page shell that fills in from /stream-search as offers arrive"""
+    args = request.args
+    origin_raw = extract_iata(args.get("origin_code", ""))
+    dest1_raw = extract_iata(args.get("destination_code", ""))
+    if not origin_raw or not dest1_raw or not args.get("date_from"):
+        return render_template("travel_form.html",
+                               errors=["Please provide origin, destination, and departure date"],
+                               form_data=args)
+
+    trip_type = args.get("trip_type", "round-trip")
+    return render_template(
+        "search_results.html",
+        flights=[],
+        stream_url=url_for("travel.stream_search_route", **args),
+        origin=get_city_name(origin_raw),
+        destination=get_city_name(dest1_raw),
+        depart_date=args.get("date_from"),
+        return_date=args.get("date_to"),
+        trip_type=trip_type,
+        currency="SEK",
+        per_page=args.get("limit", config.FEATURED_FLIGHT_LIMIT, type=int),
+        direct_only=args.get("direct_only") == "on"
+    )
+
+@travel_bp.route("/stream-search")
+def stream_search_route():
+    """
+    Server-Sent Events search: 'offer' per Amadeus flight (rendered card),
+    'upgrade' per Travelpayouts deep link, then 'done' with the stored search ID.
+    """
+    args = request.args
+    origin_raw = extract_iata(args.get("origin_code", ""))
+    dest1_raw = extract_iata(args.get("destination_code", ""))
+    depart_date = args.get("date_from", "")
+    return_date = args.get("date_to", "")
+    trip_type = args.get("trip_type", "round-trip")
+    passengers = args.get("passengers", "1")
+    cabin_class = args.get("cabin_class", "economy")
+    limit = args.get("limit", config.FEATURED_FLIGHT_LIMIT, type=int)
+    direct_only = args.get("direct_only") == "on"
+    namespace = session_namespace()  # before streaming starts: the cookie goes out with the headers
+
+    def generate():
+        shown = 0
+        for kind, payload in stream_search(
+            origin_raw, dest1_raw, depart_date,
+            return_date if trip_type == "round-trip" else None,
+            trip_type, adults=int(passengers), cabin_class=cabin_class,
+            limit=max(limit, config.RESULT_SET_SIZE), direct_only=direct_only
+        ):
+            if kind == "offer":
+                flight = prepare_result_flight(payload, trip_type, passengers, args)
+                card = None
+                if shown < limit:
+                    card = render_flight_card(flight, currency="SEK", trip_type=trip_type)
+                    shown += 1
+                yield sse_event("offer", {"id": flight["id"], "html": card})
+            elif kind == "upgrade":
+                # apply_deep_link() set the raw partner link; cards and the stored set use the clean one
+                payload["deeplink"] = clean_deeplink(payload)
+                yield sse_event("upgrade", {
+                    "id": payload["id"],
+                    "link": payload["deeplink"],
+                    "vendor": payload.get("vendor"),
+                    "price": payload.get("partner_price"),
+                    "currency": payload.get("partner_currency"),
+                })
+            else:
+                offer_store.put(namespace, payload)
+                search_id = result_sets.put(payload, {
+                    "origin": origin_raw, "destination": dest1_raw, "trip_type": trip_type, "currency": "SEK"
+                })
+                yield sse_event("done", {
+                    "search_id": search_id,
+                    "total": len(payload),
+                    "results_url": url_for("travel.refine_results", search_id=search_id),
+                })
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@travel_bp.route("/flex-calendar/<job_id>")
+def flex_calendar(job_id):
+    """Current state of a flexible-date price matrix (polled by flex_calendar.html)"""
+    job = flex_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired calendar"}), 404
+    return jsonify(job.snapshot())
+
+@travel_bp.route("/results/<search_id>")
+def refine_results(search_id):
+    """Page, sort and filter a stored result set (no upstream calls)"""
+    result_set = result_sets.get(search_id)
+    if result_set is None:
+        return jsonify({"error": "Search expired, please search again"}), 404
+
+    def int_list(name):
+        raw = request.args.get(name, "")
+        return [int(v) for v in raw.split(",") if v.strip().isdigit()] or None
+
+    page = result_set.query(
+        sort=request.args.get("sort", "best"),
+        descending=request.args.get("order") == "desc",
+        page=max(1, request.args.get("page", 1, type=int)),
+        per_page=max(1, min(request.args.get("per_page", 10, type=int), 100)),
+        stops=int_list("stops"),
+        airlines=[a for a in request.args.get("airline", "").split(",") if a] or None,
+        depart_from=request.args.get("depart_from", type=int),
+        depart_to=request.args.get("depart_to", type=int),
+        max_duration=request.args.get("max_duration", type=int),
+    )
+    log_query(kind="refine", search_id=search_id, origin=result_set.meta.get("origin"),
+              destination=result_set.meta.get("destination"), sort=request.args.get("sort", "best"),
+              page=page["page"], results=page["total"])
+
+    if request.args.get("format") == "html":
+        html = "".join(
+            render_flight_card(flight, currency=result_set.meta.get("currency"),
+                               trip_type=result_set.meta.get("trip_type"))
+            for flight in page["offers"]
+        )
+        return html, 200, {"X-Total-Count": str(page["total"])}
+
+    page["facets"] = result_set.facets()
+    return jsonify(page)
+
 @travel_bp.route('/flights/results', methods=['GET'])
 def flight_results():
     # 1. Capture inputs
@@ -329,7 +538,9 @@ def flight_results():
 
 @travel_bp.route('/search/<path:search_code>')
 def redirect_to_aviasales(search_code):
-    raw_qs = request.query_string.decode('utf-8')
+    raw_qs, tracking = split_tracking(request.query_string.decode('utf-8'))
+    track_click("search", tracking, search_code=search_code,
+                gate="aviasales-multi" if search_code == "multi" else None)
 
     if search_code == "multi":
         # Multi-city MUST go to search.aviasales.com/flights/ with segments
@@ -352,10 +563,22 @@ def book_flight():
     """
     Safely captures the booking URL and airline info, then shows the loading page.
     """
-    # 1. Get the data from the button click
+    # 1. Get the data from the button click (or from the stored offer it names)
+    _, tracking = split_tracking(request.query_string.decode('utf-8'))
     target_url = request.args.get("url", "")
     destination_name = request.args.get("dest", "your destination")
     airline_name = request.args.get("airline", "our partner")
+    offer_id = request.args.get("offer")
+    gate = None
+    if offer_id:
+        offer = offer_store.get(session_namespace(), offer_id)
+        if offer is None:
+            return redirect(url_for("travel.travel_ui"))
+        target_url = offer.get("deeplink") or target_url
+        destination_name = get_city_name(offer.get("destination")) or destination_name
+        airline_name = offer.get("airline_display") or airline_name
+        gate = offer.get("vendor")
+    track_click("book-flight", tracking, offer_id=offer_id, gate=gate)
 
     if not target_url:
         return redirect(url_for("travel.travel_ui"))
@@ -371,12 +594,19 @@ def book_flight():
                            destination=destination_name,
                            airline=airline_name)
 
+@travel_bp.route("/offer/<offer_id>")
+def offer_detail(offer_id):
+    """One offer from the visitor's latest results, without searching again"""
+    offer = offer_store.get(session_namespace(), offer_id)
+    if offer is None:
+        return jsonify({"error": "Offer expired, please search again"}), 404
+    return jsonify(offer)
+
 @travel_bp.route("/autocomplete-airports")
 def autocomplete_airports():
     query = request.args.get("query", "").strip().lower()
     try:
-        with open("airports.json", "r", encoding="utf-8") as f:
-            airports = json.load(f)
+        airports = airport_records()
         tokens = query.split()
         matches = [a for a in airports if any(is_token_match(t, a) for t in tokens)]
         return jsonify([{"value": f'{a["city"]} ({a["iata"]})', "label": f'{a["name"]} — {a["city"]} ({a["iata"]})'} for a in matches])
@@ -421,26 +651,25 @@ def search_airports():
             # The API already uses 'country_name' and 'code', so we return as-is
             return jsonify(response.json())
         except Exception as e:
-            print(f"API Error: {e}")
+            logger.warning(f"⚠️ Autocomplete API error, using airports.json: {e}")
 
     # --- PRODUCTION PATH (PythonAnywhere) Load local file: airports.json
-    file_path = os.path.join(os.path.dirname(__file__), 'airports.json')
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = airport_records()
 
         results = []
         for item in data:
+            iata = item.get('iata_code') or item.get('iata') or ''
             if (query in item.get('city', '').lower() or
                 query in item.get('name', '').lower() or
-                query in item.get('iata', '').lower()):
+                query in iata.lower()):
 
                 # ✅ KEY FIX: We map 'city' to 'country_name' and 'iata' to 'code'
                 # so your JavaScript template `${item.country_name}` doesn't break.
                 results.append({
                     "name": item.get('name'),
                     "country_name": item.get('city'), # Map city to country_name
-                    "code": item.get('iata')          # Map iata to code
+                    "code": iata                      # Map iata_code to code
                 })
         return jsonify(results[:10])
     except Exception as e:
@@ -449,7 +678,9 @@ def search_airports():
 
 @travel_bp.route("/health", methods=["GET"])
 def health():
-    return jsonify({'status': 'ok', 'timestamp': datetime.utcnow().isoformat(), 'service': 'FlightFinder'})
+    from log_pipeline import log_stats
+    return jsonify({'status': 'ok', 'timestamp': datetime.utcnow().isoformat(), 'service': 'FlightFinder',
+                    'boot': current_app.config.get('BOOT_TIMINGS'), 'logging': log_stats()})
 
 
 
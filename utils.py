@@ -1,12 +1,14 @@
 import re
+import calendar
 import hashlib
 import logging
-from datetime import datetime
-from typing import Dict, Any
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 
 
-import dateparser
-from word2number import w2n
 
 
 import os
@@ -15,97 +17,31 @@ from dotenv import load_dotenv
 
 load_dotenv()
 from config import AFFILIATE_MARKER
+from nl_parser import parse_passengers, parse_trip
+from date_normalize import normalize_date
 marker = AFFILIATE_MARKER or os.getenv("AFFILIATE_MARKER", "")
 
 logger = logging.getLogger(__name__)
 
 
 
-def normalize_passenger_count(text: str) -> int:
-    text = text.lower()
-
-    if "me and my" in text or "my partner" in text:
-        return 2
-    if "family" in text:
-        return 4
-    if "group" in text:
-        return 5
-
-    match = re.search(r"(\d+)\s*(passenger|people|adults|persons)?", text)
-    if match:
-        return int(match.group(1))
 
-    try:
-        return w2n.word_to_num(text)
-    except:
-        return 1
+def normalize_passenger_count(text: str) -> int:
+    """'3', 'three', 'me and my partner', 'family' ... defaults to 1."""
+    return parse_passengers(text) or 1
 
 
 def parse_date(text: str):
     """
     Parses a natural language date string (e.g. 'Oct 5', 'next Monday') into a datetime object.
-    Returns None if parsing fails.
+    Returns None if parsing fails. Common forms skip dateparser; see date_normalize.
     """
-    parsed = dateparser.parse(text)
-    if not parsed:
-        return None
-    return parsed
+    return normalize_date(text)
 
 
 def extract_travel_entities(user_input: str) -> Dict[str, Any]:
-    info = {}
-    input_lower = user_input.lower()
-
-    print(f"🔍 Raw input: {user_input}")
-
-    # 📅 Extract travel dates
-    date_range_match = re.search(r'from\s+(\d{4}-\d{2}-\d{2})\s+to\s+(\d{4}-\d{2}-\d{2})', input_lower)
-    one_way_match = re.search(r'(?:on|departing)\s+(\d{4}-\d{2}-\d{2})', input_lower)
-
-    try:
-        if date_range_match:
-            info["date_from"] = datetime.strptime(date_range_match.group(1), "%Y-%m-%d")
-            info["date_to"] = datetime.strptime(date_range_match.group(2), "%Y-%m-%d")
-            info["trip_type"] = "round-trip"
-        elif one_way_match:
-            info["date_from"] = datetime.strptime(one_way_match.group(1), "%Y-%m-%d")
-            info["trip_type"] = "one-way"
-    except ValueError:
-        print("⚠️ Invalid date format detected.")
-
-    print(f"📅 Parsed dates: from={info.get('date_from')} to={info.get('date_to')}")
-
-    # ✈️ Extract origin and destination city names
-    origin_match = re.search(r'from\s+([a-zA-Z\s]+?)\s*\(', user_input)
-    destination_match = re.search(r'to\s+([a-zA-Z\s]+?)\s*\(', user_input)
-
-    if origin_match:
-        info["origin"] = origin_match.group(1).strip()
-    if destination_match:
-        info["destination"] = destination_match.group(1).strip()
-
-    # ✈️ Extract airport codes from parentheses
-    iata_matches = re.findall(r'\(\s*([A-Z]{3})\s*\)', user_input)
-    if len(iata_matches) >= 2:
-        info["origin_code"] = iata_matches[0].strip().upper()
-        info["destination_code"] = iata_matches[1].strip().upper()
-    elif len(iata_matches) == 1:
-        info["origin_code"] = iata_matches[0].strip().upper()
-        info["destination_code"] = ""  # fallback
-
-    # 🧠 Optional: fallback if city names weren't matched
-    if not info.get("origin") and "origin_code" in info:
-        info["origin"] = info["origin_code"]
-    if not info.get("destination") and "destination_code" in info:
-        info["destination"] = info["destination_code"]
-
-    # 👥 Extract number of passengers
-    passengers_match = re.search(r'for\s+(\d+)\s+passengers?', input_lower)
-    if passengers_match:
-        info["passengers"] = int(passengers_match.group(1))
-
-    print(f"✅ Extracted info: {info}")
-    return info
+    """Origin/destination (names and codes), dates, trip type and passengers; see nl_parser."""
+    return parse_trip(user_input)
 
 
 def generate_flight_id(link: str, airline: str, departure: datetime) -> str:
@@ -147,31 +83,15 @@ def format_ddmm(date_val):
     if not date_val:
         return ""
 
-    # 1. Handle if it's already a datetime object
-    if isinstance(date_val, datetime):
+    # Already a date/datetime: no parsing needed
+    if isinstance(date_val, (datetime, date)):
         return date_val.strftime("%d%m")
 
-    try:
-        # 2. Clean the string: Remove time (T00:00) and extra spaces
-        # Works for "2025-12-10T10:30" or "2025-12-10 10:30"
-        date_str = str(date_val).split('T')[0].split(' ')[0].strip()
-
-        # 3. Handle YYYY-MM-DD format
-        if '-' in date_str:
-            parts = date_str.split('-')
-            if len(parts) == 3:
-                day = parts[2].zfill(2)   # Ensures "5" becomes "05"
-                month = parts[1].zfill(2) # Ensures "1" becomes "01"
-                return f"{day}{month}"
-
-        # 4. Fallback: Try a generic parse if format is weird (e.g., "12/10/2025")
-        parsed = dateparser.parse(date_str)
-        if parsed:
-            return parsed.strftime("%d%m")
-
-    except Exception as e:
-        logger.warning(f"Could not format date '{date_val}': {e}")
-
+    # "2025-12-10", "2025-12-10T10:30", "10/12/2025" (day first), "next friday"...
+    parsed = normalize_date(date_val)
+    if parsed:
+        return parsed.strftime("%d%m")
+    logger.warning(f"Could not format date '{date_val}'")
     return ""
 
 
@@ -189,17 +109,28 @@ def build_flight_deeplink(flight, marker, currency="SEK"):
 
         # 1. Start with the basics (Leg 1)
         origin1 = clean_iata(str(flight.get("origin_code") or flight.get("origin", "")))
-        dest1 = clean_iata(str(flight.get("destination_code") or flight.get("destination", "")))
+        if flight.get("legs"):
+            dest1 = clean_iata(str(flight["legs"][0].get("destination", "")))
+        else:
+            dest1 = clean_iata(str(flight.get("destination_code") or flight.get("destination", "")))
 
         # Extract date and convert to DDMM (e.g., 2025-12-15 -> 1512)
-        raw_date1 = flight.get("depart_date") or flight.get("depart")
-        date1 = format_ddmm(raw_date1)
+        if flight.get("depart_ts") is not None:
+            date1 = format_epoch(flight["depart_ts"], flight.get("depart_offset", 0), "%d%m")
+        else:
+            date1 = format_ddmm(flight.get("depart_date") or flight.get("depart"))
 
         # Base path: ORIGIN + DATE + DEST
         search_path = f"{origin1}{date1}{dest1}"
 
         # 2. Handle Multi-city (The "Chain" Logic from old flight_search.py)
-        if trip_type == "multi-city":
+        if trip_type == "multi-city" and flight.get("legs"):
+            # Real itineraries carry every leg: chain DATE + DEST for legs 2..n
+            for leg in flight["legs"][1:]:
+                leg_date = format_epoch(leg.get("depart_ts"), leg.get("depart_offset", 0), "%d%m")
+                search_path += f"{leg_date}{clean_iata(str(leg.get('destination', '')))}"
+
+        elif trip_type == "multi-city":
             # The old code just appends DATE2 + DEST2 to the end
             raw_date2 = flight.get("depart_date_2") or flight.get("date_2")
             dest2_raw = flight.get("destination_code_2") or flight.get("destination_2")
@@ -212,9 +143,12 @@ def build_flight_deeplink(flight, marker, currency="SEK"):
 
         # 3. Handle Round-trip
         elif trip_type == "round-trip":
-            raw_date_to = flight.get("return_date") or flight.get("return")
-            if raw_date_to:
-                search_path += format_ddmm(raw_date_to)
+            if flight.get("return_depart_ts") is not None:
+                search_path += format_epoch(flight["return_depart_ts"], flight.get("return_depart_offset", 0), "%d%m")
+            else:
+                raw_date_to = flight.get("return_date") or flight.get("return")
+                if raw_date_to:
+                    search_path += format_ddmm(raw_date_to)
 
         # 4. Final Search Code (Path + Adult Digit)
         # In the old code, the adult count is the LAST character
@@ -286,6 +220,69 @@ def format_duration(duration_td: timedelta) -> str:
     return " ".join(parts) if parts else "0m"
 
 
+# === Timestamp Normalization ===
+# Every provider timestamp is parsed exactly once at ingest into a UTC epoch
+# plus the UTC offset (minutes) it was written in. Sorting, merge matching and
+# filtering work on the integers; display strings come from format_epoch().
+
+_TIMESTAMP_RE = re.compile(
+    r'(\d{4})-(\d{1,2})-(\d{1,2})'
+    r'(?:[T ](\d{1,2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?)?'
+    r'\s*(Z|[+-]\d{2}:?\d{2})?$'
+)
+
+
+def parse_timestamp(raw) -> Tuple[Optional[int], int]:
+    """
+    Parses '2025-12-12T10:30:00+01:00', '2025-12-12 10:30' or a datetime into
+    (utc_epoch_seconds, offset_minutes). Naive values get offset 0.
+    Returns (None, 0) if the value can't be parsed.
+    """
+    if not raw:
+        return None, 0
+
+    if isinstance(raw, datetime):
+        offset = raw.utcoffset()
+        offset_minutes = int(offset.total_seconds() // 60) if offset else 0
+        naive = raw.replace(tzinfo=None)
+        return calendar.timegm(naive.timetuple()) - offset_minutes * 60, offset_minutes
+
+    match = _TIMESTAMP_RE.match(str(raw).strip())
+    if not match:
+        return None, 0
+
+    year, month, day, hour, minute, second, tz = match.groups()
+    offset_minutes = 0
+    if tz and tz != "Z":
+        sign = -1 if tz[0] == "-" else 1
+        digits = tz[1:].replace(":", "")
+        offset_minutes = sign * (int(digits[:2]) * 60 + int(digits[2:]))
+
+    try:
+        # datetime() rejects impossible dates (Feb 30) that timegm would roll into the next month
+        parts = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+    except (ValueError, OverflowError):
+        return None, 0
+    wall = calendar.timegm(parts.timetuple())
+    return wall - offset_minutes * 60, offset_minutes
+
+
+def local_epoch(ts: Optional[int], offset_minutes: int = 0) -> Optional[int]:
+    """Wall-clock seconds at the place the timestamp was recorded (used as merge key)."""
+    if ts is None:
+        return None
+    return ts + offset_minutes * 60
+
+
+@lru_cache(maxsize=8192)
+def format_epoch(ts: Optional[int], offset_minutes: int = 0, fmt: str = "%Y-%m-%d %H:%M") -> str:
+    """Memoized display formatting of a normalized timestamp in its local time."""
+    if ts is None:
+        return ""
+    wall = datetime.fromtimestamp(ts + offset_minutes * 60, timezone.utc)
+    return wall.strftime(fmt)
+
+
 def to_ddmm(date_str: Optional[str]) -> str:
     """
     Converts a YYYY-MM-DD date string to a DDMM format used for Travelpayouts manual links.
@@ -379,4 +376,47 @@ def get_airline_name(code):
 
     clean_code = str(code).strip().upper()
     # .get() looks for the code. If not found, it returns the original clean_code
-    return AIRLINE_NAMES.get(clean_code, clean_code)
\ No newline at end of file
+    return AIRLINE_NAMES.get(clean_code, clean_code)
+
+def acquire_process_lock(path):
+    """
+    Non-blocking exclusive lock on `path`, held until the returned file is closed.
+    Elects one process among gunicorn workers for background jobs; None if another
+    process holds it. Always succeeds where fcntl is unavailable.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return open(os.devnull, "w")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    lock_file = open(path, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+_file_lock_fallback = threading.Lock()
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Blocking flock on `path` for the duration of the block (shared or exclusive).
+    Serializes writers across gunicorn workers and threads alike: every call opens
+    its own descriptor. A process-local lock stands in where fcntl is unavailable.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        with _file_lock_fallback:
+            yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)